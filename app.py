@@ -6,10 +6,18 @@ from flask_socketio import SocketIO
 # Import your existing classes
 from config import Config
 from models.permission import PermissionModel
+from models.session_store import SessionStore
+from models.class_cache import ClassCache
+from models.analytics_store import AnalyticsStore
 from utils.file_utils import FileUtils
+from utils.content_store import ContentStore
+from utils.scratch_utils import ScratchSpace
+from utils.prefix_trie import PackagePrefixTrie
 from services.apk_service import ApkService  # FIXED: Use your original class name
+from services.jvm_service import JvmService
 from services.permission_service import PermissionService
 from services.obfuscation_service import ObfuscationService
+from services.upload_service import UploadService
 from web.socket_events import SocketEvents
 from web.routes import Routes
 
@@ -23,7 +31,7 @@ def main():
         app.config.from_object(Config)
         
         # Initialize SocketIO
-        socketio = SocketIO(app, cors_allowed_origins="*")
+        socketio = SocketIO(app, cors_allowed_origins="*", async_mode=Config.SOCKETIO_ASYNC_MODE)
         
         # Setup logging
         logging.basicConfig(
@@ -38,13 +46,28 @@ def main():
         # Initialize services - FIXED: Use your original constructor parameters
         permission_model = PermissionModel(Config.PERMISSION_FILE_PATH)
         file_utils = FileUtils()
-        apk_service = ApkService(Config.APKTOOL_PATH, Config.OUTPUT_FOLDER, socketio)  # FIXED
+        apk_service = ApkService(Config.APKTOOL_JAR_PATH, Config.OUTPUT_FOLDER, socketio,
+                                 pack_output=Config.PACK_DECOMPILED_OUTPUT,
+                                 scratch=ScratchSpace.from_config(Config),
+                                 jvm=JvmService.from_config(Config),
+                                 framework_folder=Config.APKTOOL_FRAMEWORK_FOLDER,
+                                 extra_frameworks=Config.APKTOOL_EXTRA_FRAMEWORKS,
+                                 timeout=Config.APKTOOL_TIMEOUT_SECONDS)  # FIXED
         permission_service = PermissionService(permission_model, socketio)
-        obfuscation_service = ObfuscationService(socketio)
+        obfuscation_service = ObfuscationService(socketio, Config.OBFUSCATION_THRESHOLD,
+                                                 PackagePrefixTrie.from_file(Config.LIBRARY_PREFIXES_PATH),
+                                                 Config.LIBRARY_SCAN_MODE, ClassCache.from_config(Config))
+        session_store = SessionStore(Config.SESSION_DB_PATH, Config.SESSION_TTL_SECONDS, Config.SESSION_CACHE_SIZE)
+        analytics_store = AnalyticsStore.from_config(Config)
+        content_store = ContentStore(Config.CONTENT_STORE_FOLDER)
+        upload_service = UploadService(Config.UPLOAD_STAGING_FOLDER, content_store, Config.ALLOWED_EXTENSIONS,
+                                       Config.UPLOAD_CHUNK_SIZE, Config.MAX_UPLOAD_SIZE, Config.UPLOAD_STALE_SECONDS)
         
         # Initialize web components
-        socket_events = SocketEvents(socketio, apk_service, permission_service, obfuscation_service)
-        routes = Routes(app, Config, apk_service, permission_service, obfuscation_service, file_utils, socketio)
+        socket_events = SocketEvents(socketio, apk_service, permission_service, obfuscation_service, session_store,
+                                     analytics_store=analytics_store)
+        routes = Routes(app, Config, apk_service, permission_service, obfuscation_service, file_utils, socketio,
+                        session_store, upload_service, analytics_store)
         
         # Print startup info
         print("\n" + "="*50)
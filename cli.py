@@ -0,0 +1,588 @@
+import os
+import sys
+import json
+import math
+import time
+import logging
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import Config
+from models.session_store import SessionStore
+from models.analytics_store import AnalyticsStore
+from utils.content_store import ContentStore
+from utils.archive_utils import PackArchive
+from utils.file_utils import FileUtils
+from services.analysis_engine import AnalysisEngine
+from services.obfuscation_service import ObfuscationService
+from services.rescoring_service import RescoringService
+from services.jvm_service import JvmService
+
+# Per-process services, created once by _init_worker and reused for every APK the worker handles
+_worker = {}
+
+def _init_worker(output_folder, db_path, use_cache, time_budget=None, triage=False, diff=False):
+    """Create the analysis services of a pool worker"""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    # Decode jobs get unique work directories, so all workers can share one output folder
+    _worker['engine'] = AnalysisEngine.from_config(Config, output_folder=output_folder)
+    # The session store doubles as the result cache shared by all workers (and the web app)
+    _worker['session_store'] = SessionStore(db_path, Config.SESSION_TTL_SECONDS, cache_size=0)
+    _worker['analytics_store'] = AnalyticsStore.from_config(Config)
+    _worker['use_cache'] = use_cache
+    _worker['time_budget'] = time_budget
+    _worker['triage'] = triage
+    _worker['diff'] = diff
+
+def _analyze_one(apk_path):
+    """
+    Analyze one APK in a pool worker
+
+    Args:
+        apk_path: Path to the APK
+
+    Returns:
+        dict: One JSONL result record
+    """
+    start = time.perf_counter()
+    record = {'path': apk_path, 'sha256': None, 'status': 'error', 'cached': False, 'session_id': None}
+    try:
+        sha256 = ContentStore.hash_file(apk_path)
+        record['sha256'] = sha256
+        session_store = _worker['session_store']
+
+        session_id = session_store.find_by_sha256(sha256) if _worker['use_cache'] else None
+        results = session_store.get(session_id) if session_id else None
+        # Partial results, and triage results when a full scan is wanted, are not reused; complete diff
+        # results are as good as full ones
+        if SessionStore.is_reusable(results, allow_triage=_worker['triage']):
+            record['cached'] = True
+        else:
+            # Diff against the latest stored build of the same package (found once the APK is decoded)
+            find_baseline = session_store.find_baseline if _worker['diff'] else None
+            success, results = _worker['engine'].analyze(os.path.abspath(apk_path), sha256=sha256,
+                                                         time_budget=_worker['time_budget'],
+                                                         triage=_worker['triage'], find_baseline=find_baseline)
+            if not success:
+                record['error'] = results
+                return record
+            session_id = results['session_id']
+            session_store.save(session_id, results)
+            if _worker['analytics_store'] is not None:
+                try:
+                    _worker['analytics_store'].record(results)
+                except Exception as e:
+                    # The analysis itself is stored; a missing analytics row is restored by 'analytics rebuild'
+                    logging.exception(f"Could not record {apk_path} in the analytics store: {e}")
+
+        record.update(_summarize(results))
+        record['session_id'] = session_id
+        record['status'] = 'success'
+    except Exception as e:
+        logging.exception(f"Error analyzing {apk_path}")
+        record['error'] = str(e)
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+def _summarize(results):
+    """Reduce analysis results to the fields written to the JSONL output"""
+    permissions = results.get('permissions') or []
+    obfuscation = results.get('obfuscation') or {}
+    return {
+        'apk_name': results.get('apk_name'),
+        'apk_size_mb': results.get('apk_size_mb'),
+        'permissions_total': len(permissions),
+        'dangerous_permissions': sorted(
+            p['name'] for p in permissions if 'dangerous' in str(p.get('protection_level', '')).lower()
+        ),
+        'is_obfuscated': obfuscation.get('is_obfuscated', False),
+        'obfuscation_confidence': obfuscation.get('confidence', 0),
+        'total_snippets': obfuscation.get('total_snippets', len(obfuscation.get('code_snippets') or [])),
+        'partial': results.get('partial', False),
+        'files_scanned_percent': (obfuscation.get('coverage') or {}).get('files_percent'),
+        'library_files_skipped': (obfuscation.get('libraries') or {}).get('files_skipped', 0),
+        'class_cache_hit_rate': (obfuscation.get('class_cache') or {}).get('hit_rate'),
+        'package_name': results.get('package_name'),
+        'diff_baseline_session_id': (results.get('diff') or {}).get('baseline_session_id'),
+        'files_rescanned': (results.get('diff') or {}).get('files_rescanned')
+    }
+
+def collect_inputs(paths, manifest=None, allowed_extensions=None):
+    """
+    Collect the APK files to analyze
+
+    Args:
+        paths: Files and/or directories (searched recursively)
+        manifest: File listing one path per line ('-' for stdin), optional
+        allowed_extensions: Extensions picked up from directories
+
+    Returns:
+        list: Unique file paths in input order
+    """
+    allowed_extensions = allowed_extensions or Config.ALLOWED_EXTENSIONS
+    candidates = list(paths)
+    if manifest:
+        stream = sys.stdin if manifest == '-' else open(manifest, encoding='utf-8')
+        with stream:
+            candidates.extend(line.strip() for line in stream if line.strip() and not line.startswith('#'))
+
+    files = []
+    seen = set()
+    for path in candidates:
+        if os.path.isdir(path):
+            found = []
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(names)
+                             if FileUtils.allowed_file(name, allowed_extensions))
+        else:
+            found = [path]
+        for file_path in found:
+            key = os.path.abspath(file_path)
+            if key not in seen:
+                seen.add(key)
+                files.append(file_path)
+    return files
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    # Multiply first so whole percentiles stay exact (0.07 * 100 would round up a rank)
+    rank = max(1, math.ceil(pct * len(ordered) / 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def run_batch(args):
+    """Analyze a set of APKs across a process pool, streaming one JSON record per APK"""
+    files = collect_inputs(args.paths, args.manifest)
+    if not files:
+        print("No APK files found", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output_folder, exist_ok=True)
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    workers = max(1, min(args.workers, len(files)))
+    print(f"Analyzing {len(files)} file(s) with {workers} worker(s)...", file=sys.stderr)
+
+    records = []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(args.output_folder, args.db, not args.no_cache, args.time_budget,
+                                           args.triage, args.diff)) as executor:
+            futures = [executor.submit(_analyze_one, path) for path in files]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                # Results are streamed as they finish, so partial runs still leave usable output
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print_summary(records, time.perf_counter() - start)
+    return 0 if all(r['status'] == 'success' for r in records) else 2
+
+def print_summary(records, wall_seconds):
+    """Print throughput and latency statistics of a batch run to stderr"""
+    analyzed = [r['seconds'] for r in records if r['status'] == 'success' and not r['cached']]
+    cached = sum(1 for r in records if r['cached'])
+    failed = sum(1 for r in records if r['status'] != 'success')
+    per_minute = len(records) / wall_seconds * 60 if wall_seconds else 0
+
+    print("\n" + "=" * 50, file=sys.stderr)
+    print(f"Files: {len(records)} ({len(analyzed)} analyzed, {cached} cached, {failed} failed)", file=sys.stderr)
+    print(f"Wall time: {wall_seconds:.1f} s, throughput: {per_minute:.1f} APKs/min", file=sys.stderr)
+    print(f"Latency p50: {percentile(analyzed, 50):.2f} s, p95: {percentile(analyzed, 95):.2f} s "
+          f"(analyzed files only)", file=sys.stderr)
+    print("=" * 50, file=sys.stderr)
+
+def run_triage_eval(args):
+    """Decode each APK once, scan it fully and in triage mode, and report how often the verdicts agree"""
+    files = collect_inputs(args.paths, args.manifest, {'apk'})
+    if not files:
+        print("No APK files found", file=sys.stderr)
+        return 1
+
+    engine = AnalysisEngine.from_config(Config)
+    scanner = engine.obfuscation_service
+    # Both scans must do the work; otherwise the triage scan would be answered from classes the full scan cached
+    scanner.class_cache = None
+    out = open(args.output, 'w', encoding='utf-8') if args.output else None
+    comparisons = []
+    try:
+        for apk_path in files:
+            success, output_dir, _ = engine.apk_service.decompile_apk(os.path.abspath(apk_path))
+            if not success:
+                print(f"{apk_path}: {output_dir}", file=sys.stderr)
+                continue
+            try:
+                start = time.perf_counter()
+                _, full = scanner.analyze_obfuscation(output_dir)
+                full_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                _, sampled = scanner.analyze_obfuscation(output_dir, triage=True)
+                triage_seconds = time.perf_counter() - start
+            finally:
+                engine.apk_service.discard_output(output_dir)
+
+            record = {
+                'path': apk_path,
+                'full_confidence': full.get('confidence', 0),
+                'triage_confidence': sampled.get('confidence', 0),
+                'triage_interval': (sampled.get('triage') or {}).get('confidence_interval'),
+                'agree': full.get('is_obfuscated') == sampled.get('is_obfuscated'),
+                'files_total': (full.get('coverage') or {}).get('files_total', 0),
+                'files_sampled': (sampled.get('coverage') or {}).get('files_scanned', 0),
+                'full_seconds': round(full_seconds, 3),
+                'triage_seconds': round(triage_seconds, 3)
+            }
+            comparisons.append(record)
+            if out:
+                out.write(json.dumps(record) + '\n')
+            print(f"{'ok  ' if record['agree'] else 'DIFF'} {apk_path}: full {record['full_confidence']}% vs "
+                  f"triage {record['triage_confidence']}% ({record['files_sampled']}/{record['files_total']} files, "
+                  f"{record['full_seconds']:.2f}s -> {record['triage_seconds']:.2f}s)", file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+
+    if not comparisons:
+        return 1
+    agreed = sum(1 for record in comparisons if record['agree'])
+    speedups = [r['full_seconds'] / r['triage_seconds'] for r in comparisons if r['triage_seconds'] > 0]
+    print("\n" + "=" * 50, file=sys.stderr)
+    print(f"Verdict agreement: {agreed}/{len(comparisons)} ({agreed / len(comparisons):.1%})", file=sys.stderr)
+    print(f"Mean |confidence difference|: "
+          f"{statistics.mean(abs(r['full_confidence'] - r['triage_confidence']) for r in comparisons):.1f} points",
+          file=sys.stderr)
+    if speedups:
+        print(f"Median scan speedup: {statistics.median(speedups):.1f}x", file=sys.stderr)
+    print("=" * 50, file=sys.stderr)
+    return 0 if agreed == len(comparisons) else 2
+
+def run_reanalyze(args):
+    """Bring stored analyses up to date with the current obfuscation patterns"""
+    engine = AnalysisEngine.from_config(Config)
+    current_versions = engine.obfuscation_service.pattern_versions
+    session_store = SessionStore(args.db, Config.SESSION_TTL_SECONDS, cache_size=0)
+    analytics_store = AnalyticsStore.from_config(Config)
+    status = 0
+    updated = 0
+    try:
+        for session_id in args.sessions or session_store.session_ids():
+            results = session_store.get(session_id)
+            if results is None:
+                print(f"{session_id}: unknown or expired session", file=sys.stderr)
+                status = 1
+                continue
+            if (results.get('obfuscation') or {}).get('pattern_versions') == current_versions:
+                continue
+
+            start = time.perf_counter()
+            code_snippets = session_store.get_snippets(session_id, 0, session_store.count_snippets(session_id))
+            success, result = engine.reanalyze(results, code_snippets, session_store.get_manifest(session_id))
+            if not success:
+                print(f"{session_id}: {result}", file=sys.stderr)
+                status = 1
+                continue
+            session_store.save(session_id, result)
+            if analytics_store is not None:
+                try:
+                    analytics_store.record(result)
+                except Exception as e:
+                    logging.exception(f"Could not record {session_id} in the analytics store: {e}")
+            updated += 1
+            reanalysis = result['obfuscation']['reanalysis']
+            print(f"{session_id} ({results.get('apk_name')}): {len(reanalysis['patterns_rescanned'])} patterns rescanned "
+                  f"over {reanalysis['files_read']} files, {len(reanalysis['patterns_dropped'])} dropped, "
+                  f"confidence {reanalysis['confidence_before']}% -> {result['obfuscation']['confidence']}% "
+                  f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    finally:
+        session_store.close()
+    print(f"Re-analyzed {updated} sessions", file=sys.stderr)
+    return status
+
+def run_rescore(args):
+    """Re-score every stored analysis with the current (or trial) weights and thresholds"""
+    weights = {}
+    for item in args.weight or []:
+        name, _, value = item.partition('=')
+        try:
+            weights[name] = float(value)
+        except ValueError:
+            print(f"Invalid weight {item!r}, expected NAME=NUMBER", file=sys.stderr)
+            return 2
+    trial = bool(weights) or args.threshold is not None
+    if trial and not args.dry_run:
+        # Stored scores must match what new analyses get; trial rules are only reported
+        print("--weight and --threshold change nothing stored, pass --dry-run", file=sys.stderr)
+        return 2
+
+    scanner = ObfuscationService(confidence_threshold=Config.OBFUSCATION_THRESHOLD)
+    unknown = sorted(set(weights) - set(scanner.obfuscation_patterns))
+    if unknown:
+        print(f"Unknown patterns: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    session_store = SessionStore(args.db, Config.SESSION_TTL_SECONDS, cache_size=0)
+    try:
+        report = RescoringService(scanner, session_store, Config.OBFUSCATION_THRESHOLD).rescore(
+            weights, args.threshold, write=not args.dry_run)
+    finally:
+        session_store.close()
+
+    print(json.dumps(report, indent=2))
+    confidence = report['confidence']
+    if report['sessions']:
+        print(f"{report['sessions']} analyses re-scored in {sum(report['seconds'].values()):.3f}s: "
+              f"{report['changed']} changed ({report['updated']} written), mean confidence "
+              f"{confidence['mean_before']} -> {confidence['mean_after']}, "
+              f"{report['verdicts']['newly_obfuscated']} newly obfuscated, "
+              f"{report['verdicts']['no_longer_obfuscated']} no longer", file=sys.stderr)
+    else:
+        print("No stored analyses with score inputs", file=sys.stderr)
+    return 0
+
+def run_analytics_query(args):
+    """Answer a fleet query from the analytics store, one JSON row per line"""
+    analytics_store = AnalyticsStore(args.folder, Config.ANALYTICS_COMPACT_PARTS)
+    columns = [column.strip() for column in args.columns.split(',')] if args.columns else None
+    try:
+        result = analytics_store.query(args.permission, args.where, columns, args.limit)
+    except ValueError as e:
+        print(f"{e}\nColumns: {', '.join(analytics_store.columns())}", file=sys.stderr)
+        return 2
+    for row in result['rows']:
+        print(json.dumps(row))
+    print(f"{result['total']} of {result['rows_scanned']} analyses match ({len(result['rows'])} shown) "
+          f"in {result['seconds'] * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+def run_analytics_rebuild(args):
+    """Record every stored session in the analytics store, e.g. after re-scoring or to backfill"""
+    session_store = SessionStore(args.db, Config.SESSION_TTL_SECONDS, cache_size=0)
+    analytics_store = AnalyticsStore(args.folder, Config.ANALYTICS_COMPACT_PARTS)
+    try:
+        sessions = (session_store.get(session_id) for session_id in session_store.session_ids())
+        recorded = analytics_store.record_many(results for results in sessions if results is not None)
+    finally:
+        session_store.close()
+    merged = analytics_store.compact()
+    print(f"Recorded {recorded} sessions, merged {merged} part files", file=sys.stderr)
+    return 0
+
+def run_jvm_warm(args):
+    """Create the CDS archives of the apktool and jadx jars"""
+    jvm = JvmService.from_config(Config)
+    print(f"Java version: {jvm.java_version() or 'unknown'}", file=sys.stderr)
+
+    # A real decode loads the classes every job needs; without a fixture, --version still covers startup
+    work_dir = tempfile.mkdtemp(prefix='cds-train-')
+    try:
+        apktool_args = ['d', args.apk, '-o', os.path.join(work_dir, 'out'), '-f'] if args.apk else ['--version']
+        jars = [(Config.APKTOOL_JAR_PATH, apktool_args), (Config.JADX_JAR_PATH, ['--version'])]
+        status = 0
+        for jar_path, training_args in jars:
+            if not os.path.isfile(jar_path):
+                print(f"{jar_path}: not found, skipped", file=sys.stderr)
+                continue
+            success, result = jvm.warm(jar_path, training_args)
+            print(f"{jar_path}: {result}", file=sys.stderr)
+            status = status or (0 if success else 1)
+        return status
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def run_jvm_bench(args):
+    """Compare apktool decode latency of a tiny APK with default flags, tuned flags and tuned flags + CDS"""
+    work_dir = tempfile.mkdtemp(prefix='jvm-bench-')
+    try:
+        tuned = JvmService(Config.JAVA_PATH, Config.JVM_FLAGS)
+        with_cds = JvmService.from_config(Config)
+        variants = [('default', [Config.JAVA_PATH, '-jar', Config.APKTOOL_JAR_PATH]),
+                    ('tuned', tuned.java_command(Config.APKTOOL_JAR_PATH)[0])]
+        if with_cds.cds_supported():
+            with_cds.warm(Config.APKTOOL_JAR_PATH, ['d', args.apk, '-o', os.path.join(work_dir, 'train'), '-f'])
+            variants.append(('tuned+cds', with_cds.java_command(Config.APKTOOL_JAR_PATH)[0]))
+        else:
+            print(f"CDS unavailable for Java '{with_cds.java_version()}', skipping that variant", file=sys.stderr)
+
+        for label, java_command in variants:
+            timings = []
+            for run in range(args.runs):
+                start = time.perf_counter()
+                result = subprocess.run(java_command + ['d', args.apk, '-o', os.path.join(work_dir, f"{label}-{run}"), '-f'],
+                                        capture_output=True)
+                timings.append(time.perf_counter() - start)
+                if result.returncode != 0:
+                    print(f"{label}: apktool failed: {result.stderr.decode(errors='ignore')[-500:]}", file=sys.stderr)
+                    return 1
+            print(f"{label:>10}: median {statistics.median(timings):.2f} s, min {min(timings):.2f} s "
+                  f"over {args.runs} runs", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+def _synthetic_tree(root, files):
+    """Write an apktool-like tree of small smali and resource files for pack-bench"""
+    for index in range(files):
+        if index % 5 == 4:
+            path = os.path.join(root, 'res', f"values-{index % 40}", f"strings_{index}.xml")
+            content = f'<resources><string name="s{index}">value {index}</string></resources>\n'
+        else:
+            path = os.path.join(root, 'smali', 'com', 'example', f"p{index % 200}", f"C{index}.smali")
+            content = (f".class public Lcom/example/p{index % 200}/C{index};\n.super Ljava/lang/Object;\n"
+                       + ".method public a()V\n    const-string v0, \"aGVsbG8=\"\n    return-void\n.end method\n" * 8)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+    with open(os.path.join(root, 'AndroidManifest.xml'), 'w') as f:
+        f.write('<manifest package="com.example"/>\n')
+
+def run_pack_bench(args):
+    """Compare walking, scanning and deleting a decoded tree as loose files and as a packed archive"""
+    if not args.synthetic and not (args.tree and os.path.isdir(args.tree)):
+        print("Give an apktool output directory or --synthetic N", file=sys.stderr)
+        return 1
+    scanner = ObfuscationService()  # No class cache or library skipping, so every run scans everything
+    work_dir = tempfile.mkdtemp(prefix='pack-bench-', dir=args.work_dir)
+    timings = {(layout, step): [] for layout in ('loose', 'packed') for step in ('walk', 'scan', 'delete')}
+    timings[('packed', 'pack')] = []
+    timings[('packed', 'open')] = []  # Reading the archive index, paid once per scan
+    try:
+        source = os.path.join(work_dir, 'source')
+        if args.synthetic:
+            _synthetic_tree(source, args.synthetic)
+        else:
+            shutil.copytree(args.tree, source)
+
+        for run in range(args.runs):
+            loose = os.path.join(work_dir, f"loose-{run}")
+            shutil.copytree(source, loose)
+
+            start = time.perf_counter()
+            file_count = sum(len(files) for _, _, files in os.walk(loose))
+            timings[('loose', 'walk')].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            scanner.analyze_obfuscation(loose)
+            timings[('loose', 'scan')].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            archive_path = PackArchive.pack_directory(loose, remove_source=False)
+            timings[('packed', 'pack')].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            with PackArchive(archive_path) as archive:
+                opened = time.perf_counter()
+                sum(len(files) for _, _, files in archive.walk())
+                timings[('packed', 'walk')].append(time.perf_counter() - opened)
+            timings[('packed', 'open')].append(opened - start)
+            start = time.perf_counter()
+            scanner.analyze_obfuscation(archive_path)
+            timings[('packed', 'scan')].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            shutil.rmtree(loose)
+            timings[('loose', 'delete')].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            os.remove(archive_path)
+            timings[('packed', 'delete')].append(time.perf_counter() - start)
+
+        print(f"{file_count} files, median of {args.runs} runs:", file=sys.stderr)
+        for step in ('walk', 'scan', 'delete', 'pack', 'open'):
+            cells = [f"{layout} {statistics.median(timings[(layout, step)]) * 1000:9.1f} ms"
+                     for layout in ('loose', 'packed') if (layout, step) in timings]
+            print(f"{step:>7}: {'   '.join(cells)}", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+def build_parser():
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(description="APK Analyzer command line tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch = subparsers.add_parser('batch', help="Analyze a directory or list of APKs in parallel")
+    batch.add_argument('paths', nargs='*', help="APK files and/or directories to search")
+    batch.add_argument('-m', '--manifest', help="File with one APK path per line ('-' for stdin)")
+    batch.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    batch.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    batch.add_argument('--output-folder', default=Config.OUTPUT_FOLDER, help="Folder for decompiled output")
+    batch.add_argument('--db', default=Config.SESSION_DB_PATH, help="Session database used as the result cache")
+    batch.add_argument('--no-cache', action='store_true', help="Re-analyze APKs that already have results")
+    batch.add_argument('--time-budget', type=float, help="Seconds per APK; slower scans return partial results")
+    batch.add_argument('--triage', action='store_true', help="Estimate obfuscation from a stratified sample")
+    batch.add_argument('--diff', action='store_true',
+                       help="Rescan only classes changed since the last stored analysis of the same package")
+    batch.set_defaults(func=run_batch)
+
+    triage = subparsers.add_parser('triage-eval', help="Compare triage verdicts with full scans on a corpus")
+    triage.add_argument('paths', nargs='*', help="APK files and/or directories to search")
+    triage.add_argument('-m', '--manifest', help="File with one APK path per line ('-' for stdin)")
+    triage.add_argument('-o', '--output', help="JSONL file for per-APK comparisons (optional)")
+    triage.set_defaults(func=run_triage_eval)
+
+    reanalyze = subparsers.add_parser('reanalyze',
+                                      help="Re-evaluate changed obfuscation patterns over stored analyses")
+    reanalyze.add_argument('sessions', nargs='*', help="Session IDs (default: every stored session that is out of date)")
+    reanalyze.add_argument('--db', default=Config.SESSION_DB_PATH, help="Session database")
+    reanalyze.set_defaults(func=run_reanalyze)
+
+    rescore = subparsers.add_parser('rescore', help="Re-score stored analyses without re-analyzing them")
+    rescore.add_argument('--db', default=Config.SESSION_DB_PATH, help="Session database")
+    rescore.add_argument('--weight', action='append', metavar='PATTERN=WEIGHT',
+                         help="Trial weight of an obfuscation pattern (repeatable, needs --dry-run)")
+    rescore.add_argument('--threshold', type=float, help="Trial obfuscation threshold (needs --dry-run)")
+    rescore.add_argument('--dry-run', action='store_true', help="Report the score changes without storing them")
+    rescore.set_defaults(func=run_rescore)
+
+    analytics = subparsers.add_parser('analytics', help="Query the fleet-wide record of analyses")
+    analytics_commands = analytics.add_subparsers(dest='analytics_command', required=True)
+    query = analytics_commands.add_parser('query', help="List analyses matching permissions and conditions")
+    query.add_argument('-p', '--permission', action='append',
+                       help="Requested permission, e.g. READ_SMS (repeatable, all must match)")
+    query.add_argument('-w', '--where', action='append',
+                       help="Condition such as 'confidence>80' or 'count.string_encryption>=3' (repeatable)")
+    query.add_argument('-c', '--columns', help="Comma separated columns to print ('permissions' for the list)")
+    query.add_argument('-n', '--limit', type=int, default=100, help="Most rows printed")
+    query.add_argument('--folder', default=Config.ANALYTICS_FOLDER, help="Analytics store folder")
+    query.set_defaults(func=run_analytics_query)
+    rebuild = analytics_commands.add_parser('rebuild', help="Record every stored session again")
+    rebuild.add_argument('--db', default=Config.SESSION_DB_PATH, help="Session database")
+    rebuild.add_argument('--folder', default=Config.ANALYTICS_FOLDER, help="Analytics store folder")
+    rebuild.set_defaults(func=run_analytics_rebuild)
+
+    pack_bench = subparsers.add_parser('pack-bench',
+                                       help="Benchmark walk, scan and delete of loose vs packed decoded trees")
+    pack_bench.add_argument('tree', nargs='?', help="apktool output directory to copy for each run")
+    pack_bench.add_argument('--synthetic', type=int, metavar='FILES', help="Generate a tree of this many files instead")
+    pack_bench.add_argument('-n', '--runs', type=int, default=3, help="Runs per layout")
+    pack_bench.add_argument('--work-dir', help="Directory to benchmark in (default: the system temp dir)")
+    pack_bench.set_defaults(func=run_pack_bench)
+
+    jvm = subparsers.add_parser('jvm', help="Manage JVM class-data-sharing archives")
+    jvm_commands = jvm.add_subparsers(dest='jvm_command', required=True)
+    warm = jvm_commands.add_parser('warm', help="Create CDS archives for the apktool and jadx jars")
+    warm.add_argument('--apk', help="Small APK to decode as the apktool training run")
+    warm.set_defaults(func=run_jvm_warm)
+    bench = jvm_commands.add_parser('bench', help="Measure apktool startup latency with and without tuning/CDS")
+    bench.add_argument('--apk', required=True, help="Tiny fixture APK to decode")
+    bench.add_argument('-n', '--runs', type=int, default=5, help="Runs per variant")
+    bench.set_defaults(func=run_jvm_bench)
+
+    return parser
+
+def main(argv=None):
+    """Command line entry point"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,9 @@ class Config:
     DEBUG = True
     HOST = '127.0.0.1'
     PORT = 5000
+    # Requests run in real threads, so a long analysis (blocking on apktool) never stalls the server and
+    # cancel requests get through while it runs; eventlet would need monkey patching for the same effect
+    SOCKETIO_ASYNC_MODE = 'threading'
     
     # Logging settings
     LOG_LEVEL = 'DEBUG'
@@ -16,14 +19,64 @@ class Config:
     # File upload settings
     UPLOAD_FOLDER = 'uploads'
     OUTPUT_FOLDER = 'decompiled_output'
-    ALLOWED_EXTENSIONS = {'apk'}
-    MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
+    ALLOWED_EXTENSIONS = {'apk', 'xapk', 'apks', 'apkm'}  # APKs and split-APK bundles
+    MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max request size (single-POST uploads and each chunk)
+    
+    # Chunked upload settings
+    UPLOAD_STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, 'chunked')  # In-progress chunked uploads
+    CONTENT_STORE_FOLDER = os.path.join(UPLOAD_FOLDER, 'objects')  # Completed uploads, keyed by SHA-256
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks
+    MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024  # 2GB max file size for chunked uploads
+    UPLOAD_STALE_SECONDS = 24 * 3600  # Abandoned chunked uploads are removed after a day
     
     # APK analysis settings
     APKTOOL_PATH = os.path.join('ApkTool', 'apktool.bat')
     JADX_PATH = os.path.join('jadx-1.5.0', 'bin', 'jadx.bat')
+    APKTOOL_JAR_PATH = os.path.join('ApkTool', 'apktool_2.10.0.jar')  # Run directly with 'java -jar'
+    JADX_JAR_PATH = os.path.join('jadx-1.5.0', 'lib', 'jadx-1.5.0-all.jar')
     PERMISSION_FILE_PATH = 'permission_list.xlsx'
+    APKTOOL_TIMEOUT_SECONDS = 1800  # Kill an apktool run (and its process tree) after this long
+    PACK_DECOMPILED_OUTPUT = True  # Pack decoded trees into one uncompressed archive after decoding
+    
+    # JVM settings for apktool/jadx runs
+    JAVA_PATH = 'java'
+    JVM_FLAGS = [
+        '-Xms256m', '-Xmx2g',          # Start with a modest heap, allow large resource tables
+        '-XX:TieredStopAtLevel=1',     # C1 only: short-lived runs never amortize C2 compilation
+        '-XX:+UseSerialGC',            # Cheapest GC to start; parallel jobs already use the cores
+        '-Xss4m',                      # Deep smali/resource recursion
+    ]
+    JVM_ENABLE_CDS = True  # Create and reuse AppCDS archives per jar and JVM version (JDK 13+)
+    JVM_CDS_FOLDER = 'jvm_cache'
+    APKTOOL_FRAMEWORK_FOLDER = 'apktool_framework'  # Shared read-only framework dirs (--frame-path), one per apktool jar
+    APKTOOL_EXTRA_FRAMEWORKS = []  # Vendor framework-res APKs to pre-install (e.g. for OEM system apps)
+    
+    # Scratch workspace settings (decode and scan on tmpfs, persist only the packed output)
+    SCRATCH_FOLDER = os.environ.get('SCRATCH_FOLDER', '/dev/shm/apk_analyzer')  # Empty or missing parent disables it
+    SCRATCH_SIZE_FACTOR = 6  # Expected decoded size as a multiple of the APK size
+    SCRATCH_MIN_FREE_MB = 256  # Keep at least this much scratch space free, otherwise decode on disk
     
+    # Session storage settings
+    SESSION_DB_PATH = 'analysis_sessions.db'
+    SESSION_TTL_SECONDS = 7 * 24 * 3600  # Expire stored analyses after a week
+    SESSION_CACHE_SIZE = 32  # Session summaries kept in the in-memory LRU cache
+    SNIPPET_QUERY_MAX_LIMIT = 500  # Largest page size accepted by the snippet query endpoint
+
     # Analysis settings
+    ANALYSIS_TIME_BUDGET_SECONDS = None  # Default time budget per analysis (None: always scan everything)
+    ANALYSIS_REFINE_PARTIAL = True  # Finish time-budgeted scans in the background and push the full results
     # MAX_FILES_TO_SCAN = 1000
     OBFUSCATION_THRESHOLD = 30  # Percentage threshold for obfuscation detection
+    # Default scan mode: 'full', 'triage' to stop once a sampled verdict is settled, or 'diff' to rescan only
+    # the classes changed since the last stored analysis of the same package
+    OBFUSCATION_SCAN_MODE = 'full'
+    LIBRARY_PREFIXES_PATH = 'library_prefixes.txt'  # Package prefixes of known third-party libraries and SDKs
+    LIBRARY_SCAN_MODE = 'skip'  # 'skip' known library code, 'tally' to scan it but report it separately, or 'off'
+    CLASS_CACHE_PATH = 'class_cache.db'  # Per-class scan results shared across APKs (None to disable)
+    CLASS_CACHE_MAX_ENTRIES = 200000  # Classes kept on disk before least recently used ones are evicted
+    CLASS_CACHE_MEMORY_ENTRIES = 20000  # Classes kept decoded in memory
+
+    # Fleet analytics settings
+    ANALYTICS_FOLDER = 'analytics'  # Columnar store with one row per completed analysis (None to disable)
+    ANALYTICS_COMPACT_PARTS = 64  # Part files appended before they are merged into one
+    ANALYTICS_QUERY_MAX_LIMIT = 1000  # Most rows returned by one analytics query
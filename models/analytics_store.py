@@ -0,0 +1,428 @@
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+
+class AnalyticsStore:
+    """Append-only columnar store of analysis results for fleet-wide queries
+
+    Every recorded analysis becomes one row: identity, versions and sizes, the
+    obfuscation verdict, per-indicator counts, a permission bitset and stage timings.
+    Rows are appended as small NumPy part files (written atomically, so several
+    processes can record at once) and merged into one part once enough have piled
+    up. Queries run over the columns in memory and never touch decoded trees.
+    Recording a session again supersedes its earlier row.
+    """
+
+    PART_PREFIX = 'part-'
+    PART_SUFFIX = '.npz'
+    COUNT_PREFIX = 'count.'  # Column name prefix of per-indicator counts
+    PERMISSION_PREFIX = 'android.permission.'  # Added to permission names given without a package
+
+    STRING_COLUMNS = ('session_id', 'sha256', 'apk_name', 'package_name', 'version_name', 'version_code',
+                      'scan_mode')
+    UNKNOWN_SDK = -1
+    # Numeric columns and the value used where it is unknown (NaN and UNKNOWN_SDK never match a condition)
+    NUMERIC_COLUMNS = {
+        'recorded_at': (np.float64, np.nan),
+        'apk_size_mb': (np.float64, np.nan),
+        'min_sdk': (np.int32, UNKNOWN_SDK),
+        'target_sdk': (np.int32, UNKNOWN_SDK),
+        'confidence': (np.int16, 0),
+        'is_obfuscated': (np.bool_, False),
+        'partial': (np.bool_, False),
+        'files_analyzed': (np.int64, 0),
+        'smali_files': (np.int64, 0),
+        'java_files': (np.int64, 0),
+        'lines_analyzed': (np.int64, 0),
+        'total_snippets': (np.int64, 0),
+        'permission_count': (np.int32, 0),
+        'dangerous_permissions': (np.int32, 0),
+        'runtime_seconds': (np.float64, np.nan),
+        'decompile_seconds': (np.float64, np.nan),
+        'permissions_seconds': (np.float64, np.nan),
+        'obfuscation_seconds': (np.float64, np.nan)
+    }
+    DEFAULT_COLUMNS = ('session_id', 'sha256', 'apk_name', 'package_name', 'version_name', 'confidence',
+                       'is_obfuscated', 'dangerous_permissions', 'recorded_at')
+    CONDITION_PATTERN = re.compile(r'^\s*([\w.]+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$')
+    OPERATORS = {
+        '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+        '=': np.equal, '!=': np.not_equal
+    }
+
+    def __init__(self, folder, compact_parts=64):
+        """
+        Initialize the analytics store
+
+        Args:
+            folder: Directory holding the part files (created if missing)
+            compact_parts: Part files tolerated before they are merged into one
+        """
+        self.folder = folder
+        self.compact_parts = compact_parts
+        self._table = None  # Merged columns of the parts in _loaded_parts
+        self._loaded_parts = frozenset()
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the store described by a config, or None if it is disabled
+
+        Args:
+            config: Config class (or object with the same attributes)
+
+        Returns:
+            AnalyticsStore: Store instance, or None if ANALYTICS_FOLDER is not set
+        """
+        if not config.ANALYTICS_FOLDER:
+            return None
+        return cls(config.ANALYTICS_FOLDER, config.ANALYTICS_COMPACT_PARTS)
+
+    def __len__(self):
+        with self._lock:
+            return self._rows(self._refresh())
+
+    def record(self, results):
+        """
+        Append one analysis
+
+        Args:
+            results: Analysis results (as returned by the engine, or a stored session summary)
+
+        Returns:
+            bool: True if the row was written
+        """
+        return self.record_many([results]) == 1
+
+    def record_many(self, results_list):
+        """
+        Append several analyses as one part file
+
+        Args:
+            results_list: Iterable of analysis results
+
+        Returns:
+            int: Number of rows written
+        """
+        rows = [self._row_of(results) for results in results_list]
+        if not rows:
+            return 0
+        try:
+            self._write_part(self._table_of(rows))
+        except OSError as e:
+            logging.warning(f"Could not record {len(rows)} analyses in the analytics store: {e}")
+            return 0
+        return len(rows)
+
+    def query(self, permissions=None, where=None, columns=None, limit=100):
+        """
+        Find recorded analyses, most recent first
+
+        Args:
+            permissions: Permissions every matching APK requests; 'READ_SMS' is short for
+                         'android.permission.READ_SMS' (optional)
+            where: Conditions such as 'confidence>80', 'target_sdk<28', 'package_name=com.example'
+                   or 'count.string_encryption>=3', all of which must hold (optional)
+            columns: Columns to return, 'permissions' for the permission list (default: DEFAULT_COLUMNS)
+            limit: Largest number of rows returned
+
+        Returns:
+            dict: total (matching rows), rows (up to limit), rows_scanned and seconds
+
+        Raises:
+            ValueError: On malformed conditions or unknown columns
+        """
+        started = time.perf_counter()
+        conditions = [self.parse_condition(condition) for condition in where or []]
+        permissions = [self._full_permission_name(name) for name in permissions or []]
+        columns = list(columns or self.DEFAULT_COLUMNS)
+
+        with self._lock:
+            table = self._refresh()
+        count = self._rows(table)
+        mask = np.ones(count, dtype=bool)
+        for name, operator, value in conditions:
+            mask &= self._compare(table, name, operator, value)
+        for permission in permissions:
+            mask &= self._permission_column(table, permission)
+
+        matches = np.flatnonzero(mask)
+        # Most recent first
+        matches = matches[np.argsort(-table['recorded_at'][matches], kind='stable')]
+        rows = [self._row_dict(table, index, columns) for index in matches[:max(limit, 0)]]
+        return {
+            'total': len(matches),
+            'rows': rows,
+            'rows_scanned': count,
+            'seconds': round(time.perf_counter() - started, 4)
+        }
+
+    def columns(self):
+        """
+        List the queryable columns
+
+        Returns:
+            list: Column names, including one count.<indicator> column per indicator seen
+        """
+        with self._lock:
+            table = self._refresh()
+        return list(self.STRING_COLUMNS) + list(self.NUMERIC_COLUMNS) + sorted(
+            name for name in table if name.startswith(self.COUNT_PREFIX))
+
+    def compact(self):
+        """
+        Merge all part files into one
+
+        Returns:
+            int: Number of part files merged
+        """
+        with self._lock:
+            self._refresh()
+            merged = len(self._loaded_parts)
+            if merged < 2:
+                return 0
+            self._compact()
+            return merged
+
+    @classmethod
+    def parse_condition(cls, condition):
+        """
+        Parse a condition such as 'confidence>80'
+
+        Returns:
+            tuple: (column, operator, value)
+
+        Raises:
+            ValueError: If the condition is malformed
+        """
+        match = cls.CONDITION_PATTERN.match(condition)
+        if match is None:
+            raise ValueError(f"Invalid condition {condition!r}, expected e.g. 'confidence>80'")
+        return match.groups()
+
+    def _refresh(self):
+        """Load part files written since the last call, merging them into the in-memory table (caller holds the lock)"""
+        for _ in range(3):
+            parts = frozenset(self._list_parts())
+            if self._table is not None and parts == self._loaded_parts:
+                return self._table
+            try:
+                if self._table is not None and self._loaded_parts <= parts:
+                    tables = [self._table] + [self._read_part(part) for part in sorted(parts - self._loaded_parts)]
+                else:
+                    tables = [self._read_part(part) for part in sorted(parts)]
+            except FileNotFoundError:
+                # Another process compacted the parts while they were read; list them again
+                self._table = None
+                continue
+            self._table = self._merge(tables)
+            self._loaded_parts = parts
+            if len(parts) > self.compact_parts:
+                self._compact()
+            return self._table
+        raise RuntimeError(f"Analytics parts in {self.folder} kept changing while being read")
+
+    def _compact(self):
+        """Replace the loaded part files by one holding the in-memory table (caller holds the lock)"""
+        name = self._write_part(self._table)
+        for part in self._loaded_parts:
+            try:
+                os.remove(os.path.join(self.folder, part))
+            except FileNotFoundError:
+                pass  # Merged by another process at the same time
+        logging.info(f"Compacted {len(self._loaded_parts)} analytics parts into one ({self._rows(self._table)} rows)")
+        self._loaded_parts = frozenset([name])
+
+    def _list_parts(self):
+        """Names of the finished part files"""
+        return sorted(name for name in os.listdir(self.folder)
+                      if name.startswith(self.PART_PREFIX) and name.endswith(self.PART_SUFFIX))
+
+    def _read_part(self, part):
+        """Load the columns of one part file"""
+        with np.load(os.path.join(self.folder, part), allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def _write_part(self, table):
+        """Write columns as a new part file, atomically, returning its name"""
+        name = f'{self.PART_PREFIX}{time.time_ns()}-{uuid.uuid4().hex[:8]}{self.PART_SUFFIX}'
+        temp_path = os.path.join(self.folder, f'.{name}.tmp')
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **table)
+        os.replace(temp_path, os.path.join(self.folder, name))
+        return name
+
+    def _merge(self, tables):
+        """
+        Concatenate tables, aligning count and permission columns, and keep the latest row per session
+
+        Returns:
+            dict: Merged columns
+        """
+        tables = [table for table in tables if self._rows(table)]
+        if not tables:
+            return self._table_of([])
+        merged = {}
+        for name in self.STRING_COLUMNS:
+            merged[name] = np.concatenate([table.get(name, np.full(self._rows(table), '')) for table in tables])
+        for name, (dtype, missing) in self.NUMERIC_COLUMNS.items():
+            merged[name] = np.concatenate([
+                table[name].astype(dtype) if name in table else np.full(self._rows(table), missing, dtype=dtype)
+                for table in tables
+            ])
+        count_names = sorted({name for table in tables for name in table if name.startswith(self.COUNT_PREFIX)})
+        for name in count_names:
+            merged[name] = np.concatenate([
+                table.get(name, np.zeros(self._rows(table), dtype=np.int64)) for table in tables
+            ])
+
+        # Permission bitsets are re-laid out over the union of every part's permission names
+        permission_names = sorted({name for table in tables for name in table['permission_names'].tolist()})
+        bit_of = {name: bit for bit, name in enumerate(permission_names)}
+        bits = []
+        for table in tables:
+            local = np.unpackbits(table['permission_bits'], axis=1, count=len(table['permission_names']))
+            aligned = np.zeros((self._rows(table), len(permission_names)), dtype=np.uint8)
+            aligned[:, [bit_of[name] for name in table['permission_names'].tolist()]] = local
+            bits.append(aligned)
+        merged['permission_names'] = np.array(permission_names, dtype=str)
+        merged['permission_bits'] = np.packbits(np.concatenate(bits), axis=1)
+
+        # A session recorded again (refined, re-analyzed) keeps only its latest row
+        order = np.lexsort((merged['recorded_at'], merged['session_id']))
+        sessions = merged['session_id'][order]
+        latest = np.ones(len(order), dtype=bool)
+        latest[:-1] = sessions[1:] != sessions[:-1]
+        keep = np.sort(order[latest])
+        if len(keep) < len(order):
+            merged = {name: column if name == 'permission_names' else column[keep] for name, column in merged.items()}
+        return merged
+
+    def _table_of(self, rows):
+        """Lay out row dicts (from _row_of) as columns"""
+        table = {name: np.array([row[name] for row in rows], dtype=str) if rows else np.array([], dtype=str)
+                 for name in self.STRING_COLUMNS}
+        for name, (dtype, _) in self.NUMERIC_COLUMNS.items():
+            table[name] = np.array([row[name] for row in rows], dtype=dtype)
+        for name in sorted({name for row in rows for name in row['counts']}):
+            table[self.COUNT_PREFIX + name] = np.array([row['counts'].get(name, 0) for row in rows], dtype=np.int64)
+        permission_names = sorted({name for row in rows for name in row['permissions']})
+        bit_of = {name: bit for bit, name in enumerate(permission_names)}
+        bits = np.zeros((len(rows), len(permission_names)), dtype=np.uint8)
+        for index, row in enumerate(rows):
+            bits[index, [bit_of[name] for name in row['permissions']]] = 1
+        table['permission_names'] = np.array(permission_names, dtype=str)
+        table['permission_bits'] = np.packbits(bits, axis=1)
+        return table
+
+    def _row_of(self, results):
+        """Extract the recorded fields of one analysis"""
+        obfuscation = results.get('obfuscation') or {}
+        permissions = results.get('permissions') or []
+        stage_seconds = results.get('stage_seconds') or {}
+        return {
+            'session_id': results.get('session_id') or '',
+            'sha256': results.get('sha256') or '',
+            'apk_name': results.get('apk_name') or '',
+            'package_name': results.get('package_name') or '',
+            'version_name': results.get('version_name') or '',
+            'version_code': results.get('version_code') or '',
+            'scan_mode': results.get('scan_mode') or 'full',
+            'recorded_at': time.time(),
+            'apk_size_mb': results.get('apk_size_mb') if results.get('apk_size_mb') is not None else np.nan,
+            'min_sdk': self._sdk_of(results.get('min_sdk_version')),
+            'target_sdk': self._sdk_of(results.get('target_sdk_version')),
+            'confidence': obfuscation.get('confidence', 0),
+            'is_obfuscated': obfuscation.get('is_obfuscated', False),
+            'partial': results.get('partial', False),
+            'files_analyzed': obfuscation.get('files_analyzed', 0),
+            'smali_files': obfuscation.get('smali_files_count', 0),
+            'java_files': obfuscation.get('java_files_count', 0),
+            'lines_analyzed': obfuscation.get('lines_analyzed', 0),
+            'total_snippets': obfuscation.get('total_snippets', len(obfuscation.get('code_snippets') or [])),
+            'permission_count': len(permissions),
+            'dangerous_permissions': sum(1 for p in permissions if p.get('protection_level') == 'dangerous'),
+            'runtime_seconds': results.get('runtime_seconds', np.nan),
+            'decompile_seconds': stage_seconds.get('decompile', np.nan),
+            'permissions_seconds': stage_seconds.get('permissions', np.nan),
+            'obfuscation_seconds': stage_seconds.get('obfuscation', np.nan),
+            'counts': {indicator['type']: indicator['count'] for indicator in obfuscation.get('indicators') or []},
+            'permissions': sorted({p['name'] for p in permissions if p.get('name')})
+        }
+
+    def _compare(self, table, name, operator, value):
+        """Evaluate one condition over a column"""
+        if name in self.STRING_COLUMNS:
+            if operator not in ('=', '!='):
+                raise ValueError(f"Column {name} only supports = and !=")
+            return self.OPERATORS[operator](table[name], value)
+        if name in self.NUMERIC_COLUMNS:
+            column = table[name]
+        elif name.startswith(self.COUNT_PREFIX):
+            # Indicators no recorded analysis has are zero everywhere
+            column = table.get(name, np.zeros(self._rows(table), dtype=np.int64))
+        else:
+            raise ValueError(f"Unknown column {name!r}")
+        if column.dtype == np.bool_:
+            if value.lower() not in ('true', 'false', '1', '0'):
+                raise ValueError(f"Column {name} compares to true or false, not {value!r}")
+            number = value.lower() in ('true', '1')
+        else:
+            try:
+                number = float(value)
+            except ValueError:
+                raise ValueError(f"Column {name} compares to numbers, not {value!r}") from None
+        matches = self.OPERATORS[operator](column, number)
+        if self.NUMERIC_COLUMNS.get(name, (None, None))[1] == self.UNKNOWN_SDK:
+            matches &= column != self.UNKNOWN_SDK
+        return matches
+
+    def _permission_column(self, table, permission):
+        """Boolean column telling which rows request a permission"""
+        names = table['permission_names']
+        bit = np.searchsorted(names, permission)
+        if bit >= len(names) or names[bit] != permission:
+            return np.zeros(self._rows(table), dtype=bool)
+        return (table['permission_bits'][:, bit >> 3] >> (7 - (bit & 7))) & 1 == 1
+
+    def _row_dict(self, table, index, columns):
+        """Build the output dict of one row"""
+        row = {}
+        for name in columns:
+            if name == 'permissions':
+                bits = np.unpackbits(table['permission_bits'][index], count=len(table['permission_names']))
+                row[name] = table['permission_names'][bits == 1].tolist()
+            elif name in table and name != 'permission_bits' and name != 'permission_names':
+                value = table[name][index].item()
+                unknown = self.NUMERIC_COLUMNS.get(name, (None, None))[1]
+                if (isinstance(value, float) and np.isnan(value)) or (unknown == self.UNKNOWN_SDK and value == unknown):
+                    value = None
+                row[name] = value
+            elif name.startswith(self.COUNT_PREFIX):
+                row[name] = 0
+            else:
+                raise ValueError(f"Unknown column {name!r}")
+        return row
+
+    def _full_permission_name(self, name):
+        """Expand a permission name given without a package ('READ_SMS')"""
+        return name if '.' in name else self.PERMISSION_PREFIX + name
+
+    @classmethod
+    def _sdk_of(cls, value):
+        """SDK version as a number, UNKNOWN_SDK if unknown"""
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return cls.UNKNOWN_SDK
+
+    @staticmethod
+    def _rows(table):
+        """Number of rows of a table"""
+        return len(table['session_id'])
@@ -0,0 +1,147 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+class ClassCache:
+    """Persistent cache of per-class scan results, keyed by a content hash of the class file
+
+    Library classes are byte-identical across APKs, so their indicator counts and
+    snippets only need to be computed once. Entries are evicted least recently used
+    first once max_entries is exceeded. Hits and new entries are buffered in memory and
+    written in one transaction per flush (once per scan), so a scan does not pay a
+    database write per file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS classes (
+            key BLOB PRIMARY KEY,
+            last_used REAL NOT NULL,
+            result TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_classes_last_used ON classes (last_used);
+    """
+
+    def __init__(self, db_path, max_entries=200000, memory_entries=20000):
+        """
+        Initialize the class cache
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_entries: Entries kept on disk before the least recently used are evicted
+            memory_entries: Entries kept decoded in the in-memory LRU front cache
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._pending = {}  # key -> result not yet written
+        self._touched = {}  # key -> last use time not yet written
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM classes').fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the cache described by a config, or None if it is disabled
+
+        Args:
+            config: Config class (or object with the same attributes)
+
+        Returns:
+            ClassCache: Cache instance, or None if CLASS_CACHE_PATH is not set
+        """
+        if not config.CLASS_CACHE_PATH:
+            return None
+        return cls(config.CLASS_CACHE_PATH, config.CLASS_CACHE_MAX_ENTRIES, config.CLASS_CACHE_MEMORY_ENTRIES)
+
+    def __len__(self):
+        with self._lock:
+            return self._size + len(self._pending)
+
+    def get(self, key):
+        """
+        Look up the cached scan result of a class
+
+        Args:
+            key: Content hash (bytes) of the class file and the pattern set
+
+        Returns:
+            dict: Cached result, or None on a miss
+        """
+        with self._lock:
+            result = self._memory.get(key)
+            if result is None:
+                result = self._pending.get(key)
+            if result is None:
+                row = self._conn.execute('SELECT result FROM classes WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                result = json.loads(row[0])
+            self._remember(key, result)
+            self._touched[key] = time.time()
+            return result
+
+    def put(self, key, result):
+        """
+        Cache the scan result of a class (written on the next flush)
+
+        Args:
+            key: Content hash (bytes) of the class file and the pattern set
+            result: JSON-serializable scan result
+        """
+        with self._lock:
+            self._pending[key] = result
+            self._touched.pop(key, None)
+            self._remember(key, result)
+
+    def flush(self):
+        """Write buffered entries and use times, then evict the least recently used entries over the limit"""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            now = time.time()
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO classes (key, last_used, result) VALUES (?, ?, ?)',
+                    ((key, now, json.dumps(result, separators=(',', ':'))) for key, result in self._pending.items())
+                )
+                self._size += self._conn.total_changes - before
+                self._conn.executemany(
+                    'UPDATE classes SET last_used = ? WHERE key = ?',
+                    ((used, key) for key, used in self._touched.items())
+                )
+                excess = self._size - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        'DELETE FROM classes WHERE key IN (SELECT key FROM classes ORDER BY last_used LIMIT ?)',
+                        (excess,)
+                    )
+                    self._size -= excess
+                    # Evicted entries may still sit in the front cache; it is small, so just reset it
+                    self._memory.clear()
+                    logging.info(f"Evicted {excess} least recently used entries from the class cache")
+            self._pending.clear()
+            self._touched.clear()
+
+    def close(self):
+        """Flush buffered entries and close the database connection"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, key, result):
+        """Insert into the in-memory LRU front cache (caller holds the lock)"""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,620 @@
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+class SessionStore:
+    """Persistent store for analysis sessions with TTL expiry and an in-memory LRU front cache"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            sha256 TEXT,
+            summary TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+
+        CREATE TABLE IF NOT EXISTS indicators (
+            session_id TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            severity TEXT,
+            description TEXT,
+            PRIMARY KEY (session_id, type)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS snippets (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            severity TEXT,
+            pattern_type TEXT,
+            file TEXT,
+            data TEXT NOT NULL,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_snippets_severity ON snippets (session_id, severity, seq);
+        CREATE INDEX IF NOT EXISTS idx_snippets_file ON snippets (session_id, file, seq);
+        CREATE INDEX IF NOT EXISTS idx_snippets_pattern ON snippets (session_id, pattern_type, seq);
+
+        CREATE TABLE IF NOT EXISTS snippet_facets (
+            session_id TEXT NOT NULL,
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (session_id, facet, value)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS file_manifests (
+            session_id TEXT PRIMARY KEY,
+            package_name TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_file_manifests_package ON file_manifests (package_name, created_at);
+
+        CREATE TABLE IF NOT EXISTS score_inputs (
+            session_id TEXT PRIMARY KEY,
+            lines INTEGER NOT NULL,
+            smali_files INTEGER NOT NULL,
+            dangerous_permissions INTEGER NOT NULL,
+            target_sdk TEXT,
+            counts TEXT NOT NULL,
+            confidence INTEGER NOT NULL,
+            is_obfuscated INTEGER NOT NULL,
+            security_score INTEGER
+        );
+    """
+
+    # Snippet columns that can be filtered on and counted per value
+    FACETS = ('severity', 'pattern_type')
+
+    def __init__(self, db_path, ttl_seconds=7 * 24 * 3600, cache_size=32):
+        """
+        Initialize the session store
+
+        Args:
+            db_path: Path to the SQLite database file
+            ttl_seconds: Lifetime of a session before it expires
+            cache_size: Number of session summaries kept in the in-memory LRU cache
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def save(self, session_id, results):
+        """
+        Persist analysis results for a session, replacing any previous version
+
+        Snippets and indicators are stored as indexed rows, and the per-file manifest
+        (obfuscation['files_manifest']) as a compressed blob that later builds of the same
+        package are diffed against; everything else is kept as a compact JSON summary.
+        Complete scans also get a score_inputs row, everything the confidence and security
+        score are computed from, so stored analyses can be re-scored in bulk.
+
+        Args:
+            session_id: Session identifier
+            results: Analysis results dictionary (as produced by start_full_analysis)
+        """
+        obfuscation = dict(results.get('obfuscation') or {})
+        code_snippets = obfuscation.pop('code_snippets', None) or []
+        indicators = obfuscation.pop('indicators', None) or []
+        files_manifest = obfuscation.pop('files_manifest', None)
+        obfuscation['total_snippets'] = len(code_snippets)
+
+        summary = dict(results)
+        summary['obfuscation'] = obfuscation
+
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            with self._conn:
+                self._delete(session_id)
+                self._conn.execute(
+                    'INSERT INTO sessions (session_id, created_at, expires_at, sha256, summary) VALUES (?, ?, ?, ?, ?)',
+                    (session_id, now, now + self.ttl_seconds, results.get('sha256'), self._dumps(summary))
+                )
+                self._conn.executemany(
+                    'INSERT INTO indicators (session_id, type, count, severity, description) VALUES (?, ?, ?, ?, ?)',
+                    ((session_id, i['type'], i['count'], i.get('severity'), i.get('description')) for i in indicators)
+                )
+                self._conn.executemany(
+                    'INSERT INTO snippets (session_id, seq, severity, pattern_type, file, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    (
+                        (session_id, seq, s.get('severity'), s.get('pattern_type'), s.get('file'), self._dumps(s))
+                        for seq, s in enumerate(code_snippets)
+                    )
+                )
+                # Precompute unfiltered facet counts so the first query page needs no scan
+                self._conn.executemany(
+                    'INSERT INTO snippet_facets (session_id, facet, value, count) VALUES (?, ?, ?, ?)',
+                    (
+                        (session_id, facet, value, count)
+                        for facet in self.FACETS
+                        for value, count in self._count_values(code_snippets, facet).items()
+                    )
+                )
+                if files_manifest is not None and results.get('package_name'):
+                    self._conn.execute(
+                        'INSERT INTO file_manifests (session_id, package_name, created_at, data) VALUES (?, ?, ?, ?)',
+                        (session_id, results['package_name'], now, zlib.compress(self._dumps(files_manifest).encode()))
+                    )
+                score_inputs = self._score_inputs(results, obfuscation)
+                if score_inputs is not None:
+                    self._conn.execute(
+                        'INSERT INTO score_inputs (session_id, lines, smali_files, dangerous_permissions, target_sdk, '
+                        'counts, confidence, is_obfuscated, security_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (session_id,) + score_inputs
+                    )
+            self._cache_put(session_id, self._with_indicators(summary, indicators), now + self.ttl_seconds)
+
+        logging.info(f"Stored session {session_id} ({len(indicators)} indicators, {len(code_snippets)} snippets)")
+
+    def get(self, session_id):
+        """
+        Get a session's results without its code snippets
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            dict: Results with obfuscation indicators and total_snippets, or None if unknown/expired
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                data, expires_at = cached
+                if expires_at > now:
+                    self._cache.move_to_end(session_id)
+                    return data
+                del self._cache[session_id]
+
+            row = self._conn.execute(
+                'SELECT summary, expires_at FROM sessions WHERE session_id = ? AND expires_at > ?',
+                (session_id, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            indicators = [
+                {'type': t, 'count': c, 'severity': sev, 'description': desc}
+                for t, c, sev, desc in self._conn.execute(
+                    'SELECT type, count, severity, description FROM indicators WHERE session_id = ?',
+                    (session_id,)
+                )
+            ]
+            data = self._with_indicators(json.loads(row[0]), indicators)
+            self._cache_put(session_id, data, row[1])
+            return data
+
+    def find_by_sha256(self, sha256):
+        """
+        Find the most recent live session that analyzed a given APK
+
+        Args:
+            sha256: Hex SHA-256 of the APK
+
+        Returns:
+            str: Session identifier, or None if the APK has no unexpired analysis
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT session_id FROM sessions WHERE sha256 = ? AND expires_at > ? ORDER BY created_at DESC LIMIT 1',
+                (sha256, time.time())
+            ).fetchone()
+            return row[0] if row else None
+
+    def find_baseline(self, package_name, exclude_session_id=None):
+        """
+        Find the most recent live analysis of a package that can be diffed against
+
+        Args:
+            package_name: Package name from the APK manifest
+            exclude_session_id: Session to ignore, e.g. the one being analyzed (optional)
+
+        Returns:
+            dict: session_id, results (as returned by get) and files_manifest, or None if the
+                  package has no unexpired analysis with a stored manifest
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT m.session_id, m.data FROM file_manifests m JOIN sessions s ON s.session_id = m.session_id '
+                'WHERE m.package_name = ? AND m.session_id != ? AND s.expires_at > ? '
+                'ORDER BY m.created_at DESC LIMIT 1',
+                (package_name, exclude_session_id or '', time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        results = self.get(row[0])
+        if results is None:
+            return None
+        return {'session_id': row[0], 'results': results, 'files_manifest': json.loads(zlib.decompress(row[1]))}
+
+    def get_manifest(self, session_id):
+        """
+        Get the per-file manifest stored with a session
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            dict: files_manifest, or None if the session has none
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM file_manifests WHERE session_id = ?', (session_id,)
+            ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def session_ids(self):
+        """
+        List the live sessions, most recent first
+
+        Returns:
+            list: Session identifiers of every unexpired session
+        """
+        with self._lock:
+            return [sid for (sid,) in self._conn.execute(
+                'SELECT session_id FROM sessions WHERE expires_at > ? ORDER BY created_at DESC', (time.time(),)
+            )]
+
+    def update(self, session_id, **fields):
+        """
+        Merge top-level fields into a stored session summary
+
+        Args:
+            session_id: Session identifier
+            **fields: Fields to set (e.g. apk_info, security_score)
+
+        Returns:
+            bool: True if the session exists and was updated
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT summary FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+            if row is None:
+                return False
+
+            summary = json.loads(row[0])
+            summary.update(fields)
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE sessions SET summary = ? WHERE session_id = ?', (self._dumps(summary), session_id)
+                )
+                if 'apk_info' in fields:
+                    self._conn.execute(
+                        'UPDATE score_inputs SET target_sdk = ? WHERE session_id = ?',
+                        (str(fields['apk_info'].get('target_sdk_version', '30')), session_id)
+                    )
+                if 'security_score' in fields:
+                    self._conn.execute(
+                        'UPDATE score_inputs SET security_score = ? WHERE session_id = ?',
+                        (fields['security_score']['score'], session_id)
+                    )
+
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                cached[0].update(fields)
+            return True
+
+    def score_inputs(self):
+        """
+        Get the score inputs of every live session that has them
+
+        Returns:
+            list: (session_id, lines, smali_files, dangerous_permissions, target_sdk, counts,
+                  confidence, is_obfuscated, security_score) tuples. counts maps each indicator to
+                  its total, target_sdk is None until the APK info was extracted and security_score
+                  is None until first computed.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT i.session_id, i.lines, i.smali_files, i.dangerous_permissions, i.target_sdk, i.counts, '
+                'i.confidence, i.is_obfuscated, i.security_score '
+                'FROM score_inputs i JOIN sessions s ON s.session_id = i.session_id WHERE s.expires_at > ?',
+                (time.time(),)
+            ).fetchall()
+        return [row[:5] + (json.loads(row[5]), row[6], bool(row[7]), row[8]) for row in rows]
+
+    def update_scores(self, scores):
+        """
+        Write re-scored verdicts back into stored sessions in one transaction
+
+        Args:
+            scores: Iterable of (session_id, confidence, is_obfuscated, security_score) tuples;
+                    security_score is a {'score', 'level'} dict, or None to leave it as is
+
+        Returns:
+            int: Number of sessions updated
+        """
+        updated = 0
+        with self._lock:
+            with self._conn:
+                for session_id, confidence, is_obfuscated, security_score in scores:
+                    row = self._conn.execute(
+                        'SELECT summary FROM sessions WHERE session_id = ?', (session_id,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    summary = json.loads(row[0])
+                    summary['obfuscation'] = {**(summary.get('obfuscation') or {}),
+                                              'confidence': confidence, 'is_obfuscated': is_obfuscated}
+                    if security_score is not None:
+                        summary['security_score'] = security_score
+                    self._conn.execute(
+                        'UPDATE sessions SET summary = ? WHERE session_id = ?', (self._dumps(summary), session_id)
+                    )
+                    self._conn.execute(
+                        'UPDATE score_inputs SET confidence = ?, is_obfuscated = ?, '
+                        'security_score = COALESCE(?, security_score) WHERE session_id = ?',
+                        (confidence, int(is_obfuscated), security_score['score'] if security_score else None, session_id)
+                    )
+                    # Cached copies also hold the indicator rows, so reload on next access instead of patching
+                    self._cache.pop(session_id, None)
+                    updated += 1
+        return updated
+
+    def count_snippets(self, session_id):
+        """Get the number of stored code snippets for a session"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM snippets WHERE session_id = ?', (session_id,)
+            ).fetchone()[0]
+
+    def get_snippets(self, session_id, offset=0, limit=10):
+        """
+        Get a page of code snippets in their stored (severity, file) order
+
+        Args:
+            session_id: Session identifier
+            offset: Number of snippets to skip
+            limit: Maximum number of snippets to return
+
+        Returns:
+            list: Snippet dictionaries
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM snippets WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?',
+                (session_id, max(offset, 0), limit)
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def query_snippets(self, session_id, severity=None, pattern_type=None, file_prefix=None, after=None, limit=50):
+        """
+        Get one page of filtered code snippets using keyset (cursor) pagination
+
+        Every page is a bounded index range scan starting after the cursor, so the
+        cost does not grow with page depth.
+
+        Args:
+            session_id: Session identifier
+            severity: Severity value or list of values to keep (optional)
+            pattern_type: Pattern name or list of names to keep (optional)
+            file_prefix: Keep only snippets whose file path starts with this prefix (optional)
+            after: Cursor returned by the previous page, None for the first page
+            limit: Maximum number of snippets to return
+
+        Returns:
+            tuple: (snippets, next_cursor) where next_cursor is None on the last page
+        """
+        where, params = self._snippet_filter(session_id, severity, pattern_type, file_prefix)
+        if after is not None:
+            where.append('seq > ?')
+            params.append(after)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT seq, data FROM snippets WHERE {" AND ".join(where)} ORDER BY seq LIMIT ?',
+                (*params, limit + 1)
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        snippets = [{**json.loads(data), 'seq': seq} for seq, data in rows]
+        next_cursor = rows[-1][0] if has_more else None
+        return snippets, next_cursor
+
+    def snippet_facets(self, session_id, severity=None, pattern_type=None, file_prefix=None):
+        """
+        Count snippets per severity and per pattern type
+
+        Each facet is counted with every filter applied except its own, so the counts
+        show what selecting another value of that facet would return.
+
+        Args:
+            session_id: Session identifier
+            severity: Severity filter (optional)
+            pattern_type: Pattern type filter (optional)
+            file_prefix: File path prefix filter (optional)
+
+        Returns:
+            dict: {'total': int, 'severity': {value: count}, 'pattern_type': {value: count}}
+        """
+        filters = {'severity': severity, 'pattern_type': pattern_type}
+        facets = {}
+        with self._lock:
+            for facet in self.FACETS:
+                others = {name: value for name, value in filters.items() if name != facet}
+                if not file_prefix and not any(others.values()):
+                    rows = self._conn.execute(
+                        'SELECT value, count FROM snippet_facets WHERE session_id = ? AND facet = ?',
+                        (session_id, facet)
+                    )
+                else:
+                    where, params = self._snippet_filter(session_id, file_prefix=file_prefix, **others)
+                    rows = self._conn.execute(
+                        f'SELECT {facet}, COUNT(*) FROM snippets WHERE {" AND ".join(where)} GROUP BY {facet}',
+                        params
+                    )
+                facets[facet] = {value: count for value, count in rows if value is not None}
+
+        # The total under all filters follows from the severity facet once its own filter is applied
+        selected = self._as_list(severity)
+        facets['total'] = sum(
+            count for value, count in facets['severity'].items() if not selected or value in selected
+        )
+        return facets
+
+    def delete(self, session_id):
+        """Remove a session and all of its rows"""
+        with self._lock:
+            with self._conn:
+                self._delete(session_id)
+
+    def purge_expired(self):
+        """
+        Remove all expired sessions
+
+        Returns:
+            int: Number of sessions removed
+        """
+        with self._lock:
+            return self._purge_expired(time.time())
+
+    @staticmethod
+    def is_reusable(results, allow_triage=False):
+        """
+        Tell whether stored results can stand in for a fresh analysis of the same APK
+
+        Args:
+            results: Stored results (as returned by get), or None
+            allow_triage: Also accept triage (sampled) results (optional)
+
+        Returns:
+            bool: False for partial and incomplete scans and, unless allowed, triage results
+        """
+        if results is None or results.get('partial'):
+            return False
+        if results.get('scan_mode') == 'triage':
+            return allow_triage
+        # Results stored before coverage was recorded always come from complete scans
+        coverage = (results.get('obfuscation') or {}).get('coverage')
+        return coverage is None or coverage.get('complete', False)
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    def _migrate(self):
+        """Bring databases created by older versions up to the current schema"""
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(sessions)')}
+        if 'sha256' not in columns:
+            self._conn.execute('ALTER TABLE sessions ADD COLUMN sha256 TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_sha256 ON sessions (sha256, created_at)')
+
+    def _purge_expired(self, now):
+        """Remove expired sessions (caller holds the lock)"""
+        expired = [sid for (sid,) in self._conn.execute(
+            'SELECT session_id FROM sessions WHERE expires_at <= ?', (now,)
+        )]
+        if expired:
+            with self._conn:
+                for session_id in expired:
+                    self._delete(session_id)
+            logging.info(f"Expired {len(expired)} analysis sessions")
+        return len(expired)
+
+    def _delete(self, session_id):
+        """Delete a session's rows (caller holds the lock and a transaction)"""
+        for table in ('snippets', 'snippet_facets', 'indicators', 'file_manifests', 'score_inputs', 'sessions'):
+            self._conn.execute(f'DELETE FROM {table} WHERE session_id = ?', (session_id,))
+        self._cache.pop(session_id, None)
+
+    def _cache_put(self, session_id, data, expires_at):
+        """Insert into the LRU cache, evicting the least recently used entry when full"""
+        self._cache[session_id] = (data, expires_at)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _snippet_filter(self, session_id, severity=None, pattern_type=None, file_prefix=None):
+        """Build the WHERE clauses and parameters for a snippet filter"""
+        where = ['session_id = ?']
+        params = [session_id]
+        for column, value in (('severity', severity), ('pattern_type', pattern_type)):
+            values = self._as_list(value)
+            if values:
+                where.append(f'{column} IN ({", ".join("?" * len(values))})')
+                params.extend(values)
+        if file_prefix:
+            # A half-open range keeps the prefix match on the (session_id, file) index
+            where.append('file >= ? AND file < ?')
+            params.extend([file_prefix, file_prefix + '\U0010ffff'])
+        return where, params
+
+    @staticmethod
+    def _score_inputs(results, obfuscation):
+        """
+        Build the score_inputs row of a session (without its id)
+
+        Returns:
+            tuple: Row values, or None for results whose confidence is not computed from
+                   stored totals (triage samples, partial scans, bundles, older results)
+        """
+        if 'pattern_counts' not in obfuscation or 'bundle' in results or obfuscation.get('triage') is not None:
+            return None
+        if not (obfuscation.get('coverage') or {}).get('complete', False):
+            return None
+        counts = dict(obfuscation['pattern_counts'])
+        for indicator_type, count in (obfuscation.get('structure_counts') or {}).items():
+            counts[indicator_type] = counts.get(indicator_type, 0) + count
+        apk_info = results.get('apk_info')
+        security_score = results.get('security_score')
+        return (
+            obfuscation.get('lines_analyzed', 0),
+            obfuscation.get('smali_files_scanned', 0),
+            sum(1 for p in results.get('permissions') or [] if p.get('protection_level') == 'dangerous'),
+            str(apk_info.get('target_sdk_version', '30')) if apk_info is not None else None,
+            SessionStore._dumps(counts),
+            obfuscation.get('confidence', 0),
+            int(obfuscation.get('is_obfuscated', False)),
+            security_score['score'] if security_score else None
+        )
+
+    @staticmethod
+    def _as_list(value):
+        """Normalize a single value or list of values to a list (empty for None)"""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        return list(value)
+
+    @staticmethod
+    def _count_values(items, key):
+        """Count dictionaries per value of a key"""
+        counts = {}
+        for item in items:
+            value = item.get(key)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    @staticmethod
+    def _with_indicators(summary, indicators):
+        """Attach indicator rows back onto a summary's obfuscation section"""
+        obfuscation = dict(summary.get('obfuscation') or {})
+        obfuscation['indicators'] = indicators
+        return {**summary, 'obfuscation': obfuscation}
+
+    @staticmethod
+    def _dumps(value):
+        """Serialize to compact JSON"""
+        return json.dumps(value, separators=(',', ':'))
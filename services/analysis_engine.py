@@ -0,0 +1,715 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import functools
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from services.bundle_service import BundleService
+from utils.archive_utils import PackArchive
+
+class NullSink:
+    """Progress sink that drops every event
+
+    It is falsy, so services handed a NullSink as their socketio skip building
+    progress payloads altogether.
+    """
+
+    def emit(self, event, data=None, **kwargs):
+        pass
+
+    def __bool__(self):
+        return False
+
+class CallbackSink:
+    """Progress sink that calls a function with (event, data) for every event"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, event, data=None, **kwargs):
+        self.callback(event, data)
+
+class QueueSink:
+    """Progress sink that puts (event, data) tuples on a queue.Queue (or compatible)"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def emit(self, event, data=None, **kwargs):
+        self.queue.put((event, data))
+
+class SocketSink:
+    """Progress sink that forwards events to a SocketIO server"""
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def emit(self, event, data=None, **kwargs):
+        self.socketio.emit(event, data, **kwargs)
+
+class AnalysisEngine:
+    """Runs the full APK analysis pipeline independently of Flask and SocketIO
+
+    Progress is reported through a sink: any object with an emit(event, data)
+    method, such as SocketSink, CallbackSink, QueueSink or NullSink. Services
+    emit through the sink they were created with; from_config creates them with
+    the engine's sink.
+    """
+
+    MAX_SPLIT_WORKERS = 4  # Split APKs of one bundle analyzed concurrently
+    CANCELLED_MESSAGE = "Analysis cancelled"
+    SEVERITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+    # Per-split obfuscation fields that do not describe the merged bundle
+    SPLIT_OBFUSCATION_KEYS = ('files_manifest', 'pattern_counts', 'structure_counts', 'lines_analyzed',
+                              'smali_files_scanned')
+
+    def __init__(self, apk_service, permission_service, obfuscation_service, sink=None, bundle_service=None):
+        """
+        Initialize the analysis engine
+
+        Args:
+            apk_service: ApkService instance
+            permission_service: PermissionService instance
+            obfuscation_service: ObfuscationService instance
+            sink: Progress sink for engine-level status events (optional)
+            bundle_service: BundleService for XAPK/APKS/APKM input (optional, bundles are rejected without it)
+        """
+        self.apk_service = apk_service
+        self.permission_service = permission_service
+        self.obfuscation_service = obfuscation_service
+        self.sink = sink if sink is not None else NullSink()
+        self.bundle_service = bundle_service
+
+    @classmethod
+    def from_config(cls, config, sink=None, permission_model=None, output_folder=None):
+        """
+        Build an engine and its services from a Config class
+
+        Args:
+            config: Config class (or object with the same attributes)
+            sink: Progress sink shared by the engine and its services (optional)
+            permission_model: PermissionModel to reuse (loaded from config if omitted)
+            output_folder: Folder for decompiled output (defaults to config.OUTPUT_FOLDER)
+
+        Returns:
+            AnalysisEngine: Ready-to-use engine
+        """
+        # Imported here so sinks can be used without pulling in pandas for the permission model
+        from models.permission import PermissionModel
+        from models.class_cache import ClassCache
+        from services.apk_service import ApkService
+        from services.permission_service import PermissionService
+        from services.obfuscation_service import ObfuscationService
+        from utils.content_store import ContentStore
+        from utils.scratch_utils import ScratchSpace
+        from utils.prefix_trie import PackagePrefixTrie
+        from services.jvm_service import JvmService
+
+        sink = sink if sink is not None else NullSink()
+        permission_model = permission_model or PermissionModel(config.PERMISSION_FILE_PATH)
+        output_folder = output_folder or config.OUTPUT_FOLDER
+        os.makedirs(output_folder, exist_ok=True)
+
+        return cls(
+            ApkService(config.APKTOOL_JAR_PATH, output_folder, sink, pack_output=config.PACK_DECOMPILED_OUTPUT,
+                       scratch=ScratchSpace.from_config(config), jvm=JvmService.from_config(config),
+                       framework_folder=config.APKTOOL_FRAMEWORK_FOLDER,
+                       extra_frameworks=config.APKTOOL_EXTRA_FRAMEWORKS,
+                       timeout=config.APKTOOL_TIMEOUT_SECONDS),
+            PermissionService(permission_model, sink),
+            ObfuscationService(sink, config.OBFUSCATION_THRESHOLD,
+                               PackagePrefixTrie.from_file(config.LIBRARY_PREFIXES_PATH),
+                               config.LIBRARY_SCAN_MODE, ClassCache.from_config(config)),
+            sink,
+            BundleService(ContentStore(config.CONTENT_STORE_FOLDER))
+        )
+
+    def analyze(self, apk_path, original_filename=None, session_id=None, sha256=None, cancel_event=None,
+                time_budget=None, triage=False, find_baseline=None):
+        """
+        Run the full analysis of one APK (or split-APK bundle)
+
+        Args:
+            apk_path: Path to the APK file, or to an XAPK/APKS/APKM bundle
+            original_filename: Name to report the APK under (defaults to the file name)
+            session_id: Identifier stored in the results (generated if omitted)
+            sha256: SHA-256 of the APK, stored in the results (optional)
+            cancel_event: threading.Event that aborts the analysis when set (optional). apktool
+                          is killed, scans stop at the next file and the partial output is deleted.
+            time_budget: Seconds the analysis may take (optional). Permissions are always analyzed
+                         in full; once the budget is spent the obfuscation scan stops and the
+                         results are partial, as described by results['obfuscation']['coverage'].
+            triage: Estimate the obfuscation verdict from a stratified sample of the code, stopping
+                    once it is statistically settled (optional)
+            find_baseline: Diff mode (optional). Function mapping the package name to a previous
+                           analysis of the same app (as returned by SessionStore.find_baseline),
+                           or None. Only classes changed since that analysis are rescanned, and
+                           results['diff'] reports the changes. Bundles are always analyzed in full.
+
+        Returns:
+            tuple: (success, analysis results dict or error_message)
+        """
+        if BundleService.is_bundle(apk_path):
+            return self.analyze_bundle(apk_path, original_filename, session_id, sha256, cancel_event, time_budget,
+                                       triage)
+        if self._is_cancelled(cancel_event):
+            return False, self.CANCELLED_MESSAGE
+
+        start_time = time.time()
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        original_filename = original_filename or os.path.basename(apk_path)
+        logging.info(f"Starting full analysis for {original_filename}...")
+
+        analysis_results = {
+            'session_id': session_id or str(uuid.uuid4()),
+            'sha256': sha256,
+            'apk_name': original_filename,
+            'apk_path': apk_path,
+            'output_dir': None,  # Decompiled directory (or packed archive), filled after decompilation
+            'apk_size_mb': None,
+            'package_name': None,  # From the decoded manifest; identifies builds of the same app for diffs
+            'version_name': None,
+            'version_code': None,
+            'min_sdk_version': None,
+            'target_sdk_version': None,
+            'permissions': [],
+            'obfuscation': {},
+            'manifest_content': 'Not extracted',
+            'file_structure': 'Not extracted',
+            'job_stats': {},  # Resource usage of the apktool runs (CPU time, max RSS)
+            'stage_seconds': {},  # Wall time of each stage: decompile, permissions, obfuscation
+            'partial': False,  # True if the time budget ran out before the obfuscation scan finished
+            'time_budget_seconds': time_budget,
+            'scan_mode': 'triage' if triage else 'full'
+        }
+
+        # 1. Decompile APK
+        logging.info(f"Decompiling {original_filename}...")
+        stage_start = time.perf_counter()
+        success_decompile, decompiled_data_or_error, apk_size_mb = self.apk_service.decompile_apk(
+            apk_path, job_stats=analysis_results['job_stats'], cancel_event=cancel_event)
+        analysis_results['stage_seconds']['decompile'] = round(time.perf_counter() - stage_start, 3)
+        if not success_decompile:
+            if self._is_cancelled(cancel_event):
+                return False, self.CANCELLED_MESSAGE
+            return False, f"Decompilation failed: {decompiled_data_or_error}"
+
+        decompiled_dir = decompiled_data_or_error
+        analysis_results['apk_size_mb'] = apk_size_mb
+        analysis_results['output_dir'] = decompiled_dir
+        analysis_results.update(self._read_package_info(decompiled_dir))
+
+        cancelled = False
+        try:
+            # 2. Analyze Permissions
+            if not self._is_cancelled(cancel_event):
+                logging.info("Analyzing permissions...")
+                stage_start = time.perf_counter()
+                success_perm, permissions_data = self.permission_service.analyze_permissions(decompiled_dir)
+                analysis_results['stage_seconds']['permissions'] = round(time.perf_counter() - stage_start, 3)
+                if success_perm:
+                    analysis_results['permissions'] = permissions_data
+                else:
+                    logging.error(f"Permission analysis failed: {permissions_data}")
+                    self.sink.emit('analysis_status', {'message': f'Permission analysis failed: {permissions_data}'})
+
+            # 3. Analyze Obfuscation
+            if not self._is_cancelled(cancel_event):
+                baseline = None
+                if find_baseline is not None and not triage and analysis_results['package_name']:
+                    baseline = find_baseline(analysis_results['package_name'])
+                    if baseline is None:
+                        logging.info(f"No previous analysis of {analysis_results['package_name']}, scanning in full")
+                    elif (baseline['results'].get('obfuscation') or {}).get('pattern_versions') != \
+                            self.obfuscation_service.pattern_versions:
+                        # Recorded per-file results are only reusable under the same rules
+                        logging.info(f"Previous analysis of {analysis_results['package_name']} used other "
+                                     f"obfuscation patterns, scanning in full")
+                        baseline = None
+                logging.info("Analyzing obfuscation...")
+                stage_start = time.perf_counter()
+                # Full scans record a per-file manifest so later builds can be diffed against them
+                success_obf, obfuscation_data = self.obfuscation_service.analyze_obfuscation(
+                    decompiled_dir, cancel_event, deadline, triage, manifest=not triage,
+                    baseline=baseline['files_manifest'] if baseline else None)
+                analysis_results['stage_seconds']['obfuscation'] = round(time.perf_counter() - stage_start, 3)
+                if success_obf:
+                    analysis_results['obfuscation'] = obfuscation_data
+                    # A settled triage sample is a finished verdict; only running out of time is partial
+                    analysis_results['partial'] = (obfuscation_data.get('coverage') or {}).get('stopped_reason') == 'deadline'
+                    if analysis_results['partial']:
+                        # An incomplete manifest would make the unscanned files look added in the next diff
+                        obfuscation_data.pop('files_manifest', None)
+                    if baseline:
+                        analysis_results['scan_mode'] = 'diff'
+                        analysis_results['diff'] = self._diff_report(baseline, analysis_results)
+                elif not obfuscation_data.get('cancelled'):
+                    logging.error(f"Obfuscation analysis failed: {obfuscation_data}")
+                    self.sink.emit('analysis_status', {'message': f'Obfuscation analysis failed: {obfuscation_data}'})
+        finally:
+            cancelled = self._is_cancelled(cancel_event)
+            if cancelled:
+                # Nobody will look at a cancelled job's output, so drop it instead of persisting it
+                self.apk_service.discard_output(decompiled_dir)
+            else:
+                # Scanning is done, so move the kept output out of scratch space (a no-op for on-disk output)
+                analysis_results['output_dir'] = self.apk_service.finalize_output(decompiled_dir)
+
+        if cancelled:
+            logging.info(f"Analysis of {original_filename} cancelled after {time.time() - start_time:.2f} seconds.")
+            return False, self.CANCELLED_MESSAGE
+
+        runtime_seconds = round(time.time() - start_time, 2)
+        analysis_results['runtime_seconds'] = runtime_seconds
+        analysis_results['runtime_display'] = self.format_runtime(runtime_seconds)
+
+        logging.info(f"Full analysis for {original_filename} completed in {runtime_seconds} seconds.")
+        return True, analysis_results
+
+    def analyze_bundle(self, bundle_path, original_filename=None, session_id=None, sha256=None, cancel_event=None,
+                       time_budget=None, triage=False):
+        """
+        Analyze every split APK of a bundle in parallel and merge them into one report
+
+        Args:
+            bundle_path: Path to the .xapk/.apks/.apkm file
+            original_filename: Name to report the bundle under (defaults to the file name)
+            session_id: Identifier stored in the results (generated if omitted)
+            sha256: SHA-256 of the bundle, stored in the results (optional)
+            cancel_event: threading.Event that aborts the analysis of every split when set (optional)
+            time_budget: Seconds the whole bundle analysis may take, shared by all splits (optional)
+            triage: Scan every split in triage mode (optional)
+
+        Returns:
+            tuple: (success, merged analysis results dict or error_message)
+        """
+        if self.bundle_service is None:
+            return False, "Split-APK bundles are not supported by this analyzer"
+
+        start_time = time.time()
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        original_filename = original_filename or os.path.basename(bundle_path)
+        logging.info(f"Starting bundle analysis for {original_filename}...")
+
+        success, splits = self.bundle_service.ingest_bundle(bundle_path)
+        if not success:
+            return False, splits
+        self.sink.emit('analysis_status', {'message': f'Analyzing {len(splits)} split APK(s)...'})
+
+        # Keyed by split index: byte-identical splits share one content-store path but get their own output
+        split_results = {}
+        workers = min(len(splits), self.MAX_SPLIT_WORKERS)
+        for index, _, split_success, result in self._analyze_indexed([split['path'] for split in splits], workers,
+                                                                     cancel_event, deadline, triage):
+            split_results[index] = (split_success, result)
+        if self._is_cancelled(cancel_event):
+            # Splits that finished before the cancellation keep no output either
+            self._discard_split_outputs(split_results)
+            return False, self.CANCELLED_MESSAGE
+
+        base_success, base_result = split_results[0]
+        if not base_success:
+            # Without the base split there is no report, so the other splits' output is not kept
+            self._discard_split_outputs(split_results)
+            return False, f"Base APK analysis failed: {base_result}"
+
+        merged = self._merge_split_results(splits, split_results)
+        merged.update({
+            'session_id': session_id or str(uuid.uuid4()),
+            'sha256': sha256,
+            'apk_name': original_filename,
+            'apk_path': bundle_path,
+            'apk_size_mb': round(os.path.getsize(bundle_path) / (1024 * 1024), 2),
+            'time_budget_seconds': time_budget,
+            'scan_mode': 'triage' if triage else 'full'
+        })
+
+        runtime_seconds = round(time.time() - start_time, 2)
+        merged['runtime_seconds'] = runtime_seconds
+        merged['runtime_display'] = self.format_runtime(runtime_seconds)
+
+        logging.info(f"Bundle analysis for {original_filename} ({len(splits)} splits) completed in {runtime_seconds} seconds.")
+        return True, merged
+
+    def _discard_split_outputs(self, split_results):
+        """Delete the kept output of every split analyzed successfully"""
+        for split_success, result in split_results.values():
+            if split_success:
+                self.apk_service.discard_output(result['output_dir'])
+
+    def _merge_split_results(self, splits, split_results):
+        """
+        Merge per-split results into one report
+
+        Permissions are unioned, indicator counts summed and snippets tagged with
+        their split. The bundle counts as obfuscated if any split is, with the
+        highest split confidence.
+
+        Args:
+            splits: Split dicts from BundleService.ingest_bundle (base first)
+            split_results: Split index -> (success, results or error_message)
+
+        Returns:
+            dict: Merged results, based on the base split's results
+        """
+        merged = dict(split_results[0][1])
+        permissions = {}
+        indicators = {}
+        code_snippets = []
+        obfuscation_totals = {'files_analyzed': 0, 'smali_files_count': 0, 'java_files_count': 0}
+        confidence = 0
+        is_obfuscated = False
+        bundle_splits = []
+        split_output_dirs = {}
+        apktool_runs = []
+        stage_seconds = {}
+        coverage = {'files_scanned': 0, 'files_total': 0, 'bytes_scanned': 0}
+        complete = True
+        stopped_reasons = set()
+        libraries = None
+        class_cache = None
+
+        for order, split in enumerate(splits):
+            success, result = split_results[order]
+            split_info = {key: split[key] for key in ('name', 'member', 'sha256', 'is_base')}
+            split_info['size_mb'] = round(split['size'] / (1024 * 1024), 2)
+            if not success:
+                split_info['error'] = result
+                bundle_splits.append(split_info)
+                continue
+
+            split_output_dirs[split['name']] = result['output_dir']
+            apktool_runs.extend((result.get('job_stats') or {}).get('apktool_runs') or [])
+            for stage, seconds in (result.get('stage_seconds') or {}).items():
+                stage_seconds[stage] = round(stage_seconds.get(stage, 0) + seconds, 3)
+            for permission in result.get('permissions') or []:
+                permissions.setdefault(permission['name'], permission)
+
+            obfuscation = result.get('obfuscation') or {}
+            for indicator in obfuscation.get('indicators') or []:
+                if indicator['type'] in indicators:
+                    indicators[indicator['type']]['count'] += indicator['count']
+                else:
+                    indicators[indicator['type']] = dict(indicator)
+            for snippet in obfuscation.get('code_snippets') or []:
+                code_snippets.append((order, {**snippet, 'split': split['name']}))
+            for key in obfuscation_totals:
+                obfuscation_totals[key] += obfuscation.get(key, 0)
+            split_coverage = obfuscation.get('coverage') or {}
+            for key in coverage:
+                coverage[key] += split_coverage.get(key, 0)
+            complete = complete and split_coverage.get('complete', True)
+            if split_coverage.get('stopped_reason'):
+                stopped_reasons.add(split_coverage['stopped_reason'])
+            if obfuscation.get('libraries'):
+                libraries = self._merge_libraries(libraries, obfuscation['libraries'])
+            if obfuscation.get('class_cache'):
+                class_cache = self._merge_class_cache(class_cache, obfuscation['class_cache'])
+            confidence = max(confidence, obfuscation.get('confidence', 0))
+            is_obfuscated = is_obfuscated or obfuscation.get('is_obfuscated', False)
+
+            split_info['permissions'] = len(result.get('permissions') or [])
+            split_info['files_analyzed'] = obfuscation.get('files_analyzed', 0)
+            split_info['total_snippets'] = len(obfuscation.get('code_snippets') or [])
+            bundle_splits.append(split_info)
+
+        # Same ordering as a single APK (severity, then file), keeping each split's snippets together
+        code_snippets.sort(key=lambda item: (
+            self.SEVERITY_ORDER.get(item[1].get('severity', 'low'), 2), item[0], item[1].get('file', '')
+        ))
+        code_snippets = [snippet for _, snippet in code_snippets]
+
+        merged['permissions'] = list(permissions.values())
+        # Split manifests and score inputs are not kept: bundles are not diffed, re-analyzed or re-scored
+        merged['obfuscation'] = {
+            **{key: value for key, value in merged.get('obfuscation', {}).items()
+               if key not in self.SPLIT_OBFUSCATION_KEYS},
+            **obfuscation_totals,
+            'is_obfuscated': is_obfuscated,
+            'confidence': confidence,
+            'indicators': list(indicators.values()),
+            'code_snippets': code_snippets,
+            'total_snippets': len(code_snippets),
+            'summary': f'Analyzed {obfuscation_totals["files_analyzed"]} files across {len(splits)} split APKs, '
+                       f'found {len(code_snippets)} obfuscated code snippets',
+            'coverage': {
+                'complete': complete,
+                **coverage,
+                'files_percent': round(coverage['files_scanned'] / coverage['files_total'] * 100, 1)
+                                 if coverage['files_total'] else 100.0,
+                # Running out of time outweighs a settled triage verdict in another split
+                'stopped_reason': 'deadline' if 'deadline' in stopped_reasons else next(iter(stopped_reasons), None)
+            }
+        }
+        if libraries is not None:
+            merged['obfuscation']['libraries'] = libraries
+        if class_cache is not None:
+            merged['obfuscation']['class_cache'] = class_cache
+        merged['partial'] = 'deadline' in stopped_reasons
+        merged['bundle'] = {'splits': bundle_splits}
+        merged['split_output_dirs'] = split_output_dirs
+        merged['job_stats'] = {'apktool_runs': apktool_runs}
+        # Summed over the splits, which run in parallel, so they can exceed the bundle's runtime
+        merged['stage_seconds'] = stage_seconds
+        return merged
+
+    @staticmethod
+    def _merge_libraries(merged, libraries):
+        """Add one split's known-library tally to the bundle's"""
+        if merged is None:
+            return {**libraries, 'prefixes': [dict(entry) for entry in libraries['prefixes']]}
+        for key in ('files', 'bytes', 'files_skipped', 'bytes_skipped'):
+            merged[key] += libraries[key]
+        if libraries['estimated_seconds_saved'] is not None:
+            merged['estimated_seconds_saved'] = round((merged['estimated_seconds_saved'] or 0)
+                                                      + libraries['estimated_seconds_saved'], 3)
+        by_prefix = {entry['prefix']: entry for entry in merged['prefixes']}
+        for entry in libraries['prefixes']:
+            if entry['prefix'] in by_prefix:
+                by_prefix[entry['prefix']]['files'] += entry['files']
+                by_prefix[entry['prefix']]['bytes'] += entry['bytes']
+            else:
+                by_prefix[entry['prefix']] = dict(entry)
+        merged['prefixes'] = sorted(by_prefix.values(), key=lambda entry: entry['bytes'], reverse=True)
+        return merged
+
+    @staticmethod
+    def _merge_class_cache(merged, class_cache):
+        """Add one split's class cache counters to the bundle's"""
+        if merged is None:
+            return dict(class_cache)
+        for key in ('hits', 'misses', 'bytes_from_cache'):
+            merged[key] += class_cache[key]
+        lookups = merged['hits'] + merged['misses']
+        merged['hit_rate'] = round(merged['hits'] / lookups, 3) if lookups else 0.0
+        if class_cache['estimated_seconds_saved'] is not None:
+            merged['estimated_seconds_saved'] = round((merged['estimated_seconds_saved'] or 0)
+                                                      + class_cache['estimated_seconds_saved'], 3)
+        return merged
+
+    def reanalyze(self, results, code_snippets, files_manifest=None, cancel_event=None):
+        """
+        Update a stored analysis after the obfuscation patterns changed
+
+        Only new and changed patterns are evaluated again over the retained decompiled output;
+        the confidence and verdict are recomputed from the stored per-pattern counts.
+
+        Args:
+            results: Stored analysis results (as returned by SessionStore.get)
+            code_snippets: The analysis' stored code snippets
+            files_manifest: The analysis' stored files_manifest, kept in step (optional)
+            cancel_event: threading.Event that aborts the re-analysis when set (optional)
+
+        Returns:
+            tuple: (success, updated analysis results dict or error_message)
+        """
+        if 'bundle' in results:
+            return False, "Bundle analyses cannot be re-analyzed, analyze the bundle again"
+        if not results.get('output_dir'):
+            return False, "Analysis has no decompiled output"
+
+        success, obfuscation_data = self.obfuscation_service.reanalyze_obfuscation(
+            results['output_dir'], results.get('obfuscation') or {}, code_snippets, files_manifest, cancel_event)
+        if not success:
+            if obfuscation_data.get('cancelled'):
+                return False, self.CANCELLED_MESSAGE
+            return False, f"Re-analysis failed: {obfuscation_data['error']}"
+
+        updated = {key: value for key, value in results.items() if key not in ('apk_info', 'security_score')}
+        # The security score depends on the verdict; it is recomputed when the session is next opened
+        updated['obfuscation'] = obfuscation_data
+        return True, updated
+
+    def analyze_many(self, apk_paths, max_workers=1, cancel_event=None, deadline=None, triage=False):
+        """
+        Analyze several APKs, yielding each result as soon as it is ready
+
+        With max_workers > 1 the APKs are analyzed on a thread pool (decompilation
+        runs in a child process, so it overlaps well) and results are yielded in
+        completion order.
+
+        Args:
+            apk_paths: Iterable of APK paths
+            max_workers: Number of APKs analyzed concurrently
+            cancel_event: threading.Event that aborts running analyses and skips the rest when set (optional)
+            deadline: time.monotonic() value by which every analysis must return a (possibly partial) result
+            triage: Scan in triage mode (optional)
+
+        Yields:
+            tuple: (apk_path, success, analysis results dict or error_message)
+        """
+        for _, apk_path, success, result in self._analyze_indexed(apk_paths, max_workers, cancel_event, deadline,
+                                                                  triage):
+            yield apk_path, success, result
+
+    def _analyze_indexed(self, apk_paths, max_workers=1, cancel_event=None, deadline=None, triage=False):
+        """
+        analyze_many, also yielding each APK's position so repeated paths stay apart
+
+        Yields:
+            tuple: (index, apk_path, success, analysis results dict or error_message)
+        """
+        if max_workers <= 1:
+            for index, apk_path in enumerate(apk_paths):
+                if self._is_cancelled(cancel_event):
+                    return
+                yield (index, apk_path) + self._analyze_safely(apk_path, cancel_event, deadline, triage)
+            return
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Keep at most max_workers APKs in flight so huge iterables are consumed lazily
+            apk_paths = enumerate(apk_paths)
+            pending = {}
+            for index, apk_path in apk_paths:
+                pending[executor.submit(self._analyze_safely, apk_path, cancel_event, deadline, triage)] = (index, apk_path)
+                if len(pending) >= max_workers:
+                    break
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future) + future.result()
+                    following = None if self._is_cancelled(cancel_event) else next(apk_paths, None)
+                    if following is not None:
+                        pending[executor.submit(self._analyze_safely, following[1], cancel_event, deadline,
+                                                triage)] = following
+
+    async def analyze_async(self, apk_path, original_filename=None, session_id=None, sha256=None, cancel_event=None,
+                            time_budget=None):
+        """
+        Run analyze() without blocking the event loop
+
+        Cancelling the awaiting task also cancels the analysis running in the executor.
+
+        Returns:
+            tuple: (success, analysis results dict or error_message)
+        """
+        loop = asyncio.get_running_loop()
+        cancel_event = cancel_event or threading.Event()
+        try:
+            return await loop.run_in_executor(
+                None, functools.partial(self.analyze, apk_path, original_filename, session_id, sha256, cancel_event,
+                                        time_budget)
+            )
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    async def analyze_many_async(self, apk_paths, concurrency=4):
+        """
+        Analyze several APKs concurrently from asyncio code
+
+        Args:
+            apk_paths: Iterable of APK paths
+            concurrency: Number of APKs analyzed at the same time
+
+        Yields:
+            tuple: (apk_path, success, analysis results dict or error_message), in completion order
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(apk_path):
+            async with semaphore:
+                return (apk_path,) + await loop.run_in_executor(None, self._analyze_safely, apk_path)
+
+        for finished in asyncio.as_completed([run(apk_path) for apk_path in apk_paths]):
+            yield await finished
+
+    @staticmethod
+    def _read_package_info(output_dir):
+        """
+        Read the package name, versions and SDK levels from a decoded AndroidManifest.xml
+
+        Returns:
+            dict: package_name, version_name, version_code, min_sdk_version and target_sdk_version,
+                  None for values that could not be read
+        """
+        android_namespace = '{http://schemas.android.com/apk/res/android}'
+        info = dict.fromkeys(('package_name', 'version_name', 'version_code', 'min_sdk_version', 'target_sdk_version'))
+        try:
+            if PackArchive.is_archive(output_dir):
+                with PackArchive(output_dir) as archive:
+                    root = ET.parse(archive.open('AndroidManifest.xml')).getroot()
+            else:
+                root = ET.parse(os.path.join(output_dir, 'AndroidManifest.xml')).getroot()
+        except (OSError, KeyError, ET.ParseError) as e:
+            logging.warning(f"Could not read the package name from {output_dir}: {e}")
+            return info
+        info['package_name'] = root.get('package')
+        info['version_name'] = root.get(android_namespace + 'versionName')
+        info['version_code'] = root.get(android_namespace + 'versionCode')
+        uses_sdk = root.find('uses-sdk')
+        if uses_sdk is not None:
+            info['min_sdk_version'] = uses_sdk.get(android_namespace + 'minSdkVersion')
+            info['target_sdk_version'] = uses_sdk.get(android_namespace + 'targetSdkVersion')
+        return info
+
+    @staticmethod
+    def _diff_report(baseline, analysis_results):
+        """
+        Build the delta report of a diff-mode analysis against its baseline
+
+        Args:
+            baseline: Previous analysis as returned by SessionStore.find_baseline
+            analysis_results: Results of this analysis (obfuscation['diff'] is moved into the report)
+
+        Returns:
+            dict: Baseline identity, verdict and permission changes, and the file and indicator changes
+        """
+        previous = baseline['results']
+        previous_obfuscation = previous.get('obfuscation') or {}
+        obfuscation = analysis_results['obfuscation']
+        before = {permission['name'] for permission in previous.get('permissions') or []}
+        after = {permission['name'] for permission in analysis_results['permissions']}
+        return {
+            'baseline_session_id': baseline['session_id'],
+            'baseline_version': previous.get('version_name'),
+            'baseline_apk_name': previous.get('apk_name'),
+            'confidence': {'before': previous_obfuscation.get('confidence', 0), 'after': obfuscation.get('confidence', 0)},
+            'is_obfuscated': {'before': previous_obfuscation.get('is_obfuscated', False),
+                              'after': obfuscation.get('is_obfuscated', False)},
+            'permissions': {'added': sorted(after - before), 'removed': sorted(before - after)},
+            **obfuscation.pop('diff', {})
+        }
+
+    def _analyze_safely(self, apk_path, cancel_event=None, deadline=None, triage=False):
+        """Run analyze(), turning unexpected exceptions into a failed result"""
+        try:
+            # The budget left when the analysis actually starts (it may have waited for a worker)
+            time_budget = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            return self.analyze(apk_path, cancel_event=cancel_event, time_budget=time_budget, triage=triage)
+        except Exception as e:
+            logging.exception(f"Error analyzing {apk_path}")
+            return False, str(e)
+
+    @staticmethod
+    def _is_cancelled(cancel_event):
+        """Check if an optional cancellation flag is set"""
+        return cancel_event is not None and cancel_event.is_set()
+
+    @staticmethod
+    def format_runtime(seconds: float) -> str:
+        """
+        Format a time duration into a human-readable string.
+        e.g., "15 seconds", "2 min 30 sec", "1 hours 5 min".
+
+        Args:
+            seconds (float): Time duration in seconds.
+
+        Returns:
+            str: Formatted time string.
+        """
+        if seconds < 60:
+            return f"{seconds:.2f} seconds" # Format to 2 decimal places for sub-minute times
+        elif seconds < 3600:
+            minutes = int(seconds // 60)
+            remaining_seconds = round(seconds % 60, 2)
+            return f"{minutes} min {remaining_seconds:.2f} sec"
+        else:
+            hours = int(seconds // 3600)
+            minutes = int((seconds % 3600) // 60)
+            return f"{hours} hours {minutes} min"
@@ -1,12 +1,28 @@
 import os
+import re
+import errno
+import uuid
+import hashlib
+import shutil
 import subprocess
 import logging
 import time # [ADDED] Import the time module
+import stat
+import zipfile
+from utils.archive_utils import PackArchive
+from utils.content_store import ContentStore
+from utils.process_utils import run_process
 
 class ApkService:
     """Service for APK decompilation and analysis"""
 
-    def __init__(self, apktool_path, output_folder, socketio=None):
+    PARTIAL_SUFFIX = '.partial'  # Work directories being decoded; renamed to their final name on success
+    OUTPUT_TAIL_LINES = 200  # apktool output lines kept per stream for error reports
+    FRAMEWORK_MEMBER_SUFFIX = 'android-framework.jar'  # Built-in framework bundled inside the apktool jar
+    FRAMEWORK_STALE_SECONDS = 3600  # Unfinished framework directories older than this were left by a crash
+
+    def __init__(self, apktool_path, output_folder, socketio=None, pack_output=False, scratch=None, jvm=None,
+                 framework_folder=None, extra_frameworks=(), timeout=None):
         """
         Initialize the APK service
 
@@ -14,21 +30,38 @@ class ApkService:
             apktool_path: Path to apktool executable
             output_folder: Folder to store decompiled APKs
             socketio: SocketIO instance for real-time updates (optional)
+            pack_output: Pack each decoded tree into a single archive (optional)
+            scratch: ScratchSpace to decode and scan in before persisting to output_folder (optional)
+            jvm: JvmService providing JVM flags and CDS archives for apktool (optional)
+            framework_folder: Folder for the shared, pre-installed framework directory (optional)
+            extra_frameworks: Vendor framework APKs to pre-install alongside the built-in one
+            timeout: Wall-clock limit for one apktool run in seconds (optional)
         """
         self.apktool_path = apktool_path
         self.output_folder = output_folder
         self.socketio = socketio
+        self.pack_output = pack_output
+        self.scratch = scratch
+        self.jvm = jvm
+        self.timeout = timeout
+        self.framework_dir = None
+        if framework_folder:
+            self.framework_dir = self.prepare_framework(framework_folder, extra_frameworks)
 
-    def decompile_apk(self, apk_path):
+    def decompile_apk(self, apk_path, job_stats=None, cancel_event=None):
         """
         Decompile an APK file
 
         Args:
             apk_path: Path to the APK file
+            job_stats: Dict that receives per-run resource usage under 'apktool_runs' (optional)
+            cancel_event: threading.Event that kills apktool when set (optional)
 
         Returns:
-            tuple: (success, output_dir or error_message, apk_size_mb)
+            tuple: (success, output_dir (or packed archive path) or error_message, apk_size_mb)
         """
+        job_dir = None
+        disk_work_dir = None
         try:
             # [ADDED] Get APK file size
             apk_size_bytes = os.path.getsize(apk_path)
@@ -37,66 +70,57 @@ class ApkService:
             # Normalize paths for cross-platform compatibility (Windows vs Linux)
             apk_path = apk_path.replace("\\", "/")
 
-            # Create output directory based on APK name (without extension)
-            apk_name = os.path.basename(apk_path).split('.')[0]
-            output_dir = os.path.join(self.output_folder, apk_name)
-            output_dir = output_dir.replace("\\", "/")
-            # Create the directory if it doesn't exist, exist_ok=True prevents error if it already exists
-            os.makedirs(output_dir, exist_ok=True)
-
-            # Build the Apktool command. Assumes 'java' executable is in system PATH
-            # and self.apktool_path points to the apktool.jar file.
-            command = [
-                'java',              # Command to invoke Java Virtual Machine
-                '-jar',              # Flag to execute a JAR file
-                self.apktool_path,   # Full path to the apktool.jar file
-                "d",                 # Apktool command: 'd' for decode (decompile)
-                apk_path,            # Path to the input APK file
-                "-o",                # Output directory flag
-                output_dir,          # The directory where decompiled files will be stored
-                "-f"                 # Force overwrite if output directory already exists
-            ]
-            logging.debug(f"Running command: {' '.join(command)}")
-
-            # Emit a status message to the frontend via SocketIO
-            self._emit_status(f"Decompiling APK: {apk_name}")
-
-            # Run the command as a subprocess
-            # stdout=subprocess.PIPE and stderr=subprocess.PIPE capture output/errors
-            # text=True decodes output as text (UTF-8 by default)
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            # Process output from Apktool in real-time
-            # This loop reads line by line and sends progress/status to the frontend
-            while True:
-                output = process.stdout.readline()
-                if output == "" and process.poll() is not None: # Check if process finished and no more output
-                    break
-                if output:
-                    logging.debug(f"stdout: {output.strip()}")
-                    self._emit_status(output.strip()) # Send each line of Apktool's output
-
-            # Wait for the subprocess to complete
-            process.wait()
-            # Read any remaining standard error output
-            stderr = process.stderr.read()
-            # Get the exit code of the subprocess
-            returncode = process.returncode
-            # Close the pipe connections
-            process.stdout.close()
-            process.stderr.close()
+            # Every job gets its own uniquely named output, so concurrent decodes never collide
+            apk_name = os.path.splitext(os.path.basename(apk_path))[0]
+            job_name = self._job_name(apk_name)
+            final_output_dir = os.path.join(self.output_folder, job_name).replace("\\", "/")
+            disk_work_dir = final_output_dir + self.PARTIAL_SUFFIX
+
+            # Decode into RAM-backed scratch space when there is room; finalize_output persists it later
+            job_dir = self.scratch.reserve(apk_size_bytes, job_name) if self.scratch else None
+            work_dir = job_dir or disk_work_dir
+            decode_start = time.time()
+
+            returncode, stderr = self._run_apktool(apk_path, work_dir, apk_name, cancel_event, job_stats)
+            if returncode != 0 and job_dir and 'No space left' in stderr:
+                # The size estimate was too low; decode again on disk
+                logging.warning(f"Scratch space ran out while decoding {apk_name}, retrying on disk")
+                self.scratch.release(job_dir)
+                job_dir = None
+                work_dir = disk_work_dir
+                returncode, stderr = self._run_apktool(apk_path, work_dir, apk_name, cancel_event, job_stats)
+
+            logging.info(f"Decoded {apk_name} in {time.time() - decode_start:.2f}s "
+                         f"({'scratch' if job_dir else 'disk'} workspace)")
 
             # Check if decompilation was successful (returncode 0 indicates success)
             if returncode == 0:
                 self._emit_status("Decompilation successful")
+                output_dir = work_dir if job_dir else final_output_dir
+                if self.pack_output:
+                    # Replace the tens of thousands of loose files with one indexed archive
+                    pack_start = time.time()
+                    try:
+                        output_dir = PackArchive.pack_directory(work_dir, output_dir + PackArchive.EXTENSION)
+                    except OSError as e:
+                        if not job_dir or e.errno != errno.ENOSPC:
+                            raise
+                        # The archive did not fit next to the tree in scratch space; write it to disk instead
+                        logging.warning(f"Scratch space ran out while packing {apk_name}, packing to disk")
+                        output_dir = PackArchive.pack_directory(work_dir, final_output_dir + PackArchive.EXTENSION)
+                        self.scratch.release(job_dir)
+                        job_dir = None
+                    logging.info(f"Packed decompiled output in {time.time() - pack_start:.2f}s")
+                elif not job_dir:
+                    # Promote the finished tree in one step so readers never see a partial decode
+                    os.rename(work_dir, final_output_dir)
                 # [MODIFIED] Return success status, output directory, and APK size
                 return True, output_dir, apk_size_mb
             else:
+                if job_dir:
+                    self.scratch.release(job_dir)
+                else:
+                    shutil.rmtree(disk_work_dir, ignore_errors=True)
                 error_msg = f"Decompilation failed: {stderr}"
                 logging.error(error_msg)
                 self._emit_status(f"Error: {stderr}")
@@ -108,9 +132,211 @@ class ApkService:
             error_msg = f"Error decompiling APK: {str(e)}"
             logging.exception(error_msg) # Log full traceback
             self._emit_status(f"Error: {str(e)}")
+            if job_dir:
+                self.scratch.release(job_dir)
+            elif disk_work_dir:
+                shutil.rmtree(disk_work_dir, ignore_errors=True)
             # [MODIFIED] Return failure status, error message, and None for size
             return False, error_msg, None
 
+    def finalize_output(self, output_dir):
+        """
+        Persist a decoded tree (or its archive) from scratch space to the output folder
+
+        Outputs that were decoded on disk are returned unchanged.
+
+        Args:
+            output_dir: Path returned by decompile_apk
+
+        Returns:
+            str: Persistent path of the output
+        """
+        if not self.scratch or not self.scratch.contains(output_dir):
+            return output_dir
+
+        job_dir = self.scratch.job_dir_of(output_dir)
+        target = os.path.join(self.output_folder, os.path.basename(output_dir)).replace("\\", "/")
+        move_start = time.time()
+        try:
+            # Copy across filesystems under a partial name, then rename into place atomically
+            shutil.move(output_dir, target + self.PARTIAL_SUFFIX)
+            os.replace(target + self.PARTIAL_SUFFIX, target)
+        finally:
+            if job_dir:
+                self.scratch.release(job_dir)
+        logging.info(f"Persisted {os.path.basename(output_dir)} from scratch space in {time.time() - move_start:.2f}s")
+        return target
+
+    def discard_output(self, output_dir):
+        """
+        Delete a decoded tree (or its archive) that will not be kept, e.g. of a cancelled job
+
+        Args:
+            output_dir: Path returned by decompile_apk
+        """
+        job_dir = self.scratch.job_dir_of(output_dir) if self.scratch and self.scratch.contains(output_dir) else None
+        if job_dir:
+            self.scratch.release(job_dir)
+        elif os.path.isdir(output_dir):
+            shutil.rmtree(output_dir, ignore_errors=True)
+        elif os.path.isfile(output_dir):
+            os.remove(output_dir)
+        logging.info(f"Discarded decompiled output {output_dir}")
+
+    def prepare_framework(self, framework_folder, extra_frameworks=()):
+        """
+        Install apktool's framework files once into a shared, read-only directory
+
+        Without --frame-path every apktool run loads (and on first use installs) the
+        framework from a mutable per-user location, which concurrent jobs race on.
+        The directory is keyed by the hashes of the apktool jar and the vendor
+        frameworks, built under a temporary name and renamed into place, so
+        concurrent workers warming it at the same time all end up sharing one
+        complete copy. Temporary directories left behind by crashed workers are
+        removed first.
+
+        Args:
+            framework_folder: Parent folder of the framework directories
+            extra_frameworks: Vendor framework APKs to install with 'apktool if'
+
+        Returns:
+            str: Framework directory to pass via --frame-path, or None if it could not be prepared
+        """
+        try:
+            framework_key = ContentStore.hash_file(self.apktool_path)[:16]
+            if extra_frameworks:
+                # Adding, removing or replacing a vendor framework must not reuse a directory built without it
+                extra_hashes = sorted(ContentStore.hash_file(path) for path in extra_frameworks)
+                framework_key += '-' + hashlib.sha256(''.join(extra_hashes).encode()).hexdigest()[:16]
+            framework_dir = os.path.join(framework_folder, f"apktool-{framework_key}").replace("\\", "/")
+            if os.path.isfile(os.path.join(framework_dir, '1.apk')):
+                return framework_dir
+
+            os.makedirs(framework_folder, exist_ok=True)
+            self._purge_stale_frameworks(framework_folder)
+            temp_dir = f"{framework_dir}.{uuid.uuid4().hex[:8]}{self.PARTIAL_SUFFIX}"
+            os.makedirs(temp_dir)
+            try:
+                with zipfile.ZipFile(self.apktool_path) as jar:
+                    member = next(name for name in jar.namelist() if name.endswith(self.FRAMEWORK_MEMBER_SUFFIX))
+                    with jar.open(member) as source, open(os.path.join(temp_dir, '1.apk'), 'wb') as target:
+                        shutil.copyfileobj(source, target)
+
+                for framework_apk in extra_frameworks:
+                    java_command, pending_archive = self._java_command()
+                    result = run_process(java_command + ['if', framework_apk, '--frame-path', temp_dir],
+                                         timeout=self.timeout, tail_lines=self.OUTPUT_TAIL_LINES)
+                    if self.jvm:
+                        self.jvm.finish_command(pending_archive, False)
+                    usage = result.usage()
+                    logging.info(f"apktool if {os.path.basename(framework_apk)}: exit {result.returncode}, "
+                                 f"{usage['wall_seconds']}s wall, max RSS {usage['max_rss_mb']}MB")
+                    if result.timed_out:
+                        logging.warning(f"Installing framework {framework_apk} timed out after {self.timeout}s")
+                    elif result.returncode != 0:
+                        logging.warning(f"Could not install framework {framework_apk}: {result.stderr.strip()}")
+
+                # Jobs only ever read the framework, so make accidental writes fail loudly
+                for name in os.listdir(temp_dir):
+                    os.chmod(os.path.join(temp_dir, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.rename(temp_dir, framework_dir)
+            except OSError:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                if not os.path.isfile(os.path.join(framework_dir, '1.apk')):
+                    raise
+                # Another worker finished warming first; use its copy
+            except BaseException:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+
+            logging.info(f"Prepared shared apktool framework directory {framework_dir}")
+            return framework_dir
+        except (OSError, subprocess.SubprocessError, zipfile.BadZipFile, StopIteration) as e:
+            logging.warning(f"Could not prepare a shared apktool framework, using apktool's default: {e}")
+            return None
+
+    def _purge_stale_frameworks(self, framework_folder):
+        """Remove temporary framework directories that crashed workers never renamed into place"""
+        cutoff = time.time() - self.FRAMEWORK_STALE_SECONDS
+        for entry in os.scandir(framework_folder):
+            try:
+                if not entry.name.endswith(self.PARTIAL_SUFFIX) or entry.stat().st_mtime >= cutoff:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            logging.info(f"Removed stale framework directory {entry.name}")
+
+    @staticmethod
+    def _job_name(apk_name):
+        """Build a unique, filesystem-safe output name for one decode job"""
+        safe_name = re.sub(r'[^A-Za-z0-9._-]+', '_', apk_name).strip('._') or 'apk'
+        return f"{safe_name[:80]}-{uuid.uuid4().hex[:12]}"
+
+    def _java_command(self):
+        """Build the command prefix that runs apktool, returning (command list, pending CDS archive or None)"""
+        if self.jvm:
+            # Tuned JVM flags plus a class-data-sharing archive (recorded on the first run)
+            return self.jvm.java_command(self.apktool_path)
+        return ['java', '-jar', self.apktool_path], None
+
+    def _run_apktool(self, apk_path, output_dir, apk_name, cancel_event=None, job_stats=None):
+        """
+        Run apktool to decode an APK
+
+        Args:
+            apk_path: Path to the APK file
+            output_dir: Directory to decode into
+            apk_name: Name used in status messages
+            cancel_event: threading.Event that kills apktool when set (optional)
+            job_stats: Dict whose 'apktool_runs' list receives the run's resource usage (optional)
+
+        Returns:
+            tuple: (returncode, stderr)
+        """
+        # Create the directory if it doesn't exist, exist_ok=True prevents error if it already exists
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Build the Apktool command. Assumes 'java' executable is in system PATH
+        # and self.apktool_path points to the apktool.jar file.
+        java_command, pending_archive = self._java_command()
+        command = java_command + [
+            "d",                 # Apktool command: 'd' for decode (decompile)
+            apk_path,            # Path to the input APK file
+            "-o",                # Output directory flag
+            output_dir,          # The directory where decompiled files will be stored
+            "-f"                 # Force overwrite if output directory already exists
+        ]
+        if self.framework_dir:
+            # Read the pre-installed framework instead of the shared per-user one
+            command += ["--frame-path", self.framework_dir]
+        logging.debug(f"Running command: {' '.join(command)}")
+
+        # Emit a status message to the frontend via SocketIO
+        self._emit_status(f"Decompiling APK: {apk_name}")
+
+        # Both pipes are drained concurrently, so a flood of warnings on stderr can no longer
+        # fill the pipe and hang apktool; each stdout line is still forwarded as a status update
+        result = run_process(command, timeout=self.timeout, cancel_event=cancel_event,
+                             on_stdout_line=self._emit_status, tail_lines=self.OUTPUT_TAIL_LINES)
+
+        if self.jvm:
+            self.jvm.finish_command(pending_archive, result.returncode == 0)
+
+        usage = result.usage()
+        logging.info(f"apktool for {apk_name}: exit {result.returncode}, {usage['wall_seconds']}s wall, "
+                     f"{usage['cpu_user_seconds']}s user / {usage['cpu_system_seconds']}s sys CPU, "
+                     f"max RSS {usage['max_rss_mb']}MB")
+        if job_stats is not None:
+            job_stats.setdefault('apktool_runs', []).append(usage)
+
+        stderr = result.stderr
+        if result.timed_out:
+            stderr = f"apktool timed out after {self.timeout}s\n{stderr}".rstrip()
+        elif result.cancelled:
+            stderr = f"apktool was cancelled\n{stderr}".rstrip()
+        return result.returncode, stderr
+
     def _emit_status(self, message):
         """
         Emit status update via SocketIO if available
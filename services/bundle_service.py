@@ -0,0 +1,120 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import zipfile
+from utils.file_utils import FileUtils
+
+class BundleService:
+    """Service for split-APK bundles (XAPK, APKS, APKM)
+
+    Bundles are ZIP containers holding a base APK plus config/feature split APKs.
+    Each split is streamed out of the container straight into the content store
+    (hashing it on the way), so nothing is extracted to a scratch folder and no
+    split is dropped.
+    """
+
+    BUNDLE_EXTENSIONS = {'xapk', 'apks', 'apkm'}
+    COPY_BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, content_store):
+        """
+        Initialize the bundle service
+
+        Args:
+            content_store: ContentStore receiving the split APKs
+        """
+        self.content_store = content_store
+
+    @classmethod
+    def is_bundle(cls, path):
+        """Check if a path names a split-APK bundle (by extension)"""
+        return FileUtils.allowed_file(os.path.basename(path), cls.BUNDLE_EXTENSIONS)
+
+    def ingest_bundle(self, bundle_path):
+        """
+        Stream every split APK of a bundle into the content store
+
+        Args:
+            bundle_path: Path to the .xapk/.apks/.apkm file
+
+        Returns:
+            tuple: (success, list of split dicts or error_message). Each split has
+                   name, member, sha256, path, size and is_base; the base split comes first.
+        """
+        try:
+            with zipfile.ZipFile(bundle_path) as zf:
+                members = [info for info in zf.infolist()
+                           if not info.is_dir() and info.filename.lower().endswith('.apk')]
+                if not members:
+                    return False, f"No APK files found in bundle {os.path.basename(bundle_path)}"
+
+                split_ids = self._read_split_ids(zf)
+                splits = [self._ingest_member(zf, info, split_ids) for info in members]
+        except (zipfile.BadZipFile, RuntimeError, NotImplementedError) as e:
+            # RuntimeError/NotImplementedError cover encrypted or unsupported members (e.g. old APKM files)
+            logging.error(f"Could not read bundle {bundle_path}: {e}")
+            return False, f"Could not read bundle: {str(e)}"
+        except OSError as e:
+            logging.error(f"Could not store splits of {bundle_path}: {e}")
+            return False, f"Could not store bundle splits: {str(e)}"
+
+        self._mark_base(splits)
+        splits.sort(key=lambda split: (not split['is_base'], split['name']))
+        logging.info(f"Ingested {len(splits)} split APK(s) from {bundle_path}: "
+                     f"{', '.join(split['name'] for split in splits)}")
+        return True, splits
+
+    def _ingest_member(self, zf, info, split_ids):
+        """Copy one split out of the container into the content store while hashing it"""
+        digest = hashlib.sha256()
+        temp_path = os.path.join(self.content_store.root, f".incoming-{uuid.uuid4().hex}.apk")
+        buffer = bytearray(self.COPY_BUFFER_SIZE)
+        view = memoryview(buffer)
+        try:
+            with zf.open(info) as source, open(temp_path, 'wb') as target:
+                while True:
+                    read = source.readinto(buffer)
+                    if not read:
+                        break
+                    digest.update(view[:read])
+                    target.write(view[:read])
+            sha256, stored_path = self.content_store.ingest(temp_path, digest.hexdigest())
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        file_name = os.path.basename(info.filename)
+        return {
+            'name': split_ids.get(file_name) or os.path.splitext(file_name)[0],
+            'member': info.filename,
+            'sha256': sha256,
+            'path': stored_path,
+            'size': info.file_size,
+            'is_base': False
+        }
+
+    def _read_split_ids(self, zf):
+        """Map split file names to their ids from an XAPK manifest.json, if present"""
+        try:
+            manifest = json.loads(zf.read('manifest.json'))
+        except (KeyError, ValueError):
+            return {}
+
+        split_ids = {}
+        for split in manifest.get('split_apks') or []:
+            if isinstance(split, dict) and split.get('file') and split.get('id'):
+                split_ids[os.path.basename(split['file'])] = split['id']
+        return split_ids
+
+    def _mark_base(self, splits):
+        """Flag the base split (by name, falling back to the largest APK)"""
+        for split in splits:
+            member_name = os.path.basename(split['member']).lower()
+            if split['name'] == 'base' or member_name in ('base.apk', 'base-master.apk'):
+                split['is_base'] = True
+                return
+        # XAPKs often name the base APK after the package, which is also the largest split
+        max(splits, key=lambda split: split['size'])['is_base'] = True
@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+
+class JobRegistry:
+    """Registry of running analysis jobs and their cancellation flags
+
+    Each job gets a threading.Event that is handed down the pipeline: apktool is
+    killed as soon as it is set, and scans stop at the next file boundary.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, job_id, name=None):
+        """
+        Register a running job
+
+        Args:
+            job_id: Job identifier (the analysis session id)
+            name: Display name of the job, e.g. the APK file name (optional)
+
+        Returns:
+            threading.Event: Cancellation flag to pass to the analysis
+        """
+        cancel_event = threading.Event()
+        with self._lock:
+            self._jobs[job_id] = {'name': name, 'started_at': time.time(), 'cancel_event': cancel_event}
+        return cancel_event
+
+    def cancel(self, job_id):
+        """
+        Request cancellation of a running job
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            bool: True if the job is running (and is now being cancelled), False if unknown or finished
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job['cancel_event'].set()
+        logging.info(f"Cancellation requested for job {job_id} ({job['name']})")
+        return True
+
+    def finish(self, job_id):
+        """Remove a job that has completed, failed or been cancelled"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        """
+        Get the status of a running job
+
+        Returns:
+            dict: job_id, name, running_seconds and cancel_requested, or None if not running
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {
+            'job_id': job_id,
+            'name': job['name'],
+            'running_seconds': round(time.time() - job['started_at'], 1),
+            'cancel_requested': job['cancel_event'].is_set()
+        }
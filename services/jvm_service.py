@@ -0,0 +1,177 @@
+import os
+import re
+import uuid
+import hashlib
+import logging
+import subprocess
+import threading
+
+class JvmService:
+    """Builds java command lines with a tuned flag profile and AppCDS archives
+
+    Class Data Sharing archives are created per jar, keyed by the jar's content
+    hash and the JVM version: the first run of a jar records its loaded classes
+    (-XX:ArchiveClassesAtExit), and every later run maps that archive
+    (-XX:SharedArchiveFile) instead of loading and verifying the classes again.
+    """
+
+    MIN_DYNAMIC_CDS_VERSION = 13  # -XX:ArchiveClassesAtExit needs JDK 13+
+
+    def __init__(self, java_path='java', jvm_flags=None, cds_folder=None):
+        """
+        Initialize the JVM service
+
+        Args:
+            java_path: java executable
+            jvm_flags: Flags added to every java command (heap, JIT, GC tuning)
+            cds_folder: Folder for CDS archives (CDS disabled if None)
+        """
+        self.java_path = java_path
+        self.jvm_flags = list(jvm_flags or [])
+        self.cds_folder = cds_folder
+        self._java_version = None
+        self._jar_keys = {}
+        self._lock = threading.Lock()
+        if cds_folder:
+            os.makedirs(cds_folder, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the JVM service configured in Config"""
+        cds_folder = config.JVM_CDS_FOLDER if config.JVM_ENABLE_CDS else None
+        return cls(config.JAVA_PATH, config.JVM_FLAGS, cds_folder)
+
+    def java_version(self):
+        """
+        Get the version string of the configured JVM (cached)
+
+        Returns:
+            str: Version such as '17.0.9', or '' if java could not be run
+        """
+        if self._java_version is None:
+            try:
+                # java -version prints to stderr, e.g. 'openjdk version "17.0.9" 2023-10-17'
+                result = subprocess.run([self.java_path, '-version'], capture_output=True, text=True, timeout=30)
+                match = re.search(r'version "([^"]+)"', result.stderr)
+                self._java_version = match.group(1) if match else ''
+            except (OSError, subprocess.SubprocessError) as e:
+                logging.warning(f"Could not determine Java version: {e}")
+                self._java_version = ''
+        return self._java_version
+
+    def java_major_version(self):
+        """Get the major JVM version (8 for '1.8.0_x', 17 for '17.0.9'), or 0 if unknown"""
+        parts = self.java_version().split('.')
+        try:
+            major = int(parts[0])
+            return int(parts[1]) if major == 1 and len(parts) > 1 else major
+        except ValueError:
+            return 0
+
+    def cds_supported(self):
+        """Check if CDS archives can be created and used for this JVM"""
+        return bool(self.cds_folder) and self.java_major_version() >= self.MIN_DYNAMIC_CDS_VERSION
+
+    def cds_archive_path(self, jar_path):
+        """
+        Get the CDS archive path for a jar on this JVM
+
+        Args:
+            jar_path: Path to the jar
+
+        Returns:
+            str: Archive path (which may not exist yet)
+        """
+        key = hashlib.sha256(f"{self._jar_hash(jar_path)}:{self.java_version()}".encode()).hexdigest()[:16]
+        jar_name = os.path.splitext(os.path.basename(jar_path))[0]
+        return os.path.join(self.cds_folder, f"{jar_name}-{key}.jsa")
+
+    def java_command(self, jar_path, use_cds=True):
+        """
+        Build the command prefix that runs a jar
+
+        Args:
+            jar_path: Path to the jar
+            use_cds: Use (or record) a CDS archive when supported
+
+        Returns:
+            tuple: (command list, pending CDS archive path or None). A pending archive is
+                   recorded by this run and must be passed to finish_command afterwards.
+        """
+        command = [self.java_path] + self.jvm_flags
+        pending_archive = None
+
+        if use_cds and self.cds_supported():
+            archive_path = self.cds_archive_path(jar_path)
+            if os.path.isfile(archive_path):
+                # -Xshare:auto silently falls back to normal class loading if the archive is unusable
+                command += [f'-XX:SharedArchiveFile={archive_path}', '-Xshare:auto']
+            else:
+                # Record under a unique name so concurrent first runs do not clobber each other
+                pending_archive = f"{archive_path}.{uuid.uuid4().hex[:8]}.tmp"
+                command.append(f'-XX:ArchiveClassesAtExit={pending_archive}')
+
+        return command + ['-jar', jar_path], pending_archive
+
+    def finish_command(self, pending_archive, success):
+        """
+        Promote (or discard) a CDS archive recorded by a java_command run
+
+        Args:
+            pending_archive: Pending archive path returned by java_command
+            success: Whether the run succeeded (archives of failed runs are discarded)
+        """
+        if not pending_archive:
+            return
+        final_path = pending_archive.rsplit('.', 2)[0]
+        try:
+            if success and os.path.isfile(pending_archive) and not os.path.exists(final_path):
+                os.replace(pending_archive, final_path)
+                logging.info(f"Created CDS archive {final_path}")
+            elif os.path.exists(pending_archive):
+                os.remove(pending_archive)
+        except OSError as e:
+            logging.warning(f"Could not store CDS archive {final_path}: {e}")
+
+    def warm(self, jar_path, training_args):
+        """
+        Create the CDS archive for a jar by running it once
+
+        Args:
+            jar_path: Path to the jar
+            training_args: Arguments for a representative run (e.g. decoding a tiny APK)
+
+        Returns:
+            tuple: (success, archive path or error_message)
+        """
+        if not self.cds_supported():
+            return False, f"CDS needs JDK {self.MIN_DYNAMIC_CDS_VERSION}+ and a CDS folder (found '{self.java_version()}')"
+
+        archive_path = self.cds_archive_path(jar_path)
+        if os.path.isfile(archive_path):
+            return True, archive_path
+
+        command, pending_archive = self.java_command(jar_path)
+        try:
+            result = subprocess.run(command + list(training_args), capture_output=True, text=True, timeout=600)
+        except (OSError, subprocess.SubprocessError) as e:
+            self.finish_command(pending_archive, False)
+            return False, f"Training run failed: {e}"
+
+        self.finish_command(pending_archive, result.returncode == 0)
+        if not os.path.isfile(archive_path):
+            return False, f"Training run did not produce an archive: {result.stderr.strip()[-500:]}"
+        return True, archive_path
+
+    def _jar_hash(self, jar_path):
+        """Get the content hash of a jar, cached by path, size and modification time"""
+        stat = os.stat(jar_path)
+        cache_key = (os.path.abspath(jar_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if cache_key not in self._jar_keys:
+                digest = hashlib.sha256()
+                with open(jar_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+                self._jar_keys[cache_key] = digest.hexdigest()
+            return self._jar_keys[cache_key]
@@ -1,17 +1,80 @@
 import os
 import re
+import json
+import time
 import logging
 from typing import Dict, List, Tuple, Any
 import hashlib
+from utils.archive_utils import PackArchive
+from utils.sampling_utils import stratified_order, BootstrapEstimate
+from utils.prefix_trie import PackagePrefixTrie
 
 class ObfuscationService:
     """Service for detecting code obfuscation in decompiled APK files"""
     MAX_SNIPPETS_FOR_FRONTEND = 1000 # Anda bisa coba 500, 1000, atau 2000
     
-    def __init__(self, socketio=None):
+    # Triage mode: scan a stratified random sample until the verdict is statistically settled
+    TRIAGE_MIN_FILES = 200  # Files scanned before the first early-stopping check
+    TRIAGE_CHECK_GROWTH = 1.25  # Each check happens after 25% more files than the previous one
+    TRIAGE_BOOTSTRAP_SAMPLES = 200
+    TRIAGE_CONFIDENCE_LEVEL = 0.95
+    TRIAGE_SEED = 0  # Fixed so re-running triage on the same APK samples the same files
+    
+    LIBRARY_MODES = ('skip', 'tally', 'off')
+    LIBRARY_REPORT_PREFIXES = 20  # Largest library packages listed in the result
+    # Top-level directories that hold classes rather than packages (smali, smali_classes2, sources, ...)
+    CODE_ROOT_PATTERN = re.compile(r'^(smali(_\w+)?|sources|src)$')
+    
+    CLASS_CACHE_FORMAT = 1  # Bump when the cached per-class result layout changes
+    PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+    DIFF_REPORT_LIMIT = 200  # Per-file indicator changes listed in a version diff
+    
+    # Confidence boosts on top of the weighted pattern frequencies: (indicator, scale, ratio, points).
+    # A boost applies when the indicator's count exceeds ratio times the Smali files scanned
+    # ('smali_files') or the lines analyzed ('lines'), or ratio itself as an absolute count (None)
+    CONFIDENCE_BOOSTS = (
+        ('short_class_names', 'smali_files', 0.3, 30),  # More than 30% short class names
+        ('short_method_names', 'lines', 0.05, 25),  # More than 5% short method names
+        ('synthetic_methods', None, 10, 20),  # Many synthetic methods
+        ('access_methods', None, 5, 15),  # Multiple access methods
+        ('obfuscated_packages', None, 0, 20),  # Single char package names
+        ('dollar_classes', 'smali_files', 0.2, 15),  # Many inner classes
+        ('string_encryption', None, 3, 15)  # Multiple encryption patterns
+    )
+    # Minimum confidence when all of these indicators are present
+    CONFIDENCE_FLOOR = (('short_class_names', 'short_method_names'), 60)
+    PATTERN_FREQUENCY_SCALE = 1000  # Matches per line are scaled by this before the cap of 100 per pattern
+    
+    def __init__(self, socketio=None, confidence_threshold=30, library_prefixes: PackagePrefixTrie = None,
+                 library_mode='skip', class_cache=None):
+        """
+        Initialize the service
+        
+        Args:
+            socketio: Socket.IO instance (or event sink) for progress messages (optional)
+            confidence_threshold: Confidence percentage from which an APK counts as obfuscated
+            library_prefixes: Package prefixes of known third-party libraries (optional)
+            library_mode: 'skip' to leave library files out of the scan, 'tally' to scan them
+                          but report their share separately, 'off' to ignore the prefixes
+            class_cache: ClassCache of per-class results shared across scans (optional)
+        """
+        if library_mode not in self.LIBRARY_MODES:
+            raise ValueError(f"Unknown library mode {library_mode!r}, expected one of {self.LIBRARY_MODES}")
         self.socketio = socketio
         self.obfuscation_patterns = self._initialize_patterns()
-        self.confidence_threshold = 30
+        self._compiled_patterns = self._compile_patterns()
+        self.pattern_versions = self._pattern_versions()
+        self.confidence_threshold = confidence_threshold
+        self.library_prefixes = library_prefixes if library_mode != 'off' and library_prefixes else None
+        self.library_mode = library_mode
+        self.class_cache = class_cache
+        self._miss_bytes_per_second = None
+        # Keys the class cache, so changing any regex (or the cached layout) misses every entry;
+        # weights, severities and descriptions are applied after lookup and do not invalidate them
+        self._class_cache_salt = hashlib.blake2b(
+            json.dumps([self.CLASS_CACHE_FORMAT, self.pattern_versions], sort_keys=True).encode(),
+            digest_size=32
+        ).digest()
         
     def _initialize_patterns(self):
         """Initialize obfuscation detection patterns for Smali files"""
@@ -90,35 +153,70 @@ class ObfuscationService:
             }
         }
     
-    def analyze_obfuscation(self, output_dir: str) -> Tuple[bool, Dict[str, Any]]:
+    def analyze_obfuscation(self, output_dir: str, cancel_event=None, deadline: float = None,
+                            triage: bool = False, manifest: bool = False,
+                            baseline: Dict[str, Dict] = None) -> Tuple[bool, Dict[str, Any]]:
         """
         Analyze obfuscation in decompiled APK files
         
         Args:
-            output_dir: Path to decompiled APK directory
+            output_dir: Path to decompiled APK directory or packed archive
+            cancel_event: threading.Event that stops the scan at the next file when set (optional)
+            deadline: time.monotonic() value after which scanning stops and the confidence is
+                      computed from the files scanned so far (optional)
+            triage: Scan files in a stratified random order (by dex and package) and stop as
+                    soon as a bootstrap confidence interval of the estimated full-scan
+                    confidence lies entirely on one side of the threshold (optional)
+            manifest: Add obfuscation_data['files_manifest'], the content hash and results of
+                      every scanned file keyed by class path, usable as a later baseline (optional)
+            baseline: files_manifest of a previous build of the same app. Files whose content is
+                      unchanged reuse their recorded results instead of being rescanned, and
+                      obfuscation_data['diff'] reports the added, removed and modified files and
+                      the indicator changes (optional)
             
         Returns:
-            Tuple of (success, obfuscation_data)
+            Tuple of (success, obfuscation_data). obfuscation_data['coverage'] tells how much
+            of the code was scanned and whether the result is complete; with library prefixes
+            configured, obfuscation_data['libraries'] tallies the known library code, and with a
+            class cache obfuscation_data['class_cache'] reports its hit rate for this scan.
         """
+        archive = None
         try:
             if self.socketio:
                 self.socketio.emit('analysis_status', {'message': 'Starting obfuscation analysis...'})
             
+            # Packed trees are scanned in place through a memory mapping
+            if PackArchive.is_archive(output_dir):
+                archive = PackArchive(output_dir)
+            
             # Find all Smali files (primary) and Java files (secondary)
-            smali_files = self._find_smali_files(output_dir)
-            java_files = self._find_java_files(output_dir)
+            smali_files = self._find_smali_files(output_dir, archive)
+            java_files = self._find_java_files(output_dir, archive)
+            
+            # Known library packages are recognized from their paths, before any file is opened
+            library_tally = None
+            if self.library_prefixes is not None:
+                library_tally = {}
+                smali_app_files = self._partition_library_files(smali_files, output_dir, archive, library_tally)
+                java_app_files = self._partition_library_files(java_files, output_dir, archive, library_tally)
+                if self.library_mode == 'skip':
+                    smali_files, java_files = smali_app_files, java_app_files
             
             all_files = smali_files + java_files
             
             if not all_files:
                 logging.warning("No Smali or Java files found for obfuscation analysis")
-                return True, {
+                result = {
                     'is_obfuscated': False,
                     'confidence': 0,
                     'indicators': [],
                     'code_snippets': [],
-                    'summary': 'No code files found for analysis'
+                    'summary': 'No code files found for analysis',
+                    'coverage': self._coverage(0, 0, 0, None)
                 }
+                if library_tally is not None:
+                    result['libraries'] = self._library_report(library_tally, 0, 0)
+                return True, result
             
             logging.info(f"Found {len(smali_files)} Smali files and {len(java_files)} Java files")
             
@@ -127,8 +225,50 @@ class ObfuscationService:
             all_code_snippets = []
             total_lines_analyzed = 0
             files_to_analyze = all_files
+            # One read buffer per job, reused for every file instead of a fresh str per read
+            read_buffer = bytearray(64 * 1024)
+            files_scanned = 0
+            bytes_scanned = 0
+            stopped_reason = None
+            scanned_smali_files = []
+            cache_stats = {'hits': 0, 'misses': 0, 'bytes_from_cache': 0, 'hit_seconds': 0.0,
+                           'miss_seconds': 0.0, 'bytes_missed': 0} if self.class_cache is not None else None
+            # A diff always records the new build's manifest, which becomes the next baseline
+            files_manifest = {} if manifest or baseline is not None else None
             
+            estimator = None
+            triage_info = None
+            if triage:
+                files_to_analyze, strata = stratified_order(
+                    all_files, lambda path: self._stratum_of(path, output_dir, archive), self.TRIAGE_SEED
+                )
+                estimator = BootstrapEstimate(len(all_files), self._confidence_of_totals,
+                                              self.TRIAGE_BOOTSTRAP_SAMPLES, self.TRIAGE_CONFIDENCE_LEVEL,
+                                              self.TRIAGE_SEED)
+                triage_info = {'strata': strata, 'settled': False, 'confidence_interval': None}
+                # Every stratum is represented before the first check
+                next_check = max(self.TRIAGE_MIN_FILES, strata)
+                settled_estimate = None
+            
+            scan_start = time.monotonic()
             for i, code_file in enumerate(files_to_analyze):
+                if cancel_event is not None and cancel_event.is_set():
+                    logging.info(f"Obfuscation analysis cancelled after {i} of {len(files_to_analyze)} files")
+                    return False, {
+                        'is_obfuscated': False,
+                        'confidence': 0,
+                        'indicators': [],
+                        'code_snippets': [],
+                        'error': 'Analysis cancelled',
+                        'cancelled': True
+                    }
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    stopped_reason = 'deadline'
+                    logging.info(f"Time budget exhausted after {i} of {len(files_to_analyze)} files, "
+                                 f"returning a partial result")
+                    break
+
                 if self.socketio:
                     progress = int((i / len(files_to_analyze)) * 100)
                     self.socketio.emit('analysis_progress', {
@@ -136,7 +276,13 @@ class ObfuscationService:
                         'progress': progress
                     })
                 
-                indicators, snippets, lines_count = self._analyze_file(code_file, output_dir)
+                indicators, snippets, lines_count, size = self._analyze_file(code_file, output_dir, archive, read_buffer,
+                                                                             cache_stats, baseline, files_manifest)
+                files_scanned += 1
+                bytes_scanned += size
+                is_smali = code_file.endswith('.smali')
+                if is_smali:
+                    scanned_smali_files.append(code_file)
                 
                 # Merge indicators
                 for indicator_type, count in indicators.items():
@@ -147,35 +293,46 @@ class ObfuscationService:
                 # Add snippets
                 all_code_snippets.extend(snippets)
                 total_lines_analyzed += lines_count
+                
+                if estimator is not None:
+                    estimator.add(self._triage_row(indicators, lines_count, code_file if is_smali else None))
+                    if files_scanned >= next_check and files_scanned < len(files_to_analyze):
+                        point, low, high = estimator.estimate()
+                        if low >= self.confidence_threshold or high < self.confidence_threshold:
+                            settled_estimate = (point, low, high)
+                            triage_info['settled'] = True
+                            stopped_reason = 'triage_settled'
+                            logging.info(f"Triage verdict settled after {files_scanned} of {len(files_to_analyze)} "
+                                         f"files: confidence {point:.0f}% ({low:.0f}-{high:.0f}%)")
+                            break
+                        next_check = int(next_check * self.TRIAGE_CHECK_GROWTH) + 1
+            scan_seconds = time.monotonic() - scan_start
+            
+            # Structure indicators and the confidence are normalized by the Smali files actually
+            # scanned, not by the whole tree, so partial and sampled scans stay comparable
             
             # Additional analysis for file structure patterns
-            structure_indicators = self._analyze_file_structure(smali_files)
+            pattern_counts = dict(all_indicators)
+            structure_indicators = self._analyze_file_structure(scanned_smali_files)
             for indicator_type, count in structure_indicators.items():
                 if indicator_type not in all_indicators:
                     all_indicators[indicator_type] = 0
                 all_indicators[indicator_type] += count
             
             # Calculate confidence score
-            confidence = self._calculate_confidence(all_indicators, total_lines_analyzed, len(smali_files))
+            confidence = self._calculate_confidence(all_indicators, total_lines_analyzed, len(scanned_smali_files))
+            if estimator is not None and 0 < files_scanned < len(files_to_analyze):
+                # A sample's counts cover only part of the code; estimate the full-scan confidence instead
+                point, low, high = settled_estimate or estimator.estimate()
+                confidence = int(round(point))
+                triage_info['confidence_interval'] = [round(low, 1), round(high, 1)]
             is_obfuscated = confidence >= self.confidence_threshold
             
             # Format indicators for response
-            formatted_indicators = []
-            for indicator_type, count in all_indicators.items():
-                if count > 0:
-                    pattern_info = self.obfuscation_patterns.get(indicator_type, {})
-                    formatted_indicators.append({
-                        'type': indicator_type,
-                        'count': count,
-                        'severity': pattern_info.get('severity', 'unknown'),
-                        'description': pattern_info.get('description', 'Unknown pattern')
-                    })
+            formatted_indicators = self._format_indicators(all_indicators)
             
             # Sort code snippets by severity and file path
-            all_code_snippets.sort(key=lambda x: (
-                {'high': 0, 'medium': 1, 'low': 2}.get(x.get('severity', 'low'), 2),
-                x.get('file', '')
-            ))
+            self._sort_snippets(all_code_snippets)
 
             if len(all_code_snippets) > self.MAX_SNIPPETS_FOR_FRONTEND:
                 logging.warning(f"Frontend: Too many snippets ({len(all_code_snippets)}), sending only {self.MAX_SNIPPETS_FOR_FRONTEND} for display.")
@@ -186,11 +343,43 @@ class ObfuscationService:
                 'indicators': formatted_indicators,
                 'code_snippets': all_code_snippets,
                 'summary': f'Analyzed {len(files_to_analyze)} files ({len(smali_files)} Smali, {len(java_files)} Java), found {len(all_code_snippets)} obfuscated code snippets',
-                'files_analyzed': len(files_to_analyze),
+                'files_analyzed': files_scanned,
                 'total_snippets': len(all_code_snippets),
                 'smali_files_count': len(smali_files),
-                'java_files_count': len(java_files)
+                'java_files_count': len(java_files),
+                'coverage': self._coverage(files_scanned, len(files_to_analyze), bytes_scanned, stopped_reason),
+                # What the confidence is computed from, so it can be recomputed after the rules change
+                'pattern_versions': self.pattern_versions,
+                'pattern_counts': pattern_counts,
+                'structure_counts': structure_indicators,
+                'lines_analyzed': total_lines_analyzed,
+                'smali_files_scanned': len(scanned_smali_files)
             }
+            if triage_info is not None:
+                result['triage'] = triage_info
+                if stopped_reason == 'triage_settled':
+                    result['summary'] = (f'Triage: sampled {files_scanned} of {len(files_to_analyze)} files across '
+                                         f'{triage_info["strata"]} packages, confidence {confidence}% '
+                                         f'({self.TRIAGE_CONFIDENCE_LEVEL:.0%} CI {triage_info["confidence_interval"][0]:.0f}-'
+                                         f'{triage_info["confidence_interval"][1]:.0f}%), '
+                                         f'found {len(all_code_snippets)} obfuscated code snippets')
+            if stopped_reason == 'deadline':
+                result['summary'] = (f'Partial scan: analyzed {files_scanned} of {len(files_to_analyze)} files '
+                                     f'({len(smali_files)} Smali, {len(java_files)} Java) before the time budget ran out, '
+                                     f'found {len(all_code_snippets)} obfuscated code snippets')
+            if library_tally is not None:
+                result['libraries'] = self._library_report(library_tally, bytes_scanned, scan_seconds)
+                if self.library_mode == 'skip' and result['libraries']['files_skipped']:
+                    result['summary'] += (f', skipped {result["libraries"]["files_skipped"]} known library files '
+                                          f'({result["libraries"]["bytes_skipped"] / (1024 * 1024):.1f} MB)')
+            if cache_stats is not None:
+                result['class_cache'] = self._class_cache_report(cache_stats)
+            if baseline is not None:
+                result['diff'] = self._manifest_diff(baseline, files_manifest, stopped_reason is None)
+                result['summary'] += (f'; {result["diff"]["files_rescanned"]} changed files rescanned, '
+                                      f'{result["diff"]["files_unchanged"]} unchanged')
+            if files_manifest is not None:
+                result['files_manifest'] = files_manifest
             
             if self.socketio:
                 self.socketio.emit('analysis_status', {
@@ -209,10 +398,164 @@ class ObfuscationService:
                 'code_snippets': [],
                 'error': str(e)
             }
+        finally:
+            if archive:
+                archive.close()
+            if self.class_cache is not None:
+                try:
+                    self.class_cache.flush()
+                except Exception as e:
+                    logging.warning(f"Could not write the class cache: {e}")
+    
+    def reanalyze_obfuscation(self, output_dir: str, previous: Dict[str, Any], code_snippets: List[Dict],
+                              files_manifest: Dict[str, Dict] = None, cancel_event=None) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Bring a stored obfuscation result up to date with the current pattern set
+        
+        Only patterns whose version changed (or that are new) are evaluated again, over the
+        retained decompiled tree; the counts of unchanged patterns are reused and removed
+        patterns are dropped. The confidence is then recomputed from the stored counts, so a
+        change of weights alone opens no file at all.
+        
+        Args:
+            output_dir: Decompiled directory or packed archive the result was computed from
+            previous: Stored obfuscation result of a complete scan (with pattern_versions and pattern_counts)
+            code_snippets: Stored code snippets of that result
+            files_manifest: Stored files_manifest of that result, updated in place with the
+                            rescanned patterns' results (optional)
+            cancel_event: threading.Event that stops the re-analysis at the next file when set (optional)
+            
+        Returns:
+            Tuple of (success, obfuscation_data). obfuscation_data['reanalysis'] lists the patterns
+            rescanned and dropped and how many files were read.
+        """
+        if 'pattern_versions' not in previous or 'pattern_counts' not in previous:
+            return False, {'error': 'Result predates per-pattern counts, a full re-analysis is needed'}
+        if previous.get('triage') is not None or not (previous.get('coverage') or {}).get('complete', False):
+            return False, {'error': 'Only complete scans can be re-analyzed, sampled and partial counts are not totals'}
+        
+        started = time.monotonic()
+        stale = [name for name, version in self.pattern_versions.items()
+                 if previous['pattern_versions'].get(name) != version]
+        dropped = [name for name in previous['pattern_versions'] if name not in self.pattern_versions]
+        current = set(self.pattern_versions).difference(stale)
+        pattern_counts = {name: count for name, count in previous['pattern_counts'].items() if name in current}
+        # Kept snippets pick up changed severities and descriptions
+        all_code_snippets = [
+            {**snippet, 'type': self.obfuscation_patterns[snippet['pattern_type']]['description'],
+             'severity': self.obfuscation_patterns[snippet['pattern_type']]['severity']}
+            for snippet in code_snippets if snippet.get('pattern_type') in current
+        ]
+        files_read = 0
+        
+        archive = None
+        try:
+            if stale:
+                if not os.path.exists(output_dir):
+                    return False, {'error': f'Decompiled output {output_dir} is no longer available'}
+                if self.socketio:
+                    self.socketio.emit('analysis_status', {'message': f'Re-analyzing {len(stale)} changed patterns...'})
+                if PackArchive.is_archive(output_dir):
+                    archive = PackArchive(output_dir)
+                
+                # The same files as the original scan: the changed patterns are counted over the same code
+                all_files = self._find_smali_files(output_dir, archive) + self._find_java_files(output_dir, archive)
+                if self.library_prefixes is not None and self.library_mode == 'skip':
+                    all_files = self._partition_library_files(all_files, output_dir, archive, {})
+                
+                compiled = {name: self._compiled_patterns[name] for name in stale}
+                read_buffer = bytearray(64 * 1024)
+                for i, code_file in enumerate(all_files):
+                    if cancel_event is not None and cancel_event.is_set():
+                        logging.info(f"Re-analysis cancelled after {i} of {len(all_files)} files")
+                        return False, {'error': 'Analysis cancelled', 'cancelled': True}
+                    if self.socketio and i % 500 == 0:
+                        self.socketio.emit('analysis_progress', {
+                            'message': f'Re-analyzing file {i+1}/{len(all_files)}',
+                            'progress': int((i / len(all_files)) * 100)
+                        })
+                    
+                    try:
+                        size, relative_path = self._read_code_file(code_file, output_dir, archive, read_buffer)
+                    except OSError as e:
+                        logging.warning(f"Error analyzing file {code_file}: {e}")
+                        continue
+                    files_read += 1
+                    indicators, match_spans = self._scan_patterns(read_buffer, size, compiled)
+                    for pattern_name, count in indicators.items():
+                        pattern_counts[pattern_name] = pattern_counts.get(pattern_name, 0) + count
+                    all_code_snippets.extend(self._snippets_from_spans(read_buffer, size, match_spans, relative_path))
+                    
+                    if files_manifest is not None:
+                        entry = files_manifest.get(self._manifest_key(code_file, output_dir, archive))
+                        if entry is not None:
+                            self._update_manifest_entry(entry, indicators, match_spans, stale + dropped)
+            elif dropped and files_manifest is not None:
+                for entry in files_manifest.values():
+                    self._update_manifest_entry(entry, {}, {}, dropped)
+            
+            all_indicators = dict(pattern_counts)
+            for indicator_type, count in (previous.get('structure_counts') or {}).items():
+                all_indicators[indicator_type] = all_indicators.get(indicator_type, 0) + count
+            confidence = self._calculate_confidence(all_indicators, previous.get('lines_analyzed', 0),
+                                                    previous.get('smali_files_scanned', 0))
+            self._sort_snippets(all_code_snippets)
+            
+            seconds = round(time.monotonic() - started, 3)
+            result = {
+                **previous,
+                'is_obfuscated': confidence >= self.confidence_threshold,
+                'confidence': confidence,
+                'indicators': self._format_indicators(all_indicators),
+                'code_snippets': all_code_snippets,
+                'total_snippets': len(all_code_snippets),
+                'summary': re.sub(r'found \d+ obfuscated code snippets',
+                                  f'found {len(all_code_snippets)} obfuscated code snippets', previous.get('summary', '')),
+                'pattern_versions': self.pattern_versions,
+                'pattern_counts': pattern_counts,
+                'reanalysis': {
+                    'patterns_rescanned': stale,
+                    'patterns_dropped': dropped,
+                    'files_read': files_read,
+                    'seconds': seconds,
+                    'confidence_before': previous.get('confidence', 0)
+                }
+            }
+            if files_manifest is not None:
+                result['files_manifest'] = files_manifest
+            
+            logging.info(f"Re-analysis complete: {len(stale)} patterns rescanned over {files_read} files, "
+                         f"{len(dropped)} dropped, confidence {previous.get('confidence', 0)}% -> {confidence}% "
+                         f"in {seconds:.2f}s")
+            return True, result
+            
+        except Exception as e:
+            logging.exception(f"Error during obfuscation re-analysis: {e}")
+            return False, {'error': str(e)}
+        finally:
+            if archive:
+                archive.close()
     
-    def _find_smali_files(self, output_dir: str) -> List[str]:
-        """Find all Smali files in the decompiled directory"""
+    @staticmethod
+    def _update_manifest_entry(entry: Dict[str, Any], indicators: Dict[str, int], match_spans: Dict[str, List],
+                               replaced: List[str]):
+        """Replace the results of some patterns in a files_manifest entry"""
+        entry_indicators = {name: count for name, count in entry['indicators'].items() if name not in replaced}
+        entry_matches = {name: spans for name, spans in entry['matches'].items() if name not in replaced}
+        entry_indicators.update(indicators)
+        entry_matches.update(match_spans)
+        entry['indicators'] = entry_indicators
+        entry['matches'] = entry_matches
+    
+    def _find_smali_files(self, output_dir: str, archive: PackArchive = None) -> List[str]:
+        """Find all Smali files in the decompiled directory (or member names in a packed archive)"""
+        if archive:
+            smali_files = [name for name in archive.names() if name.endswith('.smali')]
+            logging.info(f"Found {len(smali_files)} Smali files for obfuscation analysis")
+            return smali_files
+        
         smali_files = []
+        seen = set()
         
         # Look for Smali files in common locations
         search_paths = [
@@ -226,15 +569,24 @@ class ObfuscationService:
             if os.path.exists(search_path):
                 for root, dirs, files in os.walk(search_path):
                     for file in files:
-                        if file.endswith('.smali'):
-                            smali_files.append(os.path.join(root, file))
+                        file_path = os.path.join(root, file)
+                        # The search paths overlap, so only count each file once
+                        if file.endswith('.smali') and file_path not in seen:
+                            seen.add(file_path)
+                            smali_files.append(file_path)
         
         logging.info(f"Found {len(smali_files)} Smali files for obfuscation analysis")
         return smali_files
     
-    def _find_java_files(self, output_dir: str) -> List[str]:
-        """Find all Java files in the decompiled directory"""
+    def _find_java_files(self, output_dir: str, archive: PackArchive = None) -> List[str]:
+        """Find all Java files in the decompiled directory (or member names in a packed archive)"""
+        if archive:
+            java_files = [name for name in archive.names() if name.endswith('.java')]
+            logging.info(f"Found {len(java_files)} Java files for obfuscation analysis")
+            return java_files
+        
         java_files = []
+        seen = set()
         
         # Look for Java files in common decompiled locations
         search_paths = [
@@ -247,12 +599,72 @@ class ObfuscationService:
             if os.path.exists(search_path):
                 for root, dirs, files in os.walk(search_path):
                     for file in files:
-                        if file.endswith('.java'):
-                            java_files.append(os.path.join(root, file))
+                        file_path = os.path.join(root, file)
+                        if file.endswith('.java') and file_path not in seen:
+                            seen.add(file_path)
+                            java_files.append(file_path)
         
         logging.info(f"Found {len(java_files)} Java files for obfuscation analysis")
         return java_files
     
+    def _class_path(self, file_path: str, output_dir: str, archive: PackArchive = None) -> str:
+        """Slash-separated class path of a code file ('androidx/core/app/ActivityCompat'), without its code root"""
+        relative_path = file_path if archive else os.path.relpath(file_path, output_dir)
+        parts = relative_path.replace('\\', '/').split('/')
+        if len(parts) > 1 and self.CODE_ROOT_PATTERN.match(parts[0]):
+            parts = parts[1:]
+        return os.path.splitext('/'.join(parts))[0]
+    
+    def _partition_library_files(self, files: List[str], output_dir: str, archive: PackArchive,
+                                 library_tally: Dict[str, List[int]]) -> List[str]:
+        """
+        Split code files into app code and known library code
+        
+        Args:
+            files: Code file paths (or archive member names)
+            output_dir: Decompiled output path the files belong to
+            archive: Open PackArchive for packed trees (optional)
+            library_tally: Dict updated in place with [files, bytes] per matched library prefix
+        
+        Returns:
+            List of the files that are not under a known library package
+        """
+        app_files = []
+        for file_path in files:
+            prefix = self.library_prefixes.match(self._class_path(file_path, output_dir, archive))
+            if prefix is None:
+                app_files.append(file_path)
+                continue
+            # Sizes come from the archive index or a stat call, so library files are never opened
+            try:
+                size = archive.size(file_path) if archive else os.path.getsize(file_path)
+            except OSError:
+                size = 0
+            tally = library_tally.setdefault(prefix, [0, 0])
+            tally[0] += 1
+            tally[1] += size
+        return app_files
+    
+    def _library_report(self, library_tally: Dict[str, List[int]], bytes_scanned: int, scan_seconds: float) -> Dict[str, Any]:
+        """Summarize the library tally; the time saved is extrapolated from this scan's throughput"""
+        files = sum(tally[0] for tally in library_tally.values())
+        size = sum(tally[1] for tally in library_tally.values())
+        skipped = self.library_mode == 'skip'
+        seconds_saved = None
+        if skipped and bytes_scanned and scan_seconds > 0:
+            seconds_saved = round(size / (bytes_scanned / scan_seconds), 3)
+        largest = sorted(library_tally.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'mode': self.library_mode,
+            'files': files,
+            'bytes': size,
+            'files_skipped': files if skipped else 0,
+            'bytes_skipped': size if skipped else 0,
+            'estimated_seconds_saved': seconds_saved,
+            'prefixes': [{'prefix': prefix, 'files': tally[0], 'bytes': tally[1]}
+                         for prefix, tally in largest[:self.LIBRARY_REPORT_PREFIXES]]
+        }
+    
     def _analyze_file_structure(self, smali_files: List[str]) -> Dict[str, int]:
         """Analyze file structure patterns for obfuscation indicators"""
         indicators = {}
@@ -281,64 +693,334 @@ class ObfuscationService:
         
         return indicators
     
-    def _analyze_file(self, file_path: str, base_dir: str) -> Tuple[Dict[str, int], List[Dict], int]:
+    def _analyze_file(self, file_path: str, base_dir: str, archive: PackArchive = None,
+                      buffer: bytearray = None, cache_stats: Dict[str, Any] = None, baseline: Dict[str, Dict] = None,
+                      files_manifest: Dict[str, Dict] = None) -> Tuple[Dict[str, int], List[Dict], int, int]:
         """
         Analyze a single code file for obfuscation patterns
         
+        The file is scanned as raw bytes (Smali is ASCII); only the snippets that are
+        returned get decoded to text. Files whose content is unchanged from the baseline,
+        or was scanned before in any APK (with a class cache), are answered from the
+        recorded result instead.
+        
+        Args:
+            file_path: Path to the file, or member name when scanning a packed archive
+            base_dir: Decompiled output path the file belongs to
+            archive: Open PackArchive for packed trees (optional)
+            buffer: Reusable read buffer, grown in place as needed (optional)
+            cache_stats: Per-scan class cache counters, updated in place (optional)
+            baseline: files_manifest of a previous build (optional)
+            files_manifest: Manifest of this scan, updated in place with the file's entry (optional)
+        
         Returns:
-            Tuple of (indicators_count, code_snippets, total_lines)
+            Tuple of (indicators_count, code_snippets, total_lines, bytes_read)
         """
         indicators = {}
         code_snippets = []
+        if buffer is None:
+            buffer = bytearray()
         
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                lines = content.split('\n')
+            started = time.perf_counter()
+            size, relative_path = self._read_code_file(file_path, base_dir, archive, buffer)
             
-            # Get relative file path
-            relative_path = os.path.relpath(file_path, base_dir)
+            digest = cache_key = cached = manifest_key = None
+            if self.class_cache is not None or baseline is not None or files_manifest is not None:
+                with memoryview(buffer) as view, view[:size] as content:
+                    digest = self._content_digest(content)
+            if baseline is not None or files_manifest is not None:
+                manifest_key = self._manifest_key(file_path, base_dir, archive)
+            if baseline is not None:
+                recorded = baseline.get(manifest_key)
+                if recorded is not None and recorded['digest'] == digest.hex():
+                    cached = recorded
+            if self.class_cache is not None:
+                cache_key = self._class_cache_key(digest)
+                if cached is None:
+                    cached = self.class_cache.get(cache_key)
             
-            # Analyze each pattern
-            for pattern_name, pattern_info in self.obfuscation_patterns.items():
-                pattern = pattern_info['pattern']
-                matches = list(re.finditer(pattern, content, re.IGNORECASE | re.MULTILINE))
-                
-                if matches:
-                    indicators[pattern_name] = len(matches)
-                    
-                    # Extract code snippets for first few matches
-                    for match in matches[:3]:  # Limit to 3 snippets per pattern per file
-                        snippet = self._extract_code_snippet(
-                            content, lines, match, relative_path, pattern_name, pattern_info
-                        )
-                        if snippet:
-                            code_snippets.append(snippet)
+            if cached is not None:
+                indicators = dict(cached['indicators'])
+                match_spans = cached['matches']
+                lines_count = cached['lines']
+            else:
+                indicators, match_spans = self._scan_patterns(buffer, size, self._compiled_patterns)
+                lines_count = buffer.count(b'\n', 0, size) + 1
             
-            return indicators, code_snippets, len(lines)
+            # Snippets are cached as offsets, since paths differ between APKs
+            code_snippets = self._snippets_from_spans(buffer, size, match_spans, relative_path)
+            
+            if files_manifest is not None:
+                files_manifest[manifest_key] = {'digest': digest.hex(), 'indicators': indicators,
+                                                'matches': match_spans, 'lines': lines_count}
+            if self.class_cache is not None:
+                if cached is None:
+                    self.class_cache.put(cache_key, {'indicators': indicators, 'matches': match_spans,
+                                                     'lines': lines_count})
+                if cache_stats is not None:
+                    elapsed = time.perf_counter() - started
+                    if cached is not None:
+                        cache_stats['hits'] += 1
+                        cache_stats['bytes_from_cache'] += size
+                        cache_stats['hit_seconds'] += elapsed
+                    else:
+                        cache_stats['misses'] += 1
+                        cache_stats['bytes_missed'] += size
+                        cache_stats['miss_seconds'] += elapsed
+            return indicators, code_snippets, lines_count, size
             
         except Exception as e:
             logging.warning(f"Error analyzing file {file_path}: {e}")
-            return {}, [], 0
+            return {}, [], 0, 0
+    
+    def _scan_patterns(self, buffer: bytearray, size: int, compiled_patterns: Dict[str, 're.Pattern']):
+        """
+        Count the matches of each pattern in a file's bytes
+        
+        Returns:
+            Tuple of (match count per matching pattern, (start, end) of the first few matches per pattern)
+        """
+        indicators = {}
+        match_spans = {}
+        for pattern_name, compiled in compiled_patterns.items():
+            count = 0
+            spans = []
+            for match in compiled.finditer(buffer, 0, size):
+                count += 1
+                if count <= 3:  # Limit to 3 snippets per pattern per file
+                    spans.append((match.start(), match.end()))
+            
+            if count:
+                indicators[pattern_name] = count
+                match_spans[pattern_name] = spans
+        return indicators, match_spans
+    
+    def _snippets_from_spans(self, buffer: bytearray, size: int, match_spans: Dict[str, List], relative_path: str) -> List[Dict]:
+        """Extract the code snippets of a file's recorded matches"""
+        code_snippets = []
+        for pattern_name, spans in match_spans.items():
+            pattern_info = self.obfuscation_patterns[pattern_name]
+            for start, end in spans:
+                snippet = self._extract_code_snippet(
+                    buffer, size, start, end, relative_path, pattern_name, pattern_info
+                )
+                if snippet:
+                    code_snippets.append(snippet)
+        return code_snippets
+    
+    def _format_indicators(self, all_indicators: Dict[str, int]) -> List[Dict[str, Any]]:
+        """Format indicator counts for the response, with the current severity and description of each pattern"""
+        formatted_indicators = []
+        for indicator_type, count in all_indicators.items():
+            if count > 0:
+                pattern_info = self.obfuscation_patterns.get(indicator_type, {})
+                formatted_indicators.append({
+                    'type': indicator_type,
+                    'count': count,
+                    'severity': pattern_info.get('severity', 'unknown'),
+                    'description': pattern_info.get('description', 'Unknown pattern')
+                })
+        return formatted_indicators
+    
+    @staticmethod
+    def _sort_snippets(code_snippets: List[Dict]):
+        """Sort code snippets in place by severity and file path"""
+        code_snippets.sort(key=lambda x: (
+            {'high': 0, 'medium': 1, 'low': 2}.get(x.get('severity', 'low'), 2),
+            x.get('file', '')
+        ))
+    
+    @staticmethod
+    def _content_digest(content) -> bytes:
+        """BLAKE2b digest of a class file's content"""
+        return hashlib.blake2b(content, digest_size=16).digest()
+    
+    def _class_cache_key(self, digest: bytes) -> bytes:
+        """Class cache key of a content digest, keyed by the pattern versions"""
+        return hashlib.blake2b(digest, digest_size=16, key=self._class_cache_salt).digest()
+    
+    def _manifest_key(self, file_path: str, output_dir: str, archive: PackArchive = None) -> str:
+        """Manifest key of a code file: its class path and extension, independent of the dex it is in"""
+        return self._class_path(file_path, output_dir, archive) + os.path.splitext(file_path)[1]
+    
+    def _manifest_diff(self, baseline: Dict[str, Dict], files_manifest: Dict[str, Dict], complete: bool) -> Dict[str, Any]:
+        """
+        Compare the manifests of two builds
+        
+        Args:
+            baseline: Manifest of the previous build
+            files_manifest: Manifest of this scan
+            complete: Whether this scan covered every file (otherwise unscanned files are not reported as removed)
+        
+        Returns:
+            Dict with the file counts per change, the pattern indicator totals before and after,
+            and the largest per-file indicator increases (new_indicators) and decreases
+            (removed_indicators)
+        """
+        added = [key for key in files_manifest if key not in baseline]
+        modified = [key for key in files_manifest if key in baseline and baseline[key]['digest'] != files_manifest[key]['digest']]
+        removed = [key for key in baseline if key not in files_manifest] if complete else []
+        
+        new_indicators = []
+        removed_indicators = []
+        for key in added + modified + removed:
+            before = baseline[key]['indicators'] if key in baseline else {}
+            after = files_manifest[key]['indicators'] if key in files_manifest else {}
+            for indicator_type in set(before) | set(after):
+                change = after.get(indicator_type, 0) - before.get(indicator_type, 0)
+                if change > 0:
+                    new_indicators.append({'file': key, 'type': indicator_type, 'count': change})
+                elif change < 0:
+                    removed_indicators.append({'file': key, 'type': indicator_type, 'count': -change})
+        
+        totals = {}
+        for position, manifest in enumerate((baseline, files_manifest)):
+            for entry in manifest.values():
+                for indicator_type, count in entry['indicators'].items():
+                    totals.setdefault(indicator_type, [0, 0])[position] += count
+        
+        for changes in (new_indicators, removed_indicators):
+            changes.sort(key=lambda change: (-change['count'], change['file'], change['type']))
+        return {
+            'files_added': len(added),
+            'files_removed': len(removed),
+            'files_modified': len(modified),
+            'files_unchanged': len(files_manifest) - len(added) - len(modified),
+            'files_rescanned': len(added) + len(modified),
+            'indicator_totals': {
+                indicator_type: {'before': before, 'after': after, 'change': after - before}
+                for indicator_type, (before, after) in sorted(totals.items())
+            },
+            'new_indicators': new_indicators[:self.DIFF_REPORT_LIMIT],
+            'removed_indicators': removed_indicators[:self.DIFF_REPORT_LIMIT],
+            'added_files': sorted(added)[:self.DIFF_REPORT_LIMIT],
+            'removed_files': sorted(removed)[:self.DIFF_REPORT_LIMIT],
+            'modified_files': sorted(modified)[:self.DIFF_REPORT_LIMIT]
+        }
+    
+    def _class_cache_report(self, cache_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Summarize a scan's class cache counters; the time saved is extrapolated from the misses' throughput"""
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        if cache_stats['bytes_missed'] and cache_stats['miss_seconds'] > 0:
+            # Remembered for scans that hit the cache for every file
+            self._miss_bytes_per_second = cache_stats['bytes_missed'] / cache_stats['miss_seconds']
+        seconds_saved = None
+        if self._miss_bytes_per_second:
+            scan_seconds = cache_stats['bytes_from_cache'] / self._miss_bytes_per_second
+            seconds_saved = round(max(0.0, scan_seconds - cache_stats['hit_seconds']), 3)
+        return {
+            'hits': cache_stats['hits'],
+            'misses': cache_stats['misses'],
+            'hit_rate': round(cache_stats['hits'] / lookups, 3) if lookups else 0.0,
+            'bytes_from_cache': cache_stats['bytes_from_cache'],
+            'estimated_seconds_saved': seconds_saved
+        }
+    
+    def _stratum_of(self, file_path: str, output_dir: str, archive: PackArchive = None) -> Tuple[str, str]:
+        """Triage stratum of a code file: its dex/source root and its two top-level package segments"""
+        relative_path = file_path if archive else os.path.relpath(file_path, output_dir)
+        parts = relative_path.replace('\\', '/').split('/')[:-1]
+        return (parts[0] if parts else '', '/'.join(parts[1:3]))
+    
+    def _triage_row(self, indicators: Dict[str, int], lines_count: int, smali_file: str = None) -> List[int]:
+        """Count vector of one scanned file: every pattern, then lines and a Smali flag"""
+        structure = self._analyze_file_structure([smali_file]) if smali_file else {}
+        row = [indicators.get(name, 0) + structure.get(name, 0) for name in self.obfuscation_patterns]
+        row.append(lines_count)
+        row.append(1 if smali_file else 0)
+        return row
+    
+    def _confidence_of_totals(self, totals) -> int:
+        """Confidence score of a totals vector laid out like _triage_row"""
+        indicators = {name: totals[index] for index, name in enumerate(self.obfuscation_patterns) if totals[index] > 0}
+        return self._calculate_confidence(indicators, totals[-2], totals[-1])
+    
+    @staticmethod
+    def _coverage(files_scanned: int, files_total: int, bytes_scanned: int, stopped_reason: str = None) -> Dict[str, Any]:
+        """Build the coverage metadata of a scan (stopped_reason is None for a complete scan)"""
+        return {
+            'complete': stopped_reason is None,
+            'files_scanned': files_scanned,
+            'files_total': files_total,
+            'files_percent': round(files_scanned / files_total * 100, 1) if files_total else 100.0,
+            'bytes_scanned': bytes_scanned,
+            'stopped_reason': stopped_reason
+        }
+    
+    def _compile_patterns(self) -> Dict[str, 're.Pattern']:
+        """Compile the detection patterns once as bytes regexes"""
+        return {
+            pattern_name: re.compile(pattern_info['pattern'].encode('ascii'), self.PATTERN_FLAGS)
+            for pattern_name, pattern_info in self.obfuscation_patterns.items()
+        }
     
-    def _extract_code_snippet(self, content: str, lines: List[str], match, 
+    def _pattern_versions(self) -> Dict[str, str]:
+        """Version hash of each pattern's matching rule (regex and flags; weights and texts are not part of it)"""
+        return {
+            pattern_name: hashlib.blake2b(f"{int(self.PATTERN_FLAGS)}:{pattern_info['pattern']}".encode(),
+                                          digest_size=8).hexdigest()
+            for pattern_name, pattern_info in self.obfuscation_patterns.items()
+        }
+    
+    def _read_code_file(self, file_path: str, base_dir: str, archive: PackArchive, buffer: bytearray) -> Tuple[int, str]:
+        """Read a code file (or archive member) into the reusable buffer, returning its size and relative path"""
+        if archive:
+            # Archive member names are already relative to the tree root
+            return self._copy_member_into(archive, file_path, buffer), file_path
+        return self._read_into(file_path, buffer), os.path.relpath(file_path, base_dir)
+    
+    @staticmethod
+    def _read_into(file_path: str, buffer: bytearray) -> int:
+        """Read a whole file into the reusable buffer with a single readinto, returning its size"""
+        with open(file_path, 'rb', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > len(buffer):
+                buffer.extend(bytes(size - len(buffer)))
+            with memoryview(buffer) as view, view[:size] as target:
+                return f.readinto(target)
+    
+    @staticmethod
+    def _copy_member_into(archive: PackArchive, name: str, buffer: bytearray) -> int:
+        """Copy an archive member out of the mapping into the reusable buffer, returning its size"""
+        start, end = archive.span(name)
+        size = end - start
+        if size > len(buffer):
+            buffer.extend(bytes(size - len(buffer)))
+        with memoryview(archive.buffer) as source:
+            buffer[:size] = source[start:end]
+        return size
+    
+    def _extract_code_snippet(self, data: bytearray, size: int, match_start: int, match_end: int,
                             file_path: str, pattern_name: str, pattern_info: Dict) -> Dict:
-        """Extract a code snippet around a match"""
+        """Extract a code snippet around a match, decoding only the snippet bytes"""
         try:
             # Find line number of the match
-            line_start = content[:match.start()].count('\n')
-            line_end = content[:match.end()].count('\n')
+            line_start = data.count(b'\n', 0, match_start)
+            line_end = line_start + data.count(b'\n', match_start, match_end)
             
             # Extract context (5 lines before and after for Smali files)
             context_start = max(0, line_start - 5)
-            context_end = min(len(lines), line_end + 6)
+            snippet_begin = data.rfind(b'\n', 0, match_start) + 1
+            matched_line_end = data.find(b'\n', snippet_begin, size)
+            matched_line = data[snippet_begin:matched_line_end if matched_line_end != -1 else size]
+            for _ in range(line_start - context_start):
+                snippet_begin = data.rfind(b'\n', 0, snippet_begin - 1) + 1
             
-            # Get the code snippet with context
-            snippet_lines = lines[context_start:context_end]
-            snippet_code = '\n'.join(snippet_lines)
+            # Walk forward to the end of the last context line
+            snippet_end = data.rfind(b'\n', 0, match_end) + 1
+            context_end = line_end
+            while context_end < line_end + 6:
+                newline = data.find(b'\n', snippet_end, size)
+                if newline == -1:
+                    snippet_end = size + 1
+                    context_end += 1
+                    break
+                snippet_end = newline + 1
+                context_end += 1
             
-            # Highlight the matched line
-            matched_line = lines[line_start] if line_start < len(lines) else ""
+            # Get the code snippet with context
+            snippet_code = data[snippet_begin:snippet_end - 1].decode('utf-8', errors='ignore')
             
             return {
                 'id': hashlib.md5(f"{file_path}:{line_start}:{pattern_name}".encode()).hexdigest()[:8],
@@ -346,8 +1028,8 @@ class ObfuscationService:
                 'file': file_path,
                 'line_start': line_start + 1,  # 1-based line numbers
                 'line_end': line_end + 1,
-                'matched_text': match.group(),
-                'matched_line': matched_line.strip(),
+                'matched_text': data[match_start:match_end].decode('utf-8', errors='ignore'),
+                'matched_line': matched_line.decode('utf-8', errors='ignore').strip(),
                 'code_snippet': snippet_code,
                 'context_start': context_start + 1,
                 'context_end': context_end,
@@ -374,7 +1056,7 @@ class ObfuscationService:
             
             # Calculate score based on frequency
             frequency = count / max(total_lines, 1)
-            pattern_score = min(frequency * 1000, 100) * weight  # Cap at 100 per pattern
+            pattern_score = min(frequency * self.PATTERN_FREQUENCY_SCALE, 100) * weight  # Cap at 100 per pattern
             total_score += pattern_score
             max_possible_score += 100 * weight
         
@@ -385,37 +1067,19 @@ class ObfuscationService:
         
         # Enhanced heuristics for Smali files
         confidence_boost = 0
-        
-        # High confidence indicators
-        if indicators.get('short_class_names', 0) > smali_file_count * 0.3:  # More than 30% short class names
-            confidence_boost += 30
-            
-        if indicators.get('short_method_names', 0) > total_lines * 0.05:  # More than 5% short method names
-            confidence_boost += 25
-            
-        if indicators.get('synthetic_methods', 0) > 10:  # Many synthetic methods
-            confidence_boost += 20
-            
-        if indicators.get('access_methods', 0) > 5:  # Multiple access methods
-            confidence_boost += 15
-            
-        if indicators.get('obfuscated_packages', 0) > 0:  # Single char package names
-            confidence_boost += 20
-            
-        # Medium confidence indicators
-        if indicators.get('dollar_classes', 0) > smali_file_count * 0.2:  # Many inner classes
-            confidence_boost += 15
-            
-        if indicators.get('string_encryption', 0) > 3:  # Multiple encryption patterns
-            confidence_boost += 15
+        scales = {'smali_files': smali_file_count, 'lines': total_lines}
+        for indicator_type, scale, ratio, points in self.CONFIDENCE_BOOSTS:
+            limit = ratio * scales[scale] if scale else ratio
+            if indicators.get(indicator_type, 0) > limit:
+                confidence_boost += points
         
         # Combine base confidence with boosts
         final_confidence = min(base_confidence + confidence_boost, 100)
         
         # Minimum confidence if we have clear obfuscation indicators
-        if (indicators.get('short_class_names', 0) > 0 and 
-            indicators.get('short_method_names', 0) > 0):
-            final_confidence = max(final_confidence, 60)  # At least 60% if both present
+        required, floor = self.CONFIDENCE_FLOOR
+        if all(indicators.get(indicator_type, 0) > 0 for indicator_type in required):
+            final_confidence = max(final_confidence, floor)
         
         return final_confidence
     
@@ -1,6 +1,7 @@
 import os
 import xml.etree.ElementTree as ET
 import logging
+from utils.archive_utils import PackArchive
 
 class PermissionService:
     """Service for analyzing Android app permissions"""
@@ -21,22 +22,33 @@ class PermissionService:
         Analyze permissions from a decompiled APK
         
         Args:
-            decompiled_dir: Path to decompiled APK directory
+            decompiled_dir: Path to decompiled APK directory or packed archive
             
         Returns:
             tuple: (success, permissions_list or error_message)
         """
         try:
-            manifest_path = os.path.join(decompiled_dir, 'AndroidManifest.xml')
-            
-            if not os.path.exists(manifest_path):
-                error_msg = f"AndroidManifest.xml not found at {manifest_path}"
-                logging.error(error_msg)
-                self._emit_status(error_msg)
-                return False, error_msg
-            
-            # Parse manifest and extract permissions
-            permissions = self._extract_permissions_from_manifest(manifest_path)
+            if PackArchive.is_archive(decompiled_dir):
+                with PackArchive(decompiled_dir) as archive:
+                    if 'AndroidManifest.xml' not in archive:
+                        error_msg = f"AndroidManifest.xml not found in {decompiled_dir}"
+                        logging.error(error_msg)
+                        self._emit_status(error_msg)
+                        return False, error_msg
+                    
+                    # Parse the manifest straight from the archive without extracting it
+                    permissions = self._extract_permissions_from_manifest(archive.open('AndroidManifest.xml'))
+            else:
+                manifest_path = os.path.join(decompiled_dir, 'AndroidManifest.xml')
+                
+                if not os.path.exists(manifest_path):
+                    error_msg = f"AndroidManifest.xml not found at {manifest_path}"
+                    logging.error(error_msg)
+                    self._emit_status(error_msg)
+                    return False, error_msg
+                
+                # Parse manifest and extract permissions
+                permissions = self._extract_permissions_from_manifest(manifest_path)
             
             # Remove duplicates
             unique_permissions = self._remove_duplicate_permissions(permissions)
@@ -59,7 +71,7 @@ class PermissionService:
         Extract permissions from AndroidManifest.xml
         
         Args:
-            manifest_path: Path to AndroidManifest.xml
+            manifest_path: Path to AndroidManifest.xml (or a binary file object)
             
         Returns:
             list: List of permission dictionaries
@@ -0,0 +1,283 @@
+import time
+import logging
+import numpy as np
+
+class RescoringService:
+    """Service for re-scoring stored analyses after the scoring rules change
+
+    The confidence and security score of an analysis only depend on its indicator
+    totals, lines analyzed, Smali files scanned, dangerous permission count and target
+    SDK, which the session store keeps per session. Loading them for every stored
+    analysis into one matrix lets new weights and thresholds be applied to all of them
+    at once, without decompiling or scanning anything again.
+    """
+
+    # Security score rules, also applied to single analyses by Routes._calculate_security_score
+    DANGEROUS_PERMISSION_PENALTY = 5  # Points per dangerous permission
+    OBFUSCATION_PENALTY = 20  # Points at 100% confidence, for apps judged obfuscated
+    TARGET_SDK_PENALTIES = ((28, 15), (30, 10))  # (target SDK below, points), first match applies
+    UNKNOWN_SDK_PENALTY = 5
+    RISK_LEVELS = ((80, 'Low'), (60, 'Medium'))  # (lowest score, level); anything lower is 'High'
+    DEFAULT_RISK_LEVEL = 'High'
+
+    HISTOGRAM_BINS = np.arange(0, 101, 10)  # Confidence buckets of the distribution report
+
+    def __init__(self, obfuscation_service, session_store, confidence_threshold=30):
+        """
+        Initialize the service
+
+        Args:
+            obfuscation_service: ObfuscationService whose pattern weights and confidence rules are applied
+            session_store: SessionStore holding the analyses and their score inputs
+            confidence_threshold: Confidence percentage from which an APK counts as obfuscated
+        """
+        self.obfuscation_service = obfuscation_service
+        self.session_store = session_store
+        self.confidence_threshold = confidence_threshold
+
+    @classmethod
+    def security_score(cls, dangerous_count, is_obfuscated, confidence, target_sdk_version):
+        """
+        Calculate the security score of one analysis
+
+        Args:
+            dangerous_count: Number of dangerous permissions requested
+            is_obfuscated: Obfuscation verdict
+            confidence: Obfuscation confidence percentage
+            target_sdk_version: Target SDK version from the manifest (string or int, may be unparsable)
+
+        Returns:
+            dict: {'score': 0-100, 'level': 'Low' / 'Medium' / 'High' risk}
+        """
+        score = 100  # Start with perfect score
+        score -= dangerous_count * cls.DANGEROUS_PERMISSION_PENALTY
+        if is_obfuscated:
+            score -= (confidence / 100) * cls.OBFUSCATION_PENALTY
+        try:
+            score -= cls._sdk_penalty(int(target_sdk_version))
+        except (ValueError, TypeError):
+            score -= cls.UNKNOWN_SDK_PENALTY
+
+        # Ensure score is between 0 and 100
+        score = max(0, min(100, int(score)))
+        return {'score': score, 'level': cls._risk_level(score)}
+
+    def rescore(self, weights=None, confidence_threshold=None, write=True):
+        """
+        Recompute the confidence, verdict and security score of every stored analysis
+
+        Args:
+            weights: Pattern name -> weight overrides on top of the current pattern weights (optional)
+            confidence_threshold: Obfuscation threshold to apply instead of the configured one (optional)
+            write: Store the new scores of the analyses whose scores changed (optional)
+
+        Returns:
+            dict: Number of analyses re-scored and changed, the shift of the confidence and
+                  security score distributions, verdict flips and the time of each step
+        """
+        threshold = self.confidence_threshold if confidence_threshold is None else confidence_threshold
+
+        started = time.perf_counter()
+        rows = self.session_store.score_inputs()
+        inputs = self._matrix(rows)
+        loaded = time.perf_counter()
+
+        confidence = self.confidence_scores(inputs, weights)
+        is_obfuscated = confidence >= threshold
+        security_score = self.security_scores(inputs['dangerous_permissions'], is_obfuscated, confidence,
+                                              inputs['target_sdk'])
+        scored = time.perf_counter()
+
+        # Security scores are only stored once derived (they need the APK info); the rest get theirs on next load
+        has_security_score = inputs['security_score'] >= 0
+        changed = np.flatnonzero(
+            (confidence != inputs['confidence']) | (is_obfuscated != inputs['is_obfuscated'])
+            | (has_security_score & (security_score != inputs['security_score']))
+        )
+        updated = 0
+        if write and len(changed):
+            updated = self.session_store.update_scores(
+                (
+                    rows[i][0], int(confidence[i]), bool(is_obfuscated[i]),
+                    {'score': int(security_score[i]), 'level': self._risk_level(security_score[i])}
+                    if has_security_score[i] else None
+                )
+                for i in changed
+            )
+        written = time.perf_counter()
+
+        report = {
+            'sessions': len(rows),
+            'changed': len(changed),
+            'updated': updated,
+            'confidence_threshold': threshold,
+            'confidence': self._shift(inputs['confidence'], confidence),
+            'verdicts': {
+                'obfuscated_before': int(inputs['is_obfuscated'].sum()),
+                'obfuscated_after': int(is_obfuscated.sum()),
+                'newly_obfuscated': int((is_obfuscated & ~inputs['is_obfuscated']).sum()),
+                'no_longer_obfuscated': int((~is_obfuscated & inputs['is_obfuscated']).sum())
+            },
+            'security_score': {
+                **self._shift(inputs['security_score'][has_security_score], security_score[has_security_score]),
+                'levels_before': self._level_counts(inputs['security_score'][has_security_score]),
+                'levels_after': self._level_counts(security_score[has_security_score])
+            },
+            'seconds': {'load': round(loaded - started, 4), 'score': round(scored - loaded, 4),
+                        'write': round(written - scored, 4)}
+        }
+        logging.info(f"Re-scored {len(rows)} analyses in {written - started:.3f}s, {len(changed)} changed, "
+                     f"{updated} written")
+        return report
+
+    def confidence_scores(self, inputs, weights=None):
+        """
+        Vectorized ObfuscationService._calculate_confidence over many analyses
+
+        Args:
+            inputs: Score input arrays as built by _matrix
+            weights: Pattern name -> weight overrides (optional)
+
+        Returns:
+            numpy.ndarray: Integer confidence of each analysis
+        """
+        service = self.obfuscation_service
+        counts, present, lines, smali_files = inputs['counts'], inputs['present'], inputs['lines'], inputs['smali_files']
+        weights = weights or {}
+        column_weights = np.array([
+            weights.get(name, service.obfuscation_patterns.get(name, {}).get('weight', 1))
+            for name in inputs['indicators']
+        ], dtype=np.float64)
+
+        # Base scoring from pattern matches, capped at 100 per pattern
+        frequency = counts / np.maximum(lines, 1)[:, None]
+        pattern_score = np.minimum(frequency * service.PATTERN_FREQUENCY_SCALE, 100) * column_weights
+        total_score = np.where(present, pattern_score, 0).sum(axis=1)
+        max_possible_score = np.where(present, 100 * column_weights, 0).sum(axis=1)
+        ratio = np.divide(total_score, max_possible_score, out=np.zeros_like(total_score),
+                          where=max_possible_score != 0)
+        base_confidence = np.minimum(np.trunc(ratio * 100), 100)
+
+        scales = {'smali_files': smali_files, 'lines': lines}
+        confidence_boost = np.zeros(len(lines))
+        for indicator_type, scale, ratio_limit, points in service.CONFIDENCE_BOOSTS:
+            limit = ratio_limit * scales[scale] if scale else ratio_limit
+            confidence_boost += np.where(self._column(inputs, indicator_type) > limit, points, 0)
+
+        confidence = np.minimum(base_confidence + confidence_boost, 100)
+        required, floor = service.CONFIDENCE_FLOOR
+        has_required = np.all([self._column(inputs, indicator_type) > 0 for indicator_type in required], axis=0)
+        confidence = np.where(has_required, np.maximum(confidence, floor), confidence)
+        return np.where(lines == 0, 0, confidence).astype(np.int64)
+
+    @classmethod
+    def security_scores(cls, dangerous_permissions, is_obfuscated, confidence, target_sdk):
+        """
+        Vectorized security_score over many analyses
+
+        Args:
+            dangerous_permissions: Dangerous permission count of each analysis
+            is_obfuscated: Boolean verdict of each analysis
+            confidence: Confidence of each analysis
+            target_sdk: Target SDK of each analysis, NaN where unknown
+
+        Returns:
+            numpy.ndarray: Integer security score of each analysis
+        """
+        score = 100 - dangerous_permissions * float(cls.DANGEROUS_PERMISSION_PENALTY)
+        score = score - np.where(is_obfuscated, (confidence / 100) * cls.OBFUSCATION_PENALTY, 0)
+        sdk_penalty = np.full(len(score), float(cls.UNKNOWN_SDK_PENALTY))
+        known = ~np.isnan(target_sdk)
+        sdk_penalty[known] = 0
+        # Later rules first, so the first matching rule is the one left standing
+        for below, points in reversed(cls.TARGET_SDK_PENALTIES):
+            sdk_penalty[known & (target_sdk < below)] = points
+        score = score - sdk_penalty
+        return np.clip(np.trunc(score), 0, 100).astype(np.int64)
+
+    def _matrix(self, rows):
+        """
+        Lay out score_inputs rows as arrays, one indicator column per indicator seen in any row
+
+        Returns:
+            dict: indicators (column names), counts and present (rows x indicators), and one
+                  array per scalar input; a stored security score of -1 means none yet
+        """
+        indicators = sorted({name for row in rows for name in row[5]})
+        column_of = {name: column for column, name in enumerate(indicators)}
+        counts = np.zeros((len(rows), len(indicators)), dtype=np.float64)
+        present = np.zeros((len(rows), len(indicators)), dtype=bool)
+        for index, row in enumerate(rows):
+            for name, count in row[5].items():
+                counts[index, column_of[name]] = count
+                present[index, column_of[name]] = True
+        return {
+            'indicators': indicators,
+            'column_of': column_of,
+            'counts': counts,
+            'present': present,
+            'lines': np.array([row[1] for row in rows], dtype=np.float64),
+            'smali_files': np.array([row[2] for row in rows], dtype=np.float64),
+            'dangerous_permissions': np.array([row[3] for row in rows], dtype=np.float64),
+            # Analyses opened before without APK info are scored like the routes do: target SDK 30
+            'target_sdk': np.array([self._parse_sdk(row[4] if row[4] is not None else '30') for row in rows],
+                                   dtype=np.float64),
+            'confidence': np.array([row[6] for row in rows], dtype=np.int64),
+            'is_obfuscated': np.array([row[7] for row in rows], dtype=bool),
+            'security_score': np.array([row[8] if row[8] is not None else -1 for row in rows], dtype=np.int64)
+        }
+
+    @staticmethod
+    def _column(inputs, indicator_type):
+        """Counts of one indicator across all analyses (zeros if no analysis has it)"""
+        column = inputs['column_of'].get(indicator_type)
+        return inputs['counts'][:, column] if column is not None else np.zeros(len(inputs['lines']))
+
+    @staticmethod
+    def _parse_sdk(target_sdk_version):
+        """Target SDK as a number, NaN if it cannot be parsed"""
+        try:
+            return int(target_sdk_version)
+        except (ValueError, TypeError):
+            return np.nan
+
+    @classmethod
+    def _sdk_penalty(cls, target_sdk):
+        """Points deducted for a known target SDK version"""
+        for below, points in cls.TARGET_SDK_PENALTIES:
+            if target_sdk < below:
+                return points
+        return 0
+
+    @classmethod
+    def _risk_level(cls, score):
+        """Risk level of a security score"""
+        for lowest, level in cls.RISK_LEVELS:
+            if score >= lowest:
+                return level
+        return cls.DEFAULT_RISK_LEVEL
+
+    @classmethod
+    def _level_counts(cls, scores):
+        """Number of analyses per risk level"""
+        counts = {level: 0 for _, level in cls.RISK_LEVELS}
+        counts[cls.DEFAULT_RISK_LEVEL] = 0
+        for score in scores:
+            counts[cls._risk_level(score)] += 1
+        return counts
+
+    @classmethod
+    def _shift(cls, before, after):
+        """Summary of how a score distribution moved"""
+        if not len(before):
+            return {'mean_before': None, 'mean_after': None, 'mean_abs_change': None, 'max_abs_change': None,
+                    'histogram_before': None, 'histogram_after': None}
+        change = np.abs(after - before)
+        return {
+            'mean_before': round(float(before.mean()), 2),
+            'mean_after': round(float(after.mean()), 2),
+            'mean_abs_change': round(float(change.mean()), 2),
+            'max_abs_change': int(change.max()),
+            'histogram_before': np.histogram(before, cls.HISTOGRAM_BINS)[0].tolist(),
+            'histogram_after': np.histogram(after, cls.HISTOGRAM_BINS)[0].tolist()
+        }
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from utils.file_utils import FileUtils
+
+class UploadService:
+    """Service for chunked, resumable uploads assembled into the content store
+
+    An upload is created with its final size, then its fixed-size chunks are PUT in
+    any order (and in parallel) straight into a preallocated staging file. Each
+    received chunk leaves a small marker file, so the received set survives
+    disconnects and server restarts and clients can resume by asking which chunks
+    are still missing. Completing the upload verifies the whole file and moves it
+    into the content-addressed store.
+    """
+
+    MANIFEST_NAME = 'upload.json'
+    DATA_NAME = 'data.part'
+    CHUNKS_DIR = 'chunks'
+
+    def __init__(self, staging_folder, content_store, allowed_extensions, chunk_size=8 * 1024 * 1024,
+                 max_upload_size=2 * 1024 * 1024 * 1024, stale_seconds=24 * 3600):
+        """
+        Initialize the upload service
+
+        Args:
+            staging_folder: Folder for in-progress uploads (same filesystem as the content store)
+            content_store: ContentStore receiving completed uploads
+            allowed_extensions: Set of allowed file extensions
+            chunk_size: Size of every chunk except the last, in bytes
+            max_upload_size: Largest accepted upload, in bytes
+            stale_seconds: Age after which abandoned uploads are removed
+        """
+        self.staging_folder = staging_folder
+        self.content_store = content_store
+        self.allowed_extensions = allowed_extensions
+        self.chunk_size = chunk_size
+        self.max_upload_size = max_upload_size
+        self.stale_seconds = stale_seconds
+        os.makedirs(staging_folder, exist_ok=True)
+
+    def create_upload(self, filename, size, sha256=None):
+        """
+        Start a chunked upload
+
+        Args:
+            filename: Original file name
+            size: Total size in bytes
+            sha256: Expected hex SHA-256 of the whole file (optional, verified on completion)
+
+        Returns:
+            tuple: (success, upload status dict or error_message)
+        """
+        if not filename or not FileUtils.allowed_file(filename, self.allowed_extensions):
+            return False, f"Invalid file type. Only {', '.join(self.allowed_extensions)} files are allowed"
+        if not isinstance(size, int) or size <= 0:
+            return False, "File size must be a positive integer"
+        if size > self.max_upload_size:
+            return False, f"File size exceeds the {self.max_upload_size // (1024 * 1024)}MB limit"
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if not self.content_store.is_valid_digest(sha256):
+                return False, "sha256 must be a hex SHA-256 digest"
+
+        self.purge_stale()
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        try:
+            os.makedirs(os.path.join(upload_dir, self.CHUNKS_DIR))
+            # Preallocate so chunks can be written at their offsets in any order
+            with open(os.path.join(upload_dir, self.DATA_NAME), 'wb') as f:
+                f.truncate(size)
+
+            manifest = {
+                'upload_id': upload_id,
+                'filename': filename,
+                'size': size,
+                'sha256': sha256,
+                'chunk_size': self.chunk_size,
+                'total_chunks': (size + self.chunk_size - 1) // self.chunk_size,
+                'created_at': time.time()
+            }
+            with open(os.path.join(upload_dir, self.MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f)
+        except OSError as e:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            logging.error(f"Could not create upload {upload_id}: {e}")
+            return False, f"Could not create upload: {str(e)}"
+
+        logging.info(f"Created upload {upload_id} for {filename} ({size} bytes, {manifest['total_chunks']} chunks)")
+        return True, self._status(manifest, set())
+
+    def get_status(self, upload_id):
+        """
+        Get the state of an upload, for resuming
+
+        Args:
+            upload_id: Upload identifier
+
+        Returns:
+            tuple: (success, upload status dict or error_message)
+        """
+        manifest = self._load_manifest(upload_id)
+        if manifest is None:
+            return False, "Upload not found"
+        return True, self._status(manifest, self._received_chunks(upload_id))
+
+    def put_chunk(self, upload_id, index, data, checksum=None):
+        """
+        Write one chunk of an upload
+
+        Chunks cover disjoint byte ranges, so concurrent PUTs of different chunks
+        never touch the same bytes. Re-sending a chunk simply overwrites it.
+
+        Args:
+            upload_id: Upload identifier
+            index: Zero-based chunk index
+            data: Chunk bytes
+            checksum: Expected hex SHA-256 of the chunk (optional)
+
+        Returns:
+            tuple: (success, chunk receipt dict or error_message)
+        """
+        manifest = self._load_manifest(upload_id)
+        if manifest is None:
+            return False, "Upload not found"
+        if not 0 <= index < manifest['total_chunks']:
+            return False, f"Chunk index {index} out of range (0-{manifest['total_chunks'] - 1})"
+
+        offset = index * manifest['chunk_size']
+        expected_length = min(manifest['chunk_size'], manifest['size'] - offset)
+        if len(data) != expected_length:
+            return False, f"Chunk {index} must be {expected_length} bytes, got {len(data)}"
+
+        chunk_sha256 = hashlib.sha256(data).hexdigest()
+        if checksum and checksum.lower() != chunk_sha256:
+            return False, f"Checksum mismatch for chunk {index}"
+
+        upload_dir = self._upload_dir(upload_id)
+        try:
+            with open(os.path.join(upload_dir, self.DATA_NAME), 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+            # The marker is only written once the bytes are in place
+            with open(os.path.join(upload_dir, self.CHUNKS_DIR, str(index)), 'w') as f:
+                f.write(chunk_sha256)
+        except OSError as e:
+            logging.error(f"Could not write chunk {index} of upload {upload_id}: {e}")
+            return False, f"Could not write chunk: {str(e)}"
+
+        return True, {'upload_id': upload_id, 'index': index, 'sha256': chunk_sha256}
+
+    def complete_upload(self, upload_id):
+        """
+        Verify an upload with all chunks received and move it into the content store
+
+        Args:
+            upload_id: Upload identifier
+
+        Returns:
+            tuple: (success, {'path', 'sha256', 'filename', 'size'} or error_message)
+        """
+        manifest = self._load_manifest(upload_id)
+        if manifest is None:
+            return False, "Upload not found"
+
+        missing = self._status(manifest, self._received_chunks(upload_id))['missing']
+        if missing:
+            return False, f"Upload is missing {len(missing)} chunk(s)"
+
+        upload_dir = self._upload_dir(upload_id)
+        data_path = os.path.join(upload_dir, self.DATA_NAME)
+        sha256 = self.content_store.hash_file(data_path)
+        if manifest['sha256'] and manifest['sha256'] != sha256:
+            return False, "Checksum mismatch for the assembled file"
+
+        ext = os.path.splitext(manifest['filename'])[1].lower()
+        try:
+            sha256, stored_path = self.content_store.ingest(data_path, sha256, ext)
+        except OSError as e:
+            logging.error(f"Could not store upload {upload_id}: {e}")
+            return False, f"Could not store upload: {str(e)}"
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+        logging.info(f"Completed upload {upload_id} ({manifest['filename']}) as {sha256}")
+        return True, {
+            'path': stored_path,
+            'sha256': sha256,
+            'filename': manifest['filename'],
+            'size': manifest['size']
+        }
+
+    def purge_stale(self):
+        """Remove uploads that were abandoned longer than stale_seconds ago"""
+        cutoff = time.time() - self.stale_seconds
+        for entry in os.scandir(self.staging_folder):
+            try:
+                if not entry.is_dir():
+                    continue
+                # New chunk markers keep the chunks directory's mtime fresh while a client is still active
+                last_activity = max(entry.stat().st_mtime,
+                                    os.path.getmtime(os.path.join(entry.path, self.CHUNKS_DIR)))
+            except OSError:
+                last_activity = 0
+            if last_activity < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                logging.info(f"Removed stale upload {entry.name}")
+
+    def _upload_dir(self, upload_id):
+        """Get the staging directory of an upload"""
+        return os.path.join(self.staging_folder, upload_id)
+
+    def _load_manifest(self, upload_id):
+        """Load an upload's manifest, or None if the upload id is unknown"""
+        # Upload ids are generated hex strings; reject anything else before touching the filesystem
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            return None
+        try:
+            with open(os.path.join(self._upload_dir(upload_id), self.MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _received_chunks(self, upload_id):
+        """Get the set of chunk indexes written so far"""
+        try:
+            return {int(name) for name in os.listdir(os.path.join(self._upload_dir(upload_id), self.CHUNKS_DIR))}
+        except OSError:
+            return set()
+
+    def _status(self, manifest, received):
+        """Build the client-facing status of an upload"""
+        return {
+            'upload_id': manifest['upload_id'],
+            'filename': manifest['filename'],
+            'size': manifest['size'],
+            'chunk_size': manifest['chunk_size'],
+            'total_chunks': manifest['total_chunks'],
+            'received': sorted(received),
+            'missing': [index for index in range(manifest['total_chunks']) if index not in received]
+        }
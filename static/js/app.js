@@ -27,6 +27,7 @@ class APKAnalyzer {
       submitButton: document.getElementById("submitButton"),
       loadingContainer: document.getElementById("loadingContainer"),
       progressFill: document.getElementById("progressFill"),
+      cancelButton: document.getElementById("cancelButton"),
 
       // Summary page elements
       apkName: document.getElementById("apkName"),
@@ -58,6 +59,7 @@ class APKAnalyzer {
 
   initEventListeners() {
     this.elements.uploadForm.addEventListener("submit", this.handleFormSubmit.bind(this))
+    this.elements.cancelButton.addEventListener("click", this.cancelAnalysis.bind(this))
 
     // Socket.IO event listeners
     this.socketManager.on("status", this.handleStatusUpdate.bind(this))
@@ -66,6 +68,47 @@ class APKAnalyzer {
     this.socketManager.on("analysis_complete", this.handleAnalysisComplete.bind(this))
     this.socketManager.on("analysis_status", this.handleAnalysisStatus.bind(this))
     this.socketManager.on("analysis_progress", this.handleAnalysisProgress.bind(this))
+    this.socketManager.on("analysis_started", this.handleAnalysisStarted.bind(this))
+    this.socketManager.on("analysis_updated", this.handleAnalysisUpdated.bind(this))
+  }
+
+  handleAnalysisUpdated(data) {
+    // Full results of an analysis that was first answered with a partial (time-budgeted) scan
+    const results = data.results || {}
+    if (!this.analysisData || this.analysisData.session_id !== results.session_id) return
+
+    this.analysisData = { ...this.analysisData, ...results }
+    if (this.elements.summaryPage.classList.contains("active")) {
+      this.populateSummaryPage()
+    } else if (this.elements.detailPage.classList.contains("active")) {
+      this.populateDetailPage()
+    }
+    this.uiManager.showMessage("Scan completed: results updated with full coverage.", "success")
+  }
+
+  handleAnalysisStarted(data) {
+    // Only the job of this upload can be cancelled from here
+    if (!this.elements.submitButton.disabled) return
+    this.currentJobId = data.job_id
+    this.elements.cancelButton.style.display = "inline-flex"
+    this.elements.cancelButton.disabled = false
+  }
+
+  cancelAnalysis() {
+    if (!this.currentJobId) return
+    this.elements.cancelButton.disabled = true
+    this.socketManager.emit("cancel_job", { job_id: this.currentJobId })
+    this.uiManager.showMessage("Cancelling analysis...", "warning")
+  }
+
+  handleAnalysisCancelled() {
+    if (this.analysisTimeout) {
+      clearTimeout(this.analysisTimeout)
+    }
+    this.currentJobId = null
+    this.elements.cancelButton.style.display = "none"
+    this.uiManager.setLoading(false)
+    this.uiManager.showMessage("Analysis cancelled.", "info")
   }
 
   handleStatusUpdate(data) {
@@ -106,29 +149,39 @@ class APKAnalyzer {
 
   async uploadFile() {
     try {
-      const formData = new FormData(this.elements.uploadForm)
+      const file = this.elements.fileInput.files[0]
+      const uploadStart = performance.now()
 
-      const response = await fetch("/upload", {
-        method: "POST",
-        body: formData,
-      })
+      // Re-submitted samples are recognized by hash and never transferred again
+      this.handleAnalysisProgress({ progress: 0, message: "Checking for an earlier analysis..." })
+      const sha256 = await this.fileUploader.hashFile(file)
+      let result = sha256 ? await this.fileUploader.lookupAnalysis(sha256, file.name) : null
 
-      const result = await response.json()
+      if (result) {
+        console.log(`Reused analysis for ${sha256}`)
+      } else {
+        result = await this.fileUploader.uploadChunked(file, sha256, (fraction) => {
+          this.handleAnalysisProgress({
+            progress: Math.round(fraction * 100),
+            message: fraction < 1 ? `Uploading... ${Math.round(fraction * 100)}%` : "Upload complete. Analyzing...",
+          })
+        })
+      }
 
-      if (!response.ok) {
-        throw new Error(result.error || "An error occurred during upload")
+      if (result.cancelled) {
+        this.handleAnalysisCancelled()
+        return
       }
 
-      this.currentFileName = this.elements.fileInput.files[0].name
+      const seconds = (performance.now() - uploadStart) / 1000
+      console.log(`Uploaded and analyzed ${(file.size / 1048576).toFixed(1)} MB in ${seconds.toFixed(1)} s`)
+
+      this.currentFileName = file.name
 
       if (result.complete_data) {
+        // Compact summary only; code snippets are fetched page by page from the session endpoints
         this.analysisData = result.complete_data
 
-        if (this.analysisData.obfuscation && this.analysisData.obfuscation.code_snippets) {
-          window.currentObfuscationSnippets = this.analysisData.obfuscation.code_snippets
-          console.log(`Stored ${this.analysisData.obfuscation.code_snippets.length} code snippets for pagination`)
-        }
-
         this.showSummaryPage()
         return
       }
@@ -151,6 +204,7 @@ class APKAnalyzer {
       }, 30000)
     } catch (error) {
       this.uiManager.showMessage(`Error: ${error.message}`, "error")
+      this.elements.cancelButton.style.display = "none"
       this.uiManager.setLoading(false)
     }
   }
@@ -170,6 +224,15 @@ class APKAnalyzer {
   handleAnalysisComplete(data) {
     console.log("Analysis complete:", data)
 
+    if (data.status === "cancelled") {
+      if (data.job_id === this.currentJobId) {
+        this.handleAnalysisCancelled()
+      }
+      return
+    }
+    this.currentJobId = null
+    this.elements.cancelButton.style.display = "none"
+
     if (this.analysisTimeout) {
       clearTimeout(this.analysisTimeout)
     }
@@ -180,11 +243,6 @@ class APKAnalyzer {
       this.analysisData = data.results || data
     }
 
-    if (this.analysisData.obfuscation && this.analysisData.obfuscation.code_snippets) {
-      window.currentObfuscationSnippets = this.analysisData.obfuscation.code_snippets
-      console.log(`Stored ${this.analysisData.obfuscation.code_snippets.length} code snippets for pagination`)
-    }
-
     this.showSummaryPage()
   }
 
@@ -208,11 +266,6 @@ class APKAnalyzer {
     if (this.analysisData) {
       this.analysisData.obfuscation = data
 
-      if (data.code_snippets) {
-        window.currentObfuscationSnippets = data.code_snippets
-        console.log(`Stored ${data.code_snippets.length} real obfuscation code snippets for pagination`)
-      }
-
       if (this.analysisData.permissions.length > 0 && this.analysisData.obfuscation) {
         setTimeout(() => {
           if (this.elements.uploadPage.classList.contains("active")) {
@@ -251,7 +304,7 @@ class APKAnalyzer {
     this.uiManager.hideMessage()
     this.uiManager.setLoading(false)
     this.analysisData = null
-    window.currentObfuscationSnippets = null
+    this.uiManager.destroySnippetBrowser()
 
     console.log("Upload form reset complete")
   }
@@ -274,7 +327,7 @@ class APKAnalyzer {
     const permissionsSummary = this.calculatePermissionsSummary(data.permissions || [])
     this.uiManager.updatePermissionsSummary(permissionsSummary)
 
-    this.uiManager.updateObfuscationStatus(data.obfuscation || { is_obfuscated: false, confidence: 0 })
+    this.uiManager.updateObfuscationStatus(data.obfuscation || { is_obfuscated: false, confidence: 0 }, data.diff)
 
     const keyFindings = this.generateKeyFindings(data)
     this.uiManager.updateKeyFindings(keyFindings)
@@ -291,7 +344,7 @@ class APKAnalyzer {
     this.elements.detailApkName.textContent = data.fileName || data.apkInfo?.name || "Unknown APK"
 
     this.uiManager.updatePermissionsList(data.permissions || [])
-    this.uiManager.updateObfuscationDetails(data.obfuscation || { is_obfuscated: false, code_snippets: [] })
+    this.uiManager.updateObfuscationDetails(data.obfuscation || { is_obfuscated: false, code_snippets: [] }, data.session_id)
     this.uiManager.updateManifestContent({ content: data.manifest || "Manifest data not available" })
     this.uiManager.updateFileStructure(data.fileStructure || ["File structure not available"])
   }
@@ -361,7 +414,7 @@ class APKAnalyzer {
 
     if (data.obfuscation?.is_obfuscated) {
       const confidence = data.obfuscation.confidence || 0
-      const snippetsCount = data.obfuscation.code_snippets?.length || 0
+      const snippetsCount = data.obfuscation.total_snippets ?? (data.obfuscation.code_snippets?.length || 0)
       findings.push({
         type: "info",
         message: `Code obfuscation detected (${confidence}% confidence, ${snippetsCount} code snippets found)`,
@@ -589,7 +642,7 @@ class UIManager {
     `
   }
 
-  updateObfuscationStatus(obfuscation) {
+  updateObfuscationStatus(obfuscation, diff) {
     const isObfuscated = obfuscation.is_obfuscated
     const confidence = obfuscation.confidence || 0
 
@@ -605,6 +658,26 @@ class UIManager {
       </div>
       <div class="obfuscation-text">${isObfuscated ? "Obfuscated" : "Not Obfuscated"}</div>
       <div class="obfuscation-confidence">Confidence: ${confidence}%</div>
+      ${
+        obfuscation.coverage && !obfuscation.coverage.complete
+          ? `<div class="obfuscation-coverage">Partial scan: ${obfuscation.coverage.files_scanned} of ${obfuscation.coverage.files_total} files (${obfuscation.coverage.files_percent}%)</div>`
+          : ""
+      }
+      ${
+        obfuscation.triage && obfuscation.triage.settled
+          ? `<div class="obfuscation-coverage">Triage estimate from ${obfuscation.coverage.files_scanned} sampled files (CI ${obfuscation.triage.confidence_interval[0]}-${obfuscation.triage.confidence_interval[1]}%)</div>`
+          : ""
+      }
+      ${
+        obfuscation.libraries && obfuscation.libraries.files_skipped
+          ? `<div class="obfuscation-coverage">Skipped ${obfuscation.libraries.files_skipped} known library files (${(obfuscation.libraries.bytes_skipped / (1024 * 1024)).toFixed(1)} MB)</div>`
+          : ""
+      }
+      ${
+        diff
+          ? `<div class="obfuscation-coverage">Since ${diff.baseline_version || diff.baseline_apk_name}: ${diff.files_added} added, ${diff.files_modified} modified, ${diff.files_removed} removed classes; confidence ${diff.confidence.before}% → ${diff.confidence.after}%; permissions +${diff.permissions.added.length} / -${diff.permissions.removed.length}</div>`
+          : ""
+      }
     `
   }
 
@@ -645,10 +718,12 @@ class UIManager {
   }
 
   // RESTORED: Complete obfuscation details with code snippets
-  updateObfuscationDetails(obfuscation) {
+  updateObfuscationDetails(obfuscation, sessionId) {
     const isObfuscated = obfuscation.is_obfuscated
     const confidence = obfuscation.confidence || 0
+    // Without a stored session the snippets arrive inline; otherwise only their count does
     const codeSnippets = obfuscation.code_snippets || []
+    const totalSnippets = obfuscation.total_snippets ?? codeSnippets.length
 
     let html = `
   <div class="obfuscation-summary ${isObfuscated ? "detected" : "not-detected"}">
@@ -664,7 +739,7 @@ class UIManager {
         <div>
           <h4>${isObfuscated ? "🔒 Obfuscation Detected" : "✅ No Significant Obfuscation"}</h4>
           <p class="confidence-text">Confidence Level: <strong>${confidence}%</strong></p>
-          ${codeSnippets.length > 0 ? `<p class="snippets-count">Found <strong>${codeSnippets.length}</strong> obfuscated code snippets</p>` : ""}
+          ${totalSnippets > 0 ? `<p class="snippets-count">Found <strong>${totalSnippets}</strong> obfuscated code snippets</p>` : ""}
         </div>
       </div>
       <div class="risk-level ${this.getObfuscationRiskLevel(confidence)}">
@@ -738,8 +813,8 @@ class UIManager {
     }
 
     // Add real obfuscated code snippets section with pagination
-    if (codeSnippets.length > 0) {
-      html += this.generateRealObfuscatedCodeSection(codeSnippets)
+    if (totalSnippets > 0) {
+      html += this.generateRealObfuscatedCodeSection(totalSnippets)
     }
 
     // Add recommendations section
@@ -779,172 +854,51 @@ class UIManager {
 
     this.elements.obfuscationDetails.innerHTML = html
 
-    // Initialize pagination if code snippets exist
-    if (codeSnippets.length > 0) {
-      // Ensure global snippets are available
-      if (!window.currentObfuscationSnippets) {
-        window.currentObfuscationSnippets = codeSnippets
-      }
-      this.initializeObfuscationPagination()
+    // Initialize the snippet browser if code snippets exist
+    if (totalSnippets > 0) {
+      this.initializeSnippetBrowser(sessionId, totalSnippets, codeSnippets)
+    } else {
+      this.destroySnippetBrowser()
     }
   }
 
-  generateRealObfuscatedCodeSection(codeSnippets) {
-    const totalSnippets = codeSnippets.length
-    const snippetsPerPage = 10
-    const totalPages = Math.ceil(totalSnippets / snippetsPerPage)
-
-    const html = `
+  generateRealObfuscatedCodeSection(totalSnippets) {
+    return `
     <div class="obfuscated-code-section">
       <div class="section-header">
         <h4>🔍 Real Obfuscated Code Snippets Found</h4>
         <div class="snippets-summary">
           <span class="total-snippets">Total: ${totalSnippets.toLocaleString()} snippets</span>
-          <span class="pages-info">Pages: ${totalPages}</span>
-        </div>
-      </div>
-      
-      <div class="pagination-controls top-pagination">
-        <button class="pagination-btn" id="prevBtn" onclick="changeObfuscationPage(-1)" disabled>
-          <svg class="icon" viewBox="0 0 24 24"><path d="M15 18l-6-6 6-6"/></svg>
-          Previous
-        </button>
-        <div class="page-info">
-          <span>Page <span id="currentPage">1</span> of <span id="totalPages">${totalPages}</span></span>
         </div>
-        <button class="pagination-btn" id="nextBtn" onclick="changeObfuscationPage(1)" ${totalPages <= 1 ? "disabled" : ""}>
-          Next
-          <svg class="icon" viewBox="0 0 24 24"><path d="M9 18l6-6-6-6"/></svg>
-        </button>
-      </div>
-
-      <div id="codeSnippetsContainer" class="code-snippets-container">
-        <!-- Code snippets will be populated here -->
-      </div>
-
-      <div class="pagination-controls bottom-pagination">
-        <button class="pagination-btn" onclick="changeObfuscationPage(-1)" disabled>
-          <svg class="icon" viewBox="0 0 24 24"><path d="M15 18l-6-6 6-6"/></svg>
-          Previous
-        </button>
-        <div class="page-info">
-          <span>Page <span class="current-page-bottom">1</span> of <span class="total-pages-bottom">${totalPages}</span></span>
-        </div>
-        <button class="pagination-btn" onclick="changeObfuscationPage(1)" ${totalPages <= 1 ? "disabled" : ""}>
-          Next
-          <svg class="icon" viewBox="0 0 24 24"><path d="M9 18l6-6-6-6"/></svg>
-        </button>
       </div>
+      <div id="snippetBrowser" class="snippet-browser"></div>
     </div>
   `
-
-    return html
   }
 
-  initializeObfuscationPagination() {
-    console.log("Initializing obfuscation pagination...")
-    console.log("Available snippets:", window.currentObfuscationSnippets?.length || 0)
+  initializeSnippetBrowser(sessionId, totalSnippets, inlineSnippets) {
+    this.destroySnippetBrowser()
 
-    // Store pagination data globally for access by pagination functions
-    window.obfuscationPagination = {
-      currentPage: 1,
-      snippetsPerPage: 10,
-      allSnippets: window.currentObfuscationSnippets || [],
-    }
-
-    console.log("Pagination initialized with", window.obfuscationPagination.allSnippets.length, "snippets")
-    this.displayObfuscationPage(1)
-  }
-
-  displayObfuscationPage(pageNumber) {
-    console.log(`Displaying obfuscation page ${pageNumber}`)
-
-    const pagination = window.obfuscationPagination
-    if (!pagination || !pagination.allSnippets || pagination.allSnippets.length === 0) {
-      console.error("No pagination data or snippets available")
+    const container = document.getElementById("snippetBrowser")
+    if (!container) {
+      console.error("Snippet browser container not found")
       return
     }
 
-    const startIndex = (pageNumber - 1) * pagination.snippetsPerPage
-    const endIndex = startIndex + pagination.snippetsPerPage
-    const pageSnippets = pagination.allSnippets.slice(startIndex, endIndex)
-    const totalPages = Math.ceil(pagination.allSnippets.length / pagination.snippetsPerPage)
-
-    console.log(
-      `Showing snippets ${startIndex + 1}-${Math.min(endIndex, pagination.allSnippets.length)} of ${pagination.allSnippets.length}`,
-    )
-
-    let html = ""
-    pageSnippets.forEach((snippet, index) => {
-      const globalIndex = startIndex + index + 1
-      html += `
-      <div class="code-snippet-card">
-        <div class="snippet-header">
-          <div class="snippet-info">
-            <span class="snippet-number">#${globalIndex}</span>
-            <span class="snippet-type">${snippet.type || "Code Pattern"}</span>
-            <span class="snippet-severity ${snippet.severity || "medium"}">${(snippet.severity || "medium").toUpperCase()}</span>
-          </div>
-          <div class="snippet-location">
-            <span class="file-path">${snippet.file || "Unknown file"}</span>
-            <span class="line-number">Lines ${snippet.line_start || "?"}-${snippet.line_end || "?"}</span>
-          </div>
-        </div>
-        
-        <div class="real-code-snippet">
-          <div class="code-block">
-            <h6>Detected Pattern: ${snippet.matched_text ? this.escapeHtml(snippet.matched_text) : "Pattern match"}</h6>
-            <pre><code>${this.escapeHtml(snippet.code_snippet || snippet.matched_line || "Code not available")}</code></pre>
-          </div>
-        </div>
-      </div>
-    `
+    // Rows are fetched from the server on demand; inline snippets are only used without a session
+    this.snippetBrowser = new SnippetBrowser(container, {
+      sessionId: sessionId,
+      totalSnippets: totalSnippets,
+      inlineSnippets: sessionId ? null : inlineSnippets,
+      onError: (message) => this.showMessage(`Error: ${message}`, "error"),
     })
-
-    const container = document.getElementById("codeSnippetsContainer")
-    if (container) {
-      container.innerHTML = html
-      console.log("Code snippets container updated with", pageSnippets.length, "snippets")
-    } else {
-      console.error("Code snippets container not found")
-    }
-
-    // Update pagination controls
-    this.updatePaginationControls(pageNumber, totalPages)
   }
 
-  updatePaginationControls(currentPage, totalPages) {
-    console.log(`Updating pagination controls: page ${currentPage} of ${totalPages}`)
-
-    // Update page numbers
-    const currentPageElements = document.querySelectorAll("#currentPage, .current-page-bottom")
-    const totalPagesElements = document.querySelectorAll("#totalPages, .total-pages-bottom")
-
-    currentPageElements.forEach((el) => {
-      if (el) el.textContent = currentPage
-    })
-    totalPagesElements.forEach((el) => {
-      if (el) el.textContent = totalPages
-    })
-
-    // Update button states
-    const prevButtons = document.querySelectorAll(".pagination-btn:first-child")
-    const nextButtons = document.querySelectorAll(".pagination-btn:last-child")
-
-    prevButtons.forEach((btn) => {
-      btn.disabled = currentPage <= 1
-    })
-
-    nextButtons.forEach((btn) => {
-      btn.disabled = currentPage >= totalPages
-    })
-
-    // Update global pagination state
-    if (window.obfuscationPagination) {
-      window.obfuscationPagination.currentPage = currentPage
+  destroySnippetBrowser() {
+    if (this.snippetBrowser) {
+      this.snippetBrowser.destroy()
+      this.snippetBrowser = null
     }
-
-    console.log("Pagination controls updated")
   }
 
   getObfuscationRiskLevel(confidence) {
@@ -1201,6 +1155,297 @@ class UIManager {
   }
 }
 
+/**
+ * Snippet Browser class - virtualized, infinite-scroll list of obfuscated code snippets.
+ * Rows are fetched in blocks from the cursor-paginated snippets endpoint and only a
+ * small window of blocks and DOM rows is kept, regardless of the total snippet count.
+ */
+class SnippetBrowser {
+  constructor(container, options) {
+    this.container = container
+    this.sessionId = options.sessionId
+    this.totalSnippets = options.totalSnippets
+    this.inlineSnippets = options.inlineSnippets
+    this.onError = options.onError || ((message) => console.error(message))
+
+    this.rowHeight = 44
+    this.blockSize = 100
+    this.maxBlocks = 5
+    this.overscan = 8
+    this.filters = { severity: "", pattern_type: "", file_prefix: "" }
+
+    this.handleScroll = this.handleScroll.bind(this)
+    this.render()
+    this.reset()
+  }
+
+  reset() {
+    this.generation = (this.generation || 0) + 1
+    this.blocks = new Map() // block index -> rows
+    this.blockCursors = [null] // cursor that fetches each block, null for the first one
+    this.pending = new Map() // block index -> in-flight promise
+    this.exhausted = false
+    this.total = this.hasFilters() ? null : this.totalSnippets
+    this.selected = null
+
+    this.viewport.scrollTop = 0
+    this.detail.style.display = "none"
+    this.updateSpacer()
+    this.loadBlock(0)
+  }
+
+  render() {
+    this.container.innerHTML = `
+      <div class="snippet-filters">
+        <select class="snippet-filter" data-filter="severity"><option value="">All severities</option></select>
+        <select class="snippet-filter" data-filter="pattern_type"><option value="">All patterns</option></select>
+        <input class="snippet-filter" data-filter="file_prefix" type="text" placeholder="File path prefix, e.g. smali/com/">
+        <span class="snippet-count"></span>
+      </div>
+      <div class="snippet-viewport" style="height: ${this.rowHeight * 12}px">
+        <div class="snippet-spacer"></div>
+      </div>
+      <div class="snippet-detail" style="display: none;"></div>
+    `
+
+    this.viewport = this.container.querySelector(".snippet-viewport")
+    this.spacer = this.container.querySelector(".snippet-spacer")
+    this.detail = this.container.querySelector(".snippet-detail")
+    this.countLabel = this.container.querySelector(".snippet-count")
+    this.severitySelect = this.container.querySelector('[data-filter="severity"]')
+    this.patternSelect = this.container.querySelector('[data-filter="pattern_type"]')
+    this.prefixInput = this.container.querySelector('[data-filter="file_prefix"]')
+
+    this.viewport.addEventListener("scroll", this.handleScroll)
+    this.spacer.addEventListener("click", (e) => {
+      const row = e.target.closest(".snippet-row")
+      if (row) this.showDetail(Number(row.dataset.index))
+    })
+    this.severitySelect.addEventListener("change", () => this.setFilter("severity", this.severitySelect.value))
+    this.patternSelect.addEventListener("change", () => this.setFilter("pattern_type", this.patternSelect.value))
+    this.prefixInput.addEventListener("input", () => {
+      clearTimeout(this.prefixTimer)
+      this.prefixTimer = setTimeout(() => this.setFilter("file_prefix", this.prefixInput.value.trim()), 300)
+    })
+  }
+
+  destroy() {
+    this.generation += 1
+    clearTimeout(this.prefixTimer)
+    this.viewport.removeEventListener("scroll", this.handleScroll)
+    this.container.innerHTML = ""
+    this.blocks.clear()
+  }
+
+  hasFilters() {
+    return Object.values(this.filters).some((value) => value)
+  }
+
+  setFilter(name, value) {
+    if (this.filters[name] === value) return
+    this.filters[name] = value
+    this.reset()
+  }
+
+  async fetchBlock(cursor) {
+    if (this.inlineSnippets) {
+      return this.sliceInlineSnippets(cursor)
+    }
+
+    const params = new URLSearchParams({ limit: this.blockSize, cursor: cursor ?? "" })
+    Object.entries(this.filters).forEach(([name, value]) => {
+      if (value) params.set(name, value)
+    })
+
+    const response = await fetch(`/api/obfuscation/${encodeURIComponent(this.sessionId)}/snippets?${params}`)
+    if (!response.ok) {
+      throw new Error(`Could not load snippets (HTTP ${response.status})`)
+    }
+    return response.json()
+  }
+
+  sliceInlineSnippets(cursor) {
+    const { severity, pattern_type, file_prefix } = this.filters
+    const matches = []
+    for (let seq = cursor === null ? 0 : cursor + 1; seq < this.inlineSnippets.length; seq++) {
+      const snippet = this.inlineSnippets[seq]
+      if (severity && snippet.severity !== severity) continue
+      if (pattern_type && snippet.pattern_type !== pattern_type) continue
+      if (file_prefix && !(snippet.file || "").startsWith(file_prefix)) continue
+      matches.push({ ...snippet, seq })
+      if (matches.length > this.blockSize) break
+    }
+
+    const hasNext = matches.length > this.blockSize
+    const snippets = matches.slice(0, this.blockSize)
+    const result = { snippets, next_cursor: hasNext ? snippets[snippets.length - 1].seq : null }
+    if (cursor === null && !this.hasFilters()) {
+      result.facets = this.countInlineFacets()
+    }
+    return result
+  }
+
+  countInlineFacets() {
+    const facets = { total: this.inlineSnippets.length, severity: {}, pattern_type: {} }
+    this.inlineSnippets.forEach((snippet) => {
+      facets.severity[snippet.severity] = (facets.severity[snippet.severity] || 0) + 1
+      facets.pattern_type[snippet.pattern_type] = (facets.pattern_type[snippet.pattern_type] || 0) + 1
+    })
+    return facets
+  }
+
+  loadBlock(index) {
+    if (this.blocks.has(index) || this.pending.has(index) || index >= this.blockCursors.length) {
+      return
+    }
+
+    const generation = this.generation
+    const request = this.fetchBlock(this.blockCursors[index])
+      .then((result) => {
+        if (generation !== this.generation) return // Filters changed while the block was in flight
+
+        this.blocks.set(index, result.snippets || [])
+        if (result.next_cursor === null || result.next_cursor === undefined) {
+          this.exhausted = true
+          this.total = index * this.blockSize + (result.snippets || []).length
+        } else if (this.blockCursors.length === index + 1) {
+          this.blockCursors.push(result.next_cursor)
+        }
+        if (result.facets) {
+          this.total = result.facets.total
+          this.updateFacets(result.facets)
+        }
+
+        this.evictBlocks()
+        this.updateSpacer()
+        this.renderRows()
+      })
+      .catch((error) => {
+        if (generation === this.generation) this.onError(error.message)
+      })
+      .finally(() => {
+        if (generation === this.generation) this.pending.delete(index)
+      })
+
+    this.pending.set(index, request)
+  }
+
+  evictBlocks() {
+    if (this.blocks.size <= this.maxBlocks) return
+
+    // Drop the blocks farthest from what is on screen; their cursors are kept for refetching
+    const centerBlock = Math.floor(this.viewport.scrollTop / this.rowHeight / this.blockSize)
+    const byDistance = [...this.blocks.keys()].sort((a, b) => Math.abs(b - centerBlock) - Math.abs(a - centerBlock))
+    byDistance.slice(0, this.blocks.size - this.maxBlocks).forEach((index) => this.blocks.delete(index))
+  }
+
+  updateFacets(facets) {
+    this.fillSelect(this.severitySelect, "All severities", facets.severity, this.filters.severity)
+    this.fillSelect(this.patternSelect, "All patterns", facets.pattern_type, this.filters.pattern_type)
+  }
+
+  fillSelect(select, allLabel, counts, selectedValue) {
+    select.innerHTML = ""
+    select.appendChild(new Option(allLabel, ""))
+    Object.entries(counts || {})
+      .sort((a, b) => b[1] - a[1])
+      .forEach(([value, count]) => {
+        select.appendChild(new Option(`${value.replace(/_/g, " ")} (${count.toLocaleString()})`, value))
+      })
+    select.value = selectedValue
+  }
+
+  updateSpacer() {
+    // Infinite scroll: the list only extends one block past what has been reached so far
+    const reachable = this.exhausted ? this.total : this.blockCursors.length * this.blockSize
+    const rows = this.total === null ? reachable : Math.min(reachable, this.total)
+    this.spacer.style.height = `${rows * this.rowHeight}px`
+
+    const total = this.total === null ? "…" : this.total.toLocaleString()
+    this.countLabel.textContent = `${total} matching snippets`
+  }
+
+  handleScroll() {
+    if (this.scrollFrame) return
+    this.scrollFrame = requestAnimationFrame(() => {
+      this.scrollFrame = null
+      this.renderRows()
+    })
+  }
+
+  renderRows() {
+    const first = Math.max(0, Math.floor(this.viewport.scrollTop / this.rowHeight) - this.overscan)
+    const last = Math.ceil((this.viewport.scrollTop + this.viewport.clientHeight) / this.rowHeight) + this.overscan
+
+    // Request any block on screen, plus the next block once the end of the reached range is near
+    for (let block = Math.floor(first / this.blockSize); block <= Math.floor(last / this.blockSize); block++) {
+      this.loadBlock(block)
+    }
+
+    const fragment = document.createDocumentFragment()
+    for (let index = first; index <= last; index++) {
+      const snippet = this.blocks.get(Math.floor(index / this.blockSize))?.[index % this.blockSize]
+      if (snippet) fragment.appendChild(this.createRow(snippet, index))
+    }
+    this.spacer.replaceChildren(fragment)
+  }
+
+  createRow(snippet, index) {
+    const row = document.createElement("div")
+    row.className = `snippet-row${this.selected?.index === index ? " selected" : ""}`
+    row.dataset.index = index
+    row.style.transform = `translateY(${index * this.rowHeight}px)`
+    row.style.height = `${this.rowHeight}px`
+
+    const severity = snippet.severity || "medium"
+    const cells = [
+      ["snippet-number", `#${index + 1}`],
+      [`snippet-severity ${severity}`, severity.toUpperCase()],
+      ["snippet-type", snippet.type || "Code Pattern"],
+      ["file-path", `${snippet.file || "Unknown file"}:${snippet.line_start || "?"}`],
+    ]
+    cells.forEach(([className, text]) => {
+      const cell = document.createElement("span")
+      cell.className = className
+      cell.textContent = text
+      row.appendChild(cell)
+    })
+    return row
+  }
+
+  showDetail(index) {
+    const snippet = this.blocks.get(Math.floor(index / this.blockSize))?.[index % this.blockSize]
+    if (!snippet) return
+
+    // Only the selected snippet is kept outside the block window
+    this.selected = { index, snippet }
+    this.detail.innerHTML = `
+      <div class="snippet-header">
+        <div class="snippet-info">
+          <span class="snippet-number"></span>
+          <span class="snippet-type"></span>
+        </div>
+        <div class="snippet-location">
+          <span class="file-path"></span>
+          <span class="line-number"></span>
+        </div>
+      </div>
+      <div class="code-block">
+        <h6></h6>
+        <pre><code></code></pre>
+      </div>
+    `
+    this.detail.querySelector(".snippet-number").textContent = `#${index + 1}`
+    this.detail.querySelector(".snippet-type").textContent = snippet.type || "Code Pattern"
+    this.detail.querySelector(".file-path").textContent = snippet.file || "Unknown file"
+    this.detail.querySelector(".line-number").textContent = `Lines ${snippet.line_start || "?"}-${snippet.line_end || "?"}`
+    this.detail.querySelector("h6").textContent = `Detected Pattern: ${snippet.matched_text || "Pattern match"}`
+    this.detail.querySelector("code").textContent = snippet.code_snippet || snippet.matched_line || "Code not available"
+    this.detail.style.display = "block"
+    this.renderRows()
+  }
+}
+
 /**
  * FIXED File Uploader class - handles file uploads and validation
  */
@@ -1208,6 +1453,9 @@ class FileUploader {
   constructor(elements, uiManager) {
     this.elements = elements
     this.uiManager = uiManager
+    this.parallelChunks = 4
+    this.chunkRetries = 5
+    this.maxHashSize = 512 * 1024 * 1024
     this.initEventListeners()
     this.setupGlobalDragPrevention()
   }
@@ -1294,7 +1542,7 @@ class FileUploader {
           this.uiManager.showMessage(`File "${file.name}" ready for analysis`, "success")
           console.log("Valid APK file dropped and processed")
         } else {
-          this.uiManager.showMessage("Please upload a valid APK file (.apk extension required).", "error")
+          this.uiManager.showMessage("Please upload a valid APK or split-APK bundle (.apk, .xapk, .apks, .apkm).", "error")
           console.log("Invalid file type dropped")
         }
       } else {
@@ -1325,7 +1573,7 @@ class FileUploader {
   isValidFile(file) {
     console.log("Validating file:", file.name, "Type:", file.type)
 
-    const allowedExtensions = [".apk"]
+    const allowedExtensions = [".apk", ".xapk", ".apks", ".apkm"]
     const fileName = file.name.toLowerCase()
     const hasValidExtension = allowedExtensions.some((ext) => fileName.endsWith(ext))
 
@@ -1354,7 +1602,7 @@ class FileUploader {
       return false
     }
 
-    const maxSizeInMB = 100
+    const maxSizeInMB = 2048
     const maxSizeInBytes = maxSizeInMB * 1024 * 1024
     if (file.size > maxSizeInBytes) {
       this.uiManager.showMessage(`File size exceeds ${maxSizeInMB}MB limit.`, "error")
@@ -1365,6 +1613,146 @@ class FileUploader {
     return true
   }
 
+  async hashFile(file) {
+    // Web Crypto has no streaming digest, so very large files skip the precheck rather than
+    // being held in memory twice; crypto.subtle also needs a secure context (HTTPS or localhost)
+    if (!window.crypto || !window.crypto.subtle || file.size > this.maxHashSize) {
+      return null
+    }
+
+    try {
+      return await this.sha256Hex(await file.arrayBuffer())
+    } catch (error) {
+      console.warn("Could not hash file, uploading without precheck:", error)
+      return null
+    }
+  }
+
+  async lookupAnalysis(sha256, fileName) {
+    try {
+      const response = await fetch(`/api/lookup/${sha256}`)
+      const result = await response.json()
+      if (response.ok) {
+        return result
+      }
+      if (!result.stored) {
+        return null
+      }
+
+      // The server still holds the sample, so it can be re-analyzed without uploading it
+      const analyzeResponse = await fetch(`/api/samples/${sha256}/analyze`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ filename: fileName }),
+      })
+      const analyzed = await analyzeResponse.json()
+      // A cancelled re-analysis must not fall back to uploading the file
+      return analyzeResponse.ok || analyzed.cancelled ? analyzed : null
+    } catch (error) {
+      console.warn("Lookup failed, uploading instead:", error)
+      return null
+    }
+  }
+
+  async uploadChunked(file, sha256, onProgress) {
+    // The same file (name, size and modification time) resumes its unfinished upload
+    const resumeKey = `apkUpload:${file.name}:${file.size}:${file.lastModified}`
+    let upload = await this.getUploadStatus(localStorage.getItem(resumeKey))
+
+    if (!upload) {
+      const response = await fetch("/api/uploads", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ filename: file.name, size: file.size, sha256: sha256 }),
+      })
+      upload = await response.json()
+      if (!response.ok) {
+        throw new Error(upload.error || "Could not start the upload")
+      }
+      localStorage.setItem(resumeKey, upload.upload_id)
+    } else {
+      console.log(`Resuming upload ${upload.upload_id}: ${upload.missing.length} of ${upload.total_chunks} chunks left`)
+    }
+
+    const pending = [...upload.missing]
+    let doneChunks = upload.total_chunks - pending.length
+    onProgress(doneChunks / upload.total_chunks)
+
+    // A few workers pull chunk indexes from the shared queue and PUT them concurrently
+    const worker = async () => {
+      while (pending.length > 0) {
+        await this.putChunk(upload, file, pending.shift())
+        doneChunks += 1
+        onProgress(doneChunks / upload.total_chunks)
+      }
+    }
+    const workerCount = Math.min(this.parallelChunks, pending.length)
+    await Promise.all(Array.from({ length: workerCount }, worker))
+
+    const response = await fetch(`/api/uploads/${upload.upload_id}/complete`, { method: "POST" })
+    const result = await response.json()
+    // 409 means chunks are still missing (unless the analysis was cancelled), so keep the upload around to resume it
+    if (response.status !== 409 || result.cancelled) {
+      localStorage.removeItem(resumeKey)
+    }
+    if (result.cancelled) {
+      return result
+    }
+    if (!response.ok) {
+      throw new Error(result.error || "An error occurred during upload")
+    }
+    return result
+  }
+
+  async getUploadStatus(uploadId) {
+    if (!uploadId) return null
+
+    try {
+      const response = await fetch(`/api/uploads/${encodeURIComponent(uploadId)}`)
+      return response.ok ? await response.json() : null
+    } catch (error) {
+      console.warn("Could not check upload status:", error)
+      return null
+    }
+  }
+
+  async putChunk(upload, file, index) {
+    const start = index * upload.chunk_size
+    const body = await file.slice(start, Math.min(start + upload.chunk_size, file.size)).arrayBuffer()
+    const headers = { "Content-Type": "application/octet-stream" }
+
+    // crypto.subtle is only available in secure contexts (HTTPS or localhost)
+    if (window.crypto && window.crypto.subtle) {
+      headers["X-Chunk-SHA256"] = await this.sha256Hex(body)
+    }
+
+    for (let attempt = 1; attempt <= this.chunkRetries; attempt++) {
+      let response = null
+      try {
+        response = await fetch(`/api/uploads/${upload.upload_id}/chunks/${index}`, { method: "PUT", headers, body })
+      } catch (error) {
+        console.warn(`Chunk ${index} attempt ${attempt} failed:`, error)
+      }
+
+      if (response && response.ok) return
+
+      // Client errors (bad checksum, unknown upload) will not succeed on retry
+      if (response && response.status < 500) {
+        const result = await response.json().catch(() => ({}))
+        throw new Error(result.error || `Chunk ${index} was rejected (HTTP ${response.status})`)
+      }
+      if (attempt < this.chunkRetries) {
+        await new Promise((resolve) => setTimeout(resolve, attempt * 1000))
+      }
+    }
+    throw new Error(`Chunk ${index} failed after ${this.chunkRetries} attempts`)
+  }
+
+  async sha256Hex(buffer) {
+    const digest = await window.crypto.subtle.digest("SHA-256", buffer)
+    return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, "0")).join("")
+  }
+
   setFileInput(file) {
     console.log("Setting file input with:", file.name)
 
@@ -1439,28 +1827,6 @@ function downloadReport() {
   }
 }
 
-// Global pagination function for obfuscated code
-function changeObfuscationPage(direction) {
-  console.log(`changeObfuscationPage called with direction: ${direction}`)
-
-  const pagination = window.obfuscationPagination
-  if (!pagination) {
-    console.error("No pagination data available")
-    return
-  }
-
-  const newPage = pagination.currentPage + direction
-  const totalPages = Math.ceil(pagination.allSnippets.length / pagination.snippetsPerPage)
-
-  console.log(`Current page: ${pagination.currentPage}, New page: ${newPage}, Total pages: ${totalPages}`)
-
-  if (newPage >= 1 && newPage <= totalPages) {
-    window.apkAnalyzer.uiManager.displayObfuscationPage(newPage)
-  } else {
-    console.log("Page out of bounds")
-  }
-}
-
 // Initialize when DOM is ready
 document.addEventListener("DOMContentLoaded", () => {
   const io = window.io
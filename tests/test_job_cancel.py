@@ -0,0 +1,101 @@
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+from config import Config
+from models.session_store import SessionStore
+from services.upload_service import UploadService
+from utils.content_store import ContentStore
+from utils.file_utils import FileUtils
+from web.routes import Routes
+
+class BlockingEngine:
+    """Stands in for AnalysisEngine: an analysis that runs until it is cancelled"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.job_id = None
+
+    def analyze(self, file_path, original_filename, session_id, sha256, cancel_event, time_budget, triage,
+                find_baseline):
+        self.job_id = session_id
+        self.started.set()
+        # Block the way decompilation does: on a real wait, without yielding to any event loop
+        cancel_event.wait(30)
+        return False, "Analysis cancelled"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(port, path, body=None, timeout=10):
+    """POST body as JSON (or GET without one), returning (status, JSON response)"""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data=data,
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+def start_server(tmp_path):
+    """Serve the routes the way app.py does, with the configured async mode, and return its port"""
+    class TestConfig(Config):
+        ANALYTICS_FOLDER = None
+        SESSION_DB_PATH = str(tmp_path / 'sessions.db')
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode=Config.SOCKETIO_ASYNC_MODE)
+    content_store = ContentStore(str(tmp_path / 'objects'))
+    upload_service = UploadService(str(tmp_path / 'staging'), content_store, Config.ALLOWED_EXTENSIONS)
+    routes = Routes(app, TestConfig, None, None, None, FileUtils(), socketio,
+                    SessionStore(TestConfig.SESSION_DB_PATH), upload_service)
+    engine = BlockingEngine()
+    routes.socket_events_handler.engine = engine
+
+    sample = tmp_path / 'app.apk'
+    sample.write_bytes(b'PK\x03\x04 not really an apk')
+    sha256, _ = content_store.ingest(str(sample))
+
+    port = free_port()
+    threading.Thread(target=socketio.run, args=(app,), kwargs={'host': '127.0.0.1', 'port': port,
+                                                               'allow_unsafe_werkzeug': True},
+                     daemon=True).start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    return port, engine, sha256
+
+def test_cancel_reaches_running_analysis(tmp_path):
+    port, engine, sha256 = start_server(tmp_path)
+    upload = {}
+    analysis = threading.Thread(target=lambda: upload.update(
+        response=request(port, f'/api/samples/{sha256}/analyze', {'filename': 'app.apk'}, timeout=60)))
+    analysis.start()
+    assert engine.started.wait(10)
+
+    # The server keeps answering while the analysis runs...
+    start = time.monotonic()
+    assert request(port, f'/api/jobs/{engine.job_id}/cancel', {})[0] == 202
+    assert time.monotonic() - start < 2
+
+    # ...and the cancelled analysis ends its request right away
+    analysis.join(10)
+    assert not analysis.is_alive()
+    status, body = upload['response']
+    assert status == 409
+    assert json.loads(body)['cancelled'] is True
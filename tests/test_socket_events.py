@@ -0,0 +1,79 @@
+from flask import Flask
+from flask_socketio import SocketIO
+
+from models.session_store import SessionStore
+from web.socket_events import SocketEvents
+
+class FakeEngine:
+    """Stands in for AnalysisEngine, returning canned results"""
+
+    def __init__(self, results):
+        self.results = results
+
+    def analyze(self, file_path, original_filename, session_id, sha256, cancel_event, time_budget, triage,
+                find_baseline):
+        return True, {**self.results, 'session_id': session_id}
+
+def full_results(files=50):
+    """Results of a complete full scan, including its per-file manifest"""
+    return {
+        'apk_name': 'app.apk',
+        'apk_path': '/srv/uploads/app.apk',
+        'output_dir': '/srv/decompiled_output/app-0123',
+        'package_name': 'com.example.app',
+        'sha256': 'ab' * 32,
+        'permissions': [],
+        'partial': False,
+        'scan_mode': 'full',
+        'obfuscation': {
+            'confidence': 40,
+            'is_obfuscated': True,
+            'indicators': [{'type': 'short_method_names', 'count': 3, 'severity': 'medium'}],
+            'code_snippets': [{'file': f'smali/a/C{i}.smali', 'code_snippet': 'x', 'severity': 'medium'}
+                              for i in range(files)],
+            'files_manifest': {f'smali/a/C{i}.smali': {'digest': f'{i:064x}', 'indicators': {}}
+                               for i in range(files)},
+            'coverage': {'complete': True}
+        }
+    }
+
+def make_events(session_store=None):
+    socketio = SocketIO(Flask(__name__))
+    events = SocketEvents(socketio, None, None, None, session_store)
+    emitted = []
+    socketio.emit = lambda event, data=None, *args, **kwargs: emitted.append((event, data))
+    return events, emitted
+
+def test_compact_results_leave_out_files_manifest():
+    events, _ = make_events()
+    compact = events.build_compact_results(full_results())
+    assert 'files_manifest' not in compact['obfuscation']
+    assert compact['obfuscation']['total_snippets'] == 50
+
+def test_completed_analysis_stores_manifest_but_does_not_send_it(tmp_path):
+    session_store = SessionStore(str(tmp_path / 'sessions.db'))
+    events, emitted = make_events(session_store)
+    events.engine = FakeEngine(full_results())
+
+    response = events.start_full_analysis('/srv/uploads/app.apk', 'app.apk', 'session-1')
+
+    assert response['status'] == 'success'
+    assert 'files_manifest' not in response['results']['obfuscation']
+    complete = [data for event, data in emitted if event == 'analysis_complete']
+    assert 'files_manifest' not in complete[0]['results']['obfuscation']
+    # The manifest still reaches the store, so later builds can be diffed against it
+    baseline = session_store.find_baseline('com.example.app')
+    assert len(baseline['files_manifest']) == 50
+
+def test_unstored_analysis_sends_no_server_paths_or_manifest():
+    events, emitted = make_events()
+    events.engine = FakeEngine(full_results())
+
+    response = events.start_full_analysis('/srv/uploads/app.apk', 'app.apk', 'session-1')
+
+    complete = [data for event, data in emitted if event == 'analysis_complete'][0]['results']
+    for results in (response['results'], complete):
+        assert not set(SocketEvents.SERVER_ONLY_FIELDS) & set(results)
+        assert 'files_manifest' not in results['obfuscation']
+        # With nothing stored to fetch them from later, the snippets themselves are sent
+        assert len(results['obfuscation']['code_snippets']) == 50
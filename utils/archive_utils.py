@@ -0,0 +1,188 @@
+import io
+import os
+import mmap
+import shutil
+import struct
+import zipfile
+import logging
+
+class PackArchive:
+    """Memory-mapped, read-only view of a packed decompiled APK tree
+
+    Decompiled trees are packed into an uncompressed (ZIP_STORED) archive, so every
+    member is stored contiguously and can be sliced straight out of the mapping
+    without extracting it to disk.
+    """
+
+    EXTENSION = '.zip'
+
+    # Offsets into the ZIP local file header (see zipfile.structFileHeader)
+    _LOCAL_HEADER_SIZE = 30
+    _LOCAL_HEADER_NAME_LENGTHS = struct.Struct('<HH')
+    _LOCAL_HEADER_NAME_LENGTHS_OFFSET = 26
+
+    def __init__(self, archive_path):
+        """
+        Open a packed archive
+
+        Args:
+            archive_path: Path to an archive created by pack_directory
+        """
+        self.archive_path = archive_path
+        self._file = open(archive_path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._index = self._build_index()
+        except Exception:
+            self.close()
+            raise
+
+    @staticmethod
+    def is_archive(path):
+        """
+        Check if a path points to a packed archive rather than a loose directory
+
+        Args:
+            path: Decompiled output path (directory or archive)
+
+        Returns:
+            bool: True if the path is a packed archive
+        """
+        return bool(path) and os.path.isfile(path) and zipfile.is_zipfile(path)
+
+    @classmethod
+    def pack_directory(cls, source_dir, archive_path=None, remove_source=True):
+        """
+        Pack a decompiled directory into a single uncompressed archive
+
+        Args:
+            source_dir: Directory produced by apktool
+            archive_path: Destination archive (defaults to <source_dir>.zip)
+            remove_source: Delete the loose tree once the archive is written
+
+        Returns:
+            str: Path to the written archive
+        """
+        source_dir = source_dir.rstrip('/\\')
+        archive_path = archive_path or source_dir + cls.EXTENSION
+        temp_path = archive_path + '.tmp'
+
+        file_count = 0
+        try:
+            with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+                for root, dirs, files in os.walk(source_dir):
+                    dirs.sort()
+                    for file in sorted(files):
+                        full_path = os.path.join(root, file)
+                        arcname = os.path.relpath(full_path, source_dir).replace(os.sep, '/')
+                        zf.write(full_path, arcname)
+                        file_count += 1
+        except BaseException:
+            # Leave no half-written archive behind (e.g. when the filesystem filled up)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # Promote the finished archive in one step so readers never see a partial file
+        os.replace(temp_path, archive_path)
+        logging.info(f"Packed {file_count} files from {source_dir} into {archive_path}")
+
+        if remove_source:
+            shutil.rmtree(source_dir, ignore_errors=True)
+
+        return archive_path
+
+    def _build_index(self):
+        """Map member names to (start, end) byte offsets of their data in the mapping"""
+        index = {}
+        with zipfile.ZipFile(self._file) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{self.archive_path}: member {info.filename} is compressed")
+
+                name_length, extra_length = self._LOCAL_HEADER_NAME_LENGTHS.unpack_from(
+                    self._mmap, info.header_offset + self._LOCAL_HEADER_NAME_LENGTHS_OFFSET
+                )
+                start = info.header_offset + self._LOCAL_HEADER_SIZE + name_length + extra_length
+                index[info.filename] = (start, start + info.file_size)
+        return index
+
+    @property
+    def buffer(self):
+        """The underlying read-only mapping of the whole archive"""
+        return self._mmap
+
+    def names(self):
+        """Get all member names (relative, '/'-separated paths)"""
+        return list(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def span(self, name):
+        """Get the (start, end) offsets of a member's bytes within buffer"""
+        return self._index[name]
+
+    def size(self, name):
+        """Get a member's size in bytes"""
+        start, end = self._index[name]
+        return end - start
+
+    def read(self, name):
+        """Read a member's bytes"""
+        start, end = self._index[name]
+        return self._mmap[start:end]
+
+    def read_text(self, name, encoding='utf-8'):
+        """Read a member decoded as text"""
+        return self.read(name).decode(encoding, errors='ignore')
+
+    def open(self, name):
+        """Open a member as a binary file object (e.g. for XML parsing)"""
+        return io.BytesIO(self.read(name))
+
+    def walk(self):
+        """
+        Walk the packed tree like os.walk
+
+        Yields:
+            tuple: (dirpath, dirnames, filenames) with '' as the root dirpath
+        """
+        tree = {'': ([], [])}
+        for name in self._index:
+            parent, _, filename = name.rpartition('/')
+            # Register any missing ancestors so intermediate directories show up
+            child = parent
+            links = []
+            while child not in tree:
+                tree[child] = ([], [])
+                grandparent, _, dirname = child.rpartition('/')
+                links.append((grandparent, dirname))
+                child = grandparent
+            for grandparent, dirname in links:
+                tree[grandparent][0].append(dirname)
+            tree[parent][1].append(filename)
+
+        pending = ['']
+        while pending:
+            dirpath = pending.pop()
+            dirnames, filenames = tree[dirpath]
+            dirnames.sort()
+            yield dirpath, dirnames, filenames
+            pending.extend(f"{dirpath}/{d}" if dirpath else d for d in reversed(dirnames))
+
+    def close(self):
+        """Release the mapping and file handle"""
+        mapping = getattr(self, '_mmap', None)
+        if mapping is not None:
+            mapping.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,108 @@
+import os
+import hashlib
+import logging
+
+class ContentStore:
+    """Content-addressed store for uploaded samples
+
+    Each sample is kept once, under the hex SHA-256 of its bytes
+    (<root>/<first two hex digits>/<sha256><ext>), so re-uploads of the same
+    file resolve to the same path.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root):
+        """
+        Initialize the content store
+
+        Args:
+            root: Directory holding the stored objects
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def is_valid_digest(sha256):
+        """Check if a string is a hex SHA-256 digest"""
+        return isinstance(sha256, str) and len(sha256) == 64 and all(c in '0123456789abcdef' for c in sha256)
+
+    @classmethod
+    def hash_file(cls, file_path):
+        """
+        Compute the SHA-256 of a file
+
+        Args:
+            file_path: File to hash
+
+        Returns:
+            str: Lowercase hex digest
+        """
+        digest = hashlib.sha256()
+        buffer = bytearray(cls.HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(file_path, 'rb', buffering=0) as f:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                digest.update(view[:read])
+        return digest.hexdigest()
+
+    def path_for(self, sha256, ext='.apk'):
+        """Get the path an object with this digest is (or would be) stored at"""
+        return os.path.join(self.root, sha256[:2], sha256 + ext)
+
+    def find(self, sha256, ext=None):
+        """
+        Look up a stored object
+
+        Args:
+            sha256: Hex digest of the object
+            ext: File extension the object was stored with (any extension if omitted)
+
+        Returns:
+            str: Path of the stored object, or None if it is not stored
+        """
+        if not self.is_valid_digest(sha256):
+            return None
+        if ext is not None:
+            path = self.path_for(sha256, ext)
+            return path if os.path.isfile(path) else None
+
+        try:
+            with os.scandir(os.path.dirname(self.path_for(sha256))) as entries:
+                for entry in entries:
+                    if entry.name.startswith(sha256 + '.') and entry.is_file():
+                        return entry.path
+        except FileNotFoundError:
+            pass
+        return None
+
+    def ingest(self, source_path, sha256=None, ext='.apk'):
+        """
+        Move a finished file into the store
+
+        The file is renamed into place, so it must be on the same filesystem as the
+        store. If an identical object is already stored the source is discarded.
+
+        Args:
+            source_path: Fully written file to take over
+            sha256: Digest of the file, computed if omitted
+            ext: File extension to store the object with
+
+        Returns:
+            tuple: (sha256, stored_path)
+        """
+        sha256 = sha256 or self.hash_file(source_path)
+        target_path = self.path_for(sha256, ext)
+
+        if os.path.isfile(target_path):
+            os.remove(source_path)
+            logging.info(f"Content store already holds {sha256}, discarded duplicate {source_path}")
+        else:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.replace(source_path, target_path)
+            logging.info(f"Stored {source_path} as {target_path}")
+
+        return sha256, target_path
@@ -0,0 +1,72 @@
+import os
+import logging
+
+class PackagePrefixTrie:
+    """Trie of Java package prefixes (e.g. 'androidx', 'com/google/gson')
+
+    Prefixes match on whole package segments, so 'com/google' matches
+    'com/google/gson/Gson' but not 'com/googlex/Foo'.
+    """
+
+    _END = None  # Key marking that a prefix ends at this node
+
+    def __init__(self, prefixes=()):
+        """
+        Initialize the trie
+
+        Args:
+            prefixes: Package prefixes in slash or dot form
+        """
+        self._root = {}
+        self._size = 0
+        for prefix in prefixes:
+            self.add(prefix)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Load prefixes from a text file with one prefix per line ('#' starts a comment)
+
+        Returns:
+            PackagePrefixTrie: Trie of the listed prefixes (empty if the file is missing)
+        """
+        if not path or not os.path.isfile(path):
+            logging.warning(f"Library prefix file {path} not found, library code will be scanned")
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            return cls(line.split('#', 1)[0].strip() for line in f)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, prefix):
+        """Add a package prefix ('com.google.gson' or 'com/google/gson'); empty prefixes are ignored"""
+        segments = [segment for segment in prefix.replace('.', '/').split('/') if segment]
+        if not segments:
+            return
+        node = self._root
+        for segment in segments:
+            node = node.setdefault(segment, {})
+        if self._END not in node:
+            node[self._END] = '/'.join(segments)
+            self._size += 1
+
+    def match(self, class_path):
+        """
+        Find the longest listed prefix of a class path
+
+        Args:
+            class_path: Slash-separated class path, e.g. 'androidx/core/app/ActivityCompat'
+
+        Returns:
+            str: Matching prefix, or None if the class is not under a listed package
+        """
+        node = self._root
+        matched = None
+        # The last segment is the class (file) name, never a package
+        for segment in class_path.split('/')[:-1]:
+            node = node.get(segment)
+            if node is None:
+                break
+            matched = node.get(self._END, matched)
+        return matched
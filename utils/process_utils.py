@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import subprocess
+from collections import deque
+
+class ProcessResult:
+    """Outcome and resource usage of a process started by run_process"""
+
+    def __init__(self, returncode, stdout_tail, stderr_tail, timed_out=False, cancelled=False,
+                 wall_seconds=0.0, cpu_user_seconds=None, cpu_system_seconds=None, max_rss_mb=None,
+                 dropped_lines=0):
+        self.returncode = returncode
+        self.stdout_tail = stdout_tail
+        self.stderr_tail = stderr_tail
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+        self.wall_seconds = wall_seconds
+        self.cpu_user_seconds = cpu_user_seconds
+        self.cpu_system_seconds = cpu_system_seconds
+        self.max_rss_mb = max_rss_mb
+        self.dropped_lines = dropped_lines
+
+    @property
+    def stdout(self):
+        """Last lines of standard output"""
+        return '\n'.join(self.stdout_tail)
+
+    @property
+    def stderr(self):
+        """Last lines of standard error"""
+        return '\n'.join(self.stderr_tail)
+
+    def usage(self):
+        """Get the resource usage as a JSON-serializable dict"""
+        return {
+            'returncode': self.returncode,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_user_seconds': self.cpu_user_seconds,
+            'cpu_system_seconds': self.cpu_system_seconds,
+            'max_rss_mb': self.max_rss_mb,
+            'timed_out': self.timed_out,
+            'cancelled': self.cancelled
+        }
+
+def run_process(command, timeout=None, cancel_event=None, on_stdout_line=None, tail_lines=200, poll_interval=0.1):
+    """
+    Run a process, draining stdout and stderr concurrently into bounded buffers
+
+    Both pipes are read by their own thread, so a child that writes a lot to one
+    stream can never block on a full pipe while we wait on the other. Only the last
+    tail_lines of each stream are kept. The child runs in its own process group so a
+    timeout or cancellation kills it together with everything it spawned.
+
+    Args:
+        command: Command list
+        timeout: Wall-clock limit in seconds (None for no limit)
+        cancel_event: threading.Event that kills the process when set (optional)
+        on_stdout_line: Called with each stripped, non-empty stdout line (optional)
+        tail_lines: Lines kept per stream
+        poll_interval: Seconds between timeout/cancellation checks
+
+    Returns:
+        ProcessResult: Exit status, output tails and resource usage
+    """
+    popen_kwargs = {}
+    if os.name == 'nt':
+        popen_kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        popen_kwargs['start_new_session'] = True
+
+    start = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               errors='replace', **popen_kwargs)
+
+    stdout_tail = deque(maxlen=tail_lines)
+    stderr_tail = deque(maxlen=tail_lines)
+    line_counts = [0, 0]
+    readers = [
+        threading.Thread(target=_drain, args=(process.stdout, stdout_tail, line_counts, 0, on_stdout_line), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, stderr_tail, line_counts, 1, None), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    # Reap the child in its own thread so we can keep checking the deadline and cancel flag
+    exit_info = {}
+    exited = threading.Event()
+    waiter = threading.Thread(target=_reap, args=(process, exit_info, exited), daemon=True)
+    waiter.start()
+
+    timed_out = cancelled = False
+    while not exited.wait(poll_interval):
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = True
+        elif timeout is not None and time.monotonic() - start > timeout:
+            timed_out = True
+        else:
+            continue
+        reason = "cancelled" if cancelled else f"timed out after {timeout}s"
+        logging.warning(f"Process {process.pid} ({os.path.basename(str(command[0]))}) {reason}, "
+                        f"killing its process tree")
+        kill_process_tree(process)
+        exited.wait()
+        break
+
+    waiter.join()
+    for reader in readers:
+        reader.join(timeout=5)
+    if any(reader.is_alive() for reader in readers):
+        # A grandchild inherited the pipes and outlived the child; take the whole group down
+        kill_process_tree(process)
+        for reader in readers:
+            reader.join()
+
+    rusage = exit_info.get('rusage')
+    max_rss_mb = None
+    if rusage is not None:
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        rss_bytes = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+        max_rss_mb = round(rss_bytes / (1024 * 1024), 1)
+
+    return ProcessResult(
+        exit_info['returncode'], list(stdout_tail), list(stderr_tail),
+        timed_out=timed_out, cancelled=cancelled,
+        wall_seconds=time.monotonic() - start,
+        cpu_user_seconds=round(rusage.ru_utime, 3) if rusage is not None else None,
+        cpu_system_seconds=round(rusage.ru_stime, 3) if rusage is not None else None,
+        max_rss_mb=max_rss_mb,
+        dropped_lines=max(0, line_counts[0] - len(stdout_tail)) + max(0, line_counts[1] - len(stderr_tail))
+    )
+
+def kill_process_tree(process):
+    """Kill a process started by run_process together with its descendants"""
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError) as e:
+        logging.debug(f"Could not kill process group {process.pid}: {e}")
+
+def _drain(stream, tail, line_counts, index, on_line):
+    """Read a pipe to EOF, keeping only its last lines"""
+    with stream:
+        for line in stream:
+            line = line.rstrip()
+            line_counts[index] += 1
+            tail.append(line)
+            if on_line and line:
+                try:
+                    on_line(line)
+                except Exception:
+                    logging.exception("Output line callback failed")
+
+def _reap(process, exit_info, exited):
+    """Wait for the child to exit, collecting its resource usage where wait4 is available"""
+    try:
+        if hasattr(os, 'wait4'):
+            try:
+                _, status, rusage = os.wait4(process.pid, 0)
+                # Popen did not reap the child itself, so record the status for it
+                process.returncode = os.waitstatus_to_exitcode(status)
+                exit_info['rusage'] = rusage
+            except ChildProcessError:
+                process.wait()
+        else:
+            process.wait()
+        exit_info['returncode'] = process.returncode
+    finally:
+        exited.set()
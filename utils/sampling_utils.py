@@ -0,0 +1,98 @@
+import random
+import numpy as np
+
+def stratified_order(items, stratum_of, seed=0):
+    """
+    Order items randomly so that every prefix is a proportional stratified sample
+
+    One random item of every stratum comes first, so small strata (a single
+    obfuscated package among large libraries) are never missed. The rest of each
+    stratum is shuffled and its i-th item gets the position (i + u) / size for a
+    random offset u; sorting by position interleaves the strata in proportion to
+    their sizes, so stopping after any number of items leaves every stratum
+    represented by its share.
+
+    Args:
+        items: Items to order
+        stratum_of: Function mapping an item to its (hashable) stratum key
+        seed: Random seed, so the same input is always sampled the same way
+
+    Returns:
+        tuple: (ordered items, number of strata)
+    """
+    rng = random.Random(seed)
+    strata = {}
+    for item in items:
+        strata.setdefault(stratum_of(item), []).append(item)
+
+    keyed = []
+    for key in sorted(strata, key=str):
+        members = strata[key]
+        rng.shuffle(members)
+        offset = rng.random()
+        # Positions below 0 put each stratum's first item ahead of all proportional picks
+        keyed.append((rng.random() - 1, members[0]))
+        keyed.extend(((index + offset) / len(members), item) for index, item in enumerate(members[1:]))
+    keyed.sort(key=lambda entry: entry[0])
+    return [item for _, item in keyed], len(strata)
+
+class BootstrapEstimate:
+    """Bootstrap confidence interval of a statistic of population totals, estimated from a sample
+
+    Rows are per-item count vectors of a random sample. The statistic is applied to
+    the column totals scaled up to the population size, both for the sample itself
+    (the point estimate) and for Poisson bootstrap replicates of it (the interval).
+    """
+
+    CHUNK_ROWS = 4096  # Rows weighted per step, bounding memory to samples x CHUNK_ROWS
+
+    def __init__(self, population_size, statistic, samples=200, level=0.95, seed=0):
+        """
+        Initialize the estimator
+
+        Args:
+            population_size: Number of items the sample is drawn from
+            statistic: Function mapping a totals vector (numpy array) to a number
+            samples: Bootstrap replicates per estimate
+            level: Confidence level of the interval
+            seed: Random seed of the bootstrap
+        """
+        self.population_size = population_size
+        self.statistic = statistic
+        self.samples = samples
+        self.level = level
+        self._rng = np.random.default_rng(seed)
+        self._rows = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row):
+        """Add the count vector of one sampled item"""
+        self._rows.append(row)
+
+    def estimate(self):
+        """
+        Estimate the statistic with a confidence interval
+
+        Returns:
+            tuple: (point estimate, interval low, interval high)
+        """
+        counts = np.asarray(self._rows, dtype=np.float64)
+        rows = len(counts)
+        point = self.statistic(counts.sum(axis=0) * (self.population_size / rows))
+
+        # Poisson(1) weights approximate resampling with replacement and can be drawn chunk by chunk
+        totals = np.zeros((self.samples, counts.shape[1]))
+        weight_sums = np.zeros(self.samples)
+        for start in range(0, rows, self.CHUNK_ROWS):
+            chunk = counts[start:start + self.CHUNK_ROWS]
+            weights = self._rng.poisson(1.0, size=(self.samples, len(chunk))).astype(np.float64)
+            totals += weights @ chunk
+            weight_sums += weights.sum(axis=1)
+
+        scale = self.population_size / np.maximum(weight_sums, 1.0)
+        replicates = np.array([self.statistic(total) for total in totals * scale[:, None]])
+        tail = (1 - self.level) / 2 * 100
+        low, high = np.percentile(replicates, [tail, 100 - tail])
+        return point, float(low), float(high)
@@ -0,0 +1,168 @@
+import os
+import shutil
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: reservations are only serialized within one process
+    fcntl = None
+
+class ScratchSpace:
+    """RAM-backed (tmpfs) scratch workspace for decoding and scanning APKs
+
+    Jobs reserve an estimated amount of space before decoding. A reservation is
+    refused (and the caller falls back to disk) when the filesystem's free space
+    minus the reservations of other running jobs would drop below a safety margin.
+    Reservations are recorded as files in the scratch root, under a file lock, so
+    every process sharing the root (e.g. the batch CLI's pool workers) sees them;
+    those of processes that died without releasing are ignored and removed.
+    """
+
+    RESERVATIONS_DIR = '.reservations'  # One file per reserved job: "<pid> <bytes>"
+    LOCK_FILE = '.lock'
+
+    def __init__(self, root, size_factor=6, min_free_bytes=256 * 1024 * 1024):
+        """
+        Initialize the scratch space
+
+        Args:
+            root: Scratch directory, ideally on tmpfs (e.g. /dev/shm/apk_analyzer)
+            size_factor: Expected decoded size as a multiple of the APK size
+            min_free_bytes: Free space that must remain after a reservation
+        """
+        self.root = os.path.abspath(root)
+        self.size_factor = size_factor
+        self.min_free_bytes = min_free_bytes
+        self._reserved = {}  # Job directories reserved by this process -> bytes
+        self._lock = threading.Lock()
+        self._reservations_dir = os.path.join(self.root, self.RESERVATIONS_DIR)
+        os.makedirs(self._reservations_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create the scratch space configured in Config
+
+        Returns:
+            ScratchSpace: Scratch space, or None if disabled or unavailable
+        """
+        root = getattr(config, 'SCRATCH_FOLDER', None)
+        if not root or not os.path.isdir(os.path.dirname(os.path.abspath(root))):
+            return None
+        try:
+            return cls(root, config.SCRATCH_SIZE_FACTOR, config.SCRATCH_MIN_FREE_MB * 1024 * 1024)
+        except OSError as e:
+            logging.warning(f"Scratch space {root} unavailable, decoding on disk: {e}")
+            return None
+
+    def reserve(self, apk_size_bytes, name):
+        """
+        Reserve a job directory for an APK of the given size
+
+        Args:
+            apk_size_bytes: Size of the APK to be decoded
+            name: Unique name of the job directory
+
+        Returns:
+            str: Job directory path (not yet created), or None if there is not enough space
+        """
+        needed = int(apk_size_bytes * self.size_factor)
+        with self._lock, self._file_lock():
+            free = shutil.disk_usage(self.root).free - self._reserved_bytes()
+            if free - needed < self.min_free_bytes:
+                logging.info(f"Scratch space too small for {name} (needs ~{needed >> 20}MB, "
+                             f"{max(free, 0) >> 20}MB available), decoding on disk")
+                return None
+            with open(os.path.join(self._reservations_dir, name), 'w') as f:
+                f.write(f"{os.getpid()} {needed}")
+            job_dir = os.path.join(self.root, name)
+            self._reserved[job_dir] = needed
+        return job_dir
+
+    def contains(self, path):
+        """Check if a path lies inside the scratch space"""
+        return bool(path) and os.path.abspath(path).startswith(self.root + os.sep)
+
+    def release(self, job_dir):
+        """
+        Delete a job directory (and its packed archive, if any) and free its reservation
+
+        Args:
+            job_dir: Directory returned by reserve
+        """
+        shutil.rmtree(job_dir, ignore_errors=True)
+        for leftover in (job_dir + '.zip', job_dir + '.zip.tmp'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        with self._lock:
+            self._reserved.pop(job_dir, None)
+            self._remove_reservation(os.path.basename(job_dir))
+
+    def job_dir_of(self, path):
+        """Get the reserved job directory a scratch path (directory or its archive) belongs to"""
+        path = os.path.abspath(path)
+        with self._lock:
+            for job_dir in self._reserved:
+                if path == job_dir or path == job_dir + '.zip' or path.startswith(job_dir + os.sep):
+                    return job_dir
+        return None
+
+    def _file_lock(self):
+        """Lock serializing reservations across every process sharing the scratch root"""
+        return _FileLock(os.path.join(self.root, self.LOCK_FILE))
+
+    def _reserved_bytes(self):
+        """Sum the live reservations of all processes, removing those of processes that are gone"""
+        total = 0
+        for entry in os.scandir(self._reservations_dir):
+            try:
+                with open(entry.path) as f:
+                    pid, size = (int(value) for value in f.read().split())
+            except (OSError, ValueError):
+                continue
+            if not self._is_alive(pid):
+                logging.info(f"Dropping scratch reservation {entry.name} of exited process {pid}")
+                self._remove_reservation(entry.name)
+                continue
+            total += size
+        return total
+
+    def _remove_reservation(self, name):
+        """Delete a reservation file if it exists"""
+        try:
+            os.remove(os.path.join(self._reservations_dir, name))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _is_alive(pid):
+        """Check if a process still exists (always assumed on platforms without signal 0)"""
+        if pid == os.getpid() or os.name == 'nt':
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass  # Exists, but belongs to another user
+        return True
+
+class _FileLock:
+    """Exclusive advisory lock on a file, held for the duration of a with block"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
@@ -7,11 +7,19 @@ from flask import jsonify, request, render_template
 # You already pass socket_events_handler instance in __init__, so no direct import needed here if handled this way.
 import time # [ADDED]
 from web.socket_events import SocketEvents # [ADDED] Ensure this import is correct based on your file structure
+from utils.archive_utils import PackArchive
+from models.session_store import SessionStore
+from models.analytics_store import AnalyticsStore
+from utils.content_store import ContentStore
+from services.upload_service import UploadService
+from services.bundle_service import BundleService
+from services.rescoring_service import RescoringService
 
 class Routes:
     """Flask routes handler with summary and detail page support"""
 
-    def __init__(self, app, config, apk_service, permission_service, obfuscation_service, file_utils, socketio):
+    def __init__(self, app, config, apk_service, permission_service, obfuscation_service, file_utils, socketio,
+                 session_store=None, upload_service=None, analytics_store=None):
         self.app = app
         self.config = config
         self.apk_service = apk_service
@@ -20,11 +28,25 @@ class Routes:
         self.file_utils = file_utils
         self.socketio = socketio
 
-        # Store analysis results for session (consider using a more robust session management if app scales)
-        self.analysis_results = {}
+        # Persistent, bounded-memory store for analysis results of each session
+        self.session_store = session_store or SessionStore(
+            config.SESSION_DB_PATH, config.SESSION_TTL_SECONDS, config.SESSION_CACHE_SIZE
+        )
+
+        # Chunked, resumable uploads that land in the content-addressed store
+        self.upload_service = upload_service or UploadService(
+            config.UPLOAD_STAGING_FOLDER, ContentStore(config.CONTENT_STORE_FOLDER), config.ALLOWED_EXTENSIONS,
+            config.UPLOAD_CHUNK_SIZE, config.MAX_UPLOAD_SIZE, config.UPLOAD_STALE_SECONDS
+        )
+
+        # Fleet-wide record of completed analyses (None if disabled in the config)
+        self.analytics_store = analytics_store if analytics_store is not None else AnalyticsStore.from_config(config)
 
         # [MODIFIED] Initialize SocketEvents handler here so its methods can be called
-        self.socket_events_handler = SocketEvents(self.socketio, self.apk_service, self.permission_service, self.obfuscation_service)
+        self.socket_events_handler = SocketEvents(self.socketio, self.apk_service, self.permission_service,
+                                                  self.obfuscation_service, self.session_store,
+                                                  BundleService(self.upload_service.content_store),
+                                                  config.ANALYSIS_REFINE_PARTIAL, self.analytics_store)
 
         self._register_routes()
         self._register_error_handlers()
@@ -57,26 +79,11 @@ class Routes:
                 filepath = result_filepath_or_error # If success, this is the filepath
                 original_filename = file.filename # Use original filename for analysis results
 
-                # [MODIFIED] Initiate full analysis via SocketEvents handler
-                # This call will now block until analysis is complete or an error occurs.
-                # All results and status updates are emitted via SocketIO from start_full_analysis.
-                analysis_response = self.socket_events_handler.start_full_analysis(filepath, original_filename)
-
-                # [MODIFIED] Check the status from analysis_response returned by start_full_analysis
-                if analysis_response['status'] == 'success':
-                    # If analysis completed successfully, return the complete_data as well
-                    # Frontend can use this if WebSocket missed something or for initial display
-                    return jsonify({
-                        "success": True,
-                        "message": "File uploaded and analysis completed.",
-                        "complete_data": analysis_response['results'] # Contains all analysis data including size and runtime
-                    }), 200
-                else:
-                    # If analysis failed at any stage, return error message
-                    return jsonify({
-                        "success": False,
-                        "error": analysis_response['message']
-                    }), 500
+                # Keep the sample content-addressed so re-submissions can be recognized by hash
+                ext = os.path.splitext(filepath)[1].lower()
+                sha256, filepath = self.upload_service.content_store.ingest(filepath, ext=ext)
+
+                return self._run_analysis(filepath, original_filename, sha256)
 
             except Exception as e:
                 logging.exception("Error during upload or analysis")
@@ -89,15 +96,105 @@ class Routes:
         def _allowed_file(self, filename):
             return '.' in filename and filename.rsplit('.', 1)[1].lower() in self.config.ALLOWED_EXTENSIONS
 
+        @self.app.route('/api/uploads', methods=['POST'])
+        def create_upload():
+            """Start a chunked upload: JSON body with filename, size and optional sha256"""
+            body = request.get_json(silent=True) or {}
+            success, result = self.upload_service.create_upload(body.get('filename'), body.get('size'),
+                                                                body.get('sha256'))
+            if not success:
+                return jsonify({"error": result}), 400
+            return jsonify(result), 201
+
+        @self.app.route('/api/uploads/<upload_id>', methods=['GET'])
+        def get_upload_status(upload_id):
+            """Get the received and missing chunks of an upload, for resuming"""
+            success, result = self.upload_service.get_status(upload_id)
+            if not success:
+                return jsonify({"error": result}), 404
+            return jsonify(result)
+
+        @self.app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+        def put_upload_chunk(upload_id, index):
+            """Store one chunk (raw request body), verified against the X-Chunk-SHA256 header if sent"""
+            success, result = self.upload_service.put_chunk(upload_id, index, request.get_data(cache=False),
+                                                            request.headers.get('X-Chunk-SHA256'))
+            if not success:
+                status = 404 if result == "Upload not found" else 400
+                return jsonify({"error": result}), status
+            return jsonify(result)
+
+        @self.app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+        def complete_upload(upload_id):
+            """Assemble a fully received upload into the content store and analyze it"""
+            try:
+                success, result = self.upload_service.complete_upload(upload_id)
+                if not success:
+                    status = 404 if result == "Upload not found" else 409
+                    return jsonify({"error": result}), status
+
+                return self._run_analysis(result['path'], result['filename'], result['sha256'])
+            except Exception as e:
+                logging.exception("Error during chunked upload completion or analysis")
+                return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+        @self.app.route('/api/lookup/<sha256>')
+        def lookup_sample(sha256):
+            """
+            Look up an earlier analysis of an APK by its SHA-256 (GET or HEAD)
+
+            Returns the stored compact results on a hit, so clients can skip the upload.
+            On a miss, 'stored' tells whether the server still holds the sample itself
+            and can re-analyze it via /api/samples/<sha256>/analyze without a transfer.
+            """
+            sha256 = sha256.lower()
+            if not ContentStore.is_valid_digest(sha256):
+                return jsonify({"error": "Invalid SHA-256 digest"}), 400
+
+            session_id = self.session_store.find_by_sha256(sha256)
+            data = self.session_store.get(session_id) if session_id else None
+            if not SessionStore.is_reusable(data):
+                # Partial, incomplete and triage (sampled) results are not reused; the sample gets a full analysis
+                stored = self.upload_service.content_store.find(sha256) is not None
+                return jsonify({"found": False, "stored": stored}), 404
+
+            return jsonify({
+                "found": True,
+                "session_id": session_id,
+                "complete_data": self.socket_events_handler.build_compact_results(
+                    data, self.session_store.get_snippets(session_id, 0, SocketEvents.SUMMARY_SNIPPET_HEADERS))
+            })
+
+        @self.app.route('/api/samples/<sha256>/analyze', methods=['POST'])
+        def analyze_stored_sample(sha256):
+            """Analyze a sample already in the content store: JSON body with the original filename"""
+            try:
+                sha256 = sha256.lower()
+                filepath = self.upload_service.content_store.find(sha256)
+                if filepath is None:
+                    return jsonify({"error": "Sample not found"}), 404
+
+                body = request.get_json(silent=True) or {}
+                filename = body.get('filename') or os.path.basename(filepath)
+                return self._run_analysis(filepath, filename, sha256)
+            except Exception as e:
+                logging.exception("Error during stored sample analysis")
+                return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+        @self.app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+        def cancel_job(job_id):
+            """Cancel a running analysis (job id from the analysis_started event)"""
+            if not self.socket_events_handler.cancel_job(job_id):
+                return jsonify({"error": "Job not found or already finished"}), 404
+            return jsonify({"job_id": job_id, "status": "cancelling"}), 202
+
         @self.app.route('/api/summary/<session_id>')
         def get_summary(session_id):
             """Get summary data for a session"""
-            # Note: This part needs actual session management to work correctly.
-            # Currently, analysis_results is a simple dict, not persistent.
-            if session_id not in self.analysis_results:
+            data = self._load_session(session_id)
+            if data is None:
                 return jsonify({"error": "Session not found"}), 404
 
-            data = self.analysis_results[session_id]
             summary = self._generate_summary_data(
                 data['apk_info'],
                 data['permissions'],
@@ -110,12 +207,10 @@ class Routes:
         @self.app.route('/api/details/<session_id>')
         def get_details(session_id):
             """Get detailed analysis data for a session"""
-            # Note: This part needs actual session management to work correctly.
-            if session_id not in self.analysis_results:
+            data = self._load_session(session_id)
+            if data is None:
                 return jsonify({"error": "Session not found"}), 404
 
-            data = self.analysis_results[session_id]
-
             # Get additional detailed information
             detailed_data = {
                 'apk_info': data['apk_info'],
@@ -128,24 +223,65 @@ class Routes:
 
             return jsonify(detailed_data)
 
+        @self.app.route('/api/analytics')
+        def query_analytics():
+            """
+            Query the recorded analyses of the whole fleet
+
+            Query arguments (all optional, combined with AND):
+              - permission: requested permission, repeated or comma separated ('READ_SMS'
+                is short for 'android.permission.READ_SMS')
+              - where: condition such as 'confidence>80' or 'count.string_encryption>=3', repeatable
+              - columns: comma separated columns to return ('permissions' for the permission list)
+              - limit: most rows returned
+            """
+            if self.analytics_store is None:
+                return jsonify({"error": "Analytics are disabled"}), 404
+            limit = min(max(request.args.get('limit', 100, type=int), 0), self.config.ANALYTICS_QUERY_MAX_LIMIT)
+            try:
+                result = self.analytics_store.query(self._get_list_arg('permission'), request.args.getlist('where'),
+                                                    self._get_list_arg('columns'), limit)
+            except ValueError as e:
+                return jsonify({"error": str(e), "columns": self.analytics_store.columns()}), 400
+            return jsonify(result)
+
         @self.app.route('/api/obfuscation/<session_id>/snippets')
         def get_obfuscation_snippets(session_id):
-            """Get paginated obfuscation code snippets"""
-            # Note: This part needs actual session management to work correctly.
-            if session_id not in self.analysis_results:
+            """
+            Get obfuscation code snippets
+
+            Two pagination modes are supported:
+              - page/per_page: offset pages over all snippets (legacy)
+              - cursor/limit: keyset pages, optionally filtered by severity, pattern_type
+                and file_prefix, with per-facet counts on the first page
+            """
+            data = self.session_store.get(session_id)
+            if data is None:
                 return jsonify({"error": "Session not found"}), 404
 
+            # Optional wider context, re-read from the decoded tree (or its archive) on demand
+            context = request.args.get('context', type=int)
+
+            filters = {
+                'severity': self._get_list_arg('severity'),
+                'pattern_type': self._get_list_arg('pattern_type'),
+                'file_prefix': request.args.get('file_prefix') or None
+            }
+            if 'cursor' in request.args or any(filters.values()):
+                return self._query_snippets(session_id, data, filters, context)
+
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 10, type=int)
 
-            obfuscation_data = self.analysis_results[session_id]['obfuscation']
-            code_snippets = obfuscation_data.get('code_snippets', [])
-
             # Calculate pagination
-            total_snippets = len(code_snippets)
+            total_snippets = data['obfuscation'].get('total_snippets', 0)
             start_idx = (page - 1) * per_page
             end_idx = start_idx + per_page
-            page_snippets = code_snippets[start_idx:end_idx]
+            page_snippets = self.session_store.get_snippets(session_id, start_idx, per_page)
+
+            if context:
+                page_snippets = self._expand_snippet_context(data['output_dir'], page_snippets, context,
+                                                             data.get('split_output_dirs'))
 
             return jsonify({
                 'snippets': page_snippets,
@@ -159,6 +295,142 @@ class Routes:
                 }
             })
 
+    def _run_analysis(self, filepath, original_filename, sha256=None):
+        """
+        Run the full analysis of a received APK and build the upload response
+
+        Args:
+            filepath: Path of the received APK
+            original_filename: Original name of the uploaded file
+            sha256: SHA-256 of the APK (optional)
+
+        Returns:
+            tuple: (JSON response, HTTP status)
+        """
+        # [MODIFIED] Initiate full analysis via SocketEvents handler
+        # This call will now block until analysis is complete (or its time budget is spent) or an error occurs.
+        # All results and status updates are emitted via SocketIO from start_full_analysis.
+        scan_mode = self._get_scan_mode()
+        analysis_response = self.socket_events_handler.start_full_analysis(
+            filepath, original_filename, self._generate_session_id(), sha256, self._get_time_budget(),
+            scan_mode == 'triage', scan_mode == 'diff'
+        )
+
+        # [MODIFIED] Check the status from analysis_response returned by start_full_analysis
+        if analysis_response['status'] == 'cancelled':
+            return jsonify({
+                "success": False,
+                "cancelled": True,
+                "error": analysis_response['message']
+            }), 409
+        if analysis_response['status'] == 'success':
+            # If analysis completed successfully, return the complete_data as well
+            # Frontend can use this if WebSocket missed something or for initial display
+            return jsonify({
+                "success": True,
+                "message": "File uploaded and analysis completed.",
+                "complete_data": analysis_response['results'] # Contains all analysis data including size and runtime
+            }), 200
+        else:
+            # If analysis failed at any stage, return error message
+            return jsonify({
+                "success": False,
+                "error": analysis_response['message']
+            }), 500
+
+    def _get_time_budget(self):
+        """
+        Read the optional time budget of an analysis request
+
+        Accepted as a 'time_budget' form field, query parameter or JSON body field (seconds).
+        A value of 0 disables the budget; missing or invalid values use the configured default.
+
+        Returns:
+            float: Time budget in seconds, or None for no budget
+        """
+        body = request.get_json(silent=True) or {}
+        value = request.values.get('time_budget', body.get('time_budget'))
+        try:
+            budget = float(value)
+        except (TypeError, ValueError):
+            return self.config.ANALYSIS_TIME_BUDGET_SECONDS
+        return budget if budget > 0 else None
+
+    def _get_scan_mode(self):
+        """
+        Read the scan mode of an analysis request ('full', 'triage' or 'diff')
+
+        Accepted as a 'mode' form field, query parameter or JSON body field; unknown
+        values use the configured default.
+
+        Returns:
+            str: 'full', 'triage' or 'diff'
+        """
+        body = request.get_json(silent=True) or {}
+        mode = str(request.values.get('mode', body.get('mode', ''))).lower()
+        return mode if mode in ('full', 'triage', 'diff') else self.config.OBFUSCATION_SCAN_MODE
+
+    def _query_snippets(self, session_id, data, filters, context=None):
+        """
+        Answer a filtered, cursor-paginated snippet query
+
+        Args:
+            session_id: Session identifier
+            data: Stored session data
+            filters: Dict with severity, pattern_type and file_prefix filters
+            context: Optional number of context lines to re-read around each match
+
+        Returns:
+            Response: JSON with snippets, next_cursor and (on the first page) facets
+        """
+        cursor = request.args.get('cursor', type=int)
+        limit = min(max(request.args.get('limit', 50, type=int), 1), self.config.SNIPPET_QUERY_MAX_LIMIT)
+
+        snippets, next_cursor = self.session_store.query_snippets(session_id, after=cursor, limit=limit, **filters)
+        if context:
+            snippets = self._expand_snippet_context(data['output_dir'], snippets, context,
+                                                    data.get('split_output_dirs'))
+
+        response = {
+            'snippets': snippets,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+            'filters': filters
+        }
+        # Facet counts only depend on the filters, so they are sent once per query rather than per page
+        if cursor is None or request.args.get('facets', type=int):
+            response['facets'] = self.session_store.snippet_facets(session_id, **filters)
+
+        return jsonify(response)
+
+    def _get_list_arg(self, name):
+        """Read a query argument given repeatedly and/or comma separated as a list"""
+        values = []
+        for raw in request.args.getlist(name):
+            values.extend(value.strip() for value in raw.split(',') if value.strip())
+        return values or None
+
+    def _load_session(self, session_id):
+        """
+        Load a stored session, deriving APK info and security score on first access
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            dict: Session data, or None if the session is unknown or expired
+        """
+        data = self.session_store.get(session_id)
+        if data is None or 'security_score' in data:
+            return data
+
+        apk_info = self._extract_apk_info(data['apk_path'], data['output_dir'])
+        # Stored uploads are named by content hash, so report the name the file was uploaded with
+        apk_info['name'] = data.get('apk_name') or apk_info['name']
+        security_score = self._calculate_security_score(data['permissions'], data['obfuscation'], apk_info)
+        self.session_store.update(session_id, apk_info=apk_info, security_score=security_score)
+        return {**data, 'apk_info': apk_info, 'security_score': security_score}
+
     def _extract_apk_info(self, apk_path, output_dir):
         """Extract basic APK information"""
         import os
@@ -188,7 +460,11 @@ class Routes:
         target_sdk = "Unknown"
 
         try:
-            tree = ET.parse(manifest_path)
+            if PackArchive.is_archive(output_dir):
+                with PackArchive(output_dir) as archive:
+                    tree = ET.parse(archive.open('AndroidManifest.xml'))
+            else:
+                tree = ET.parse(manifest_path)
             root = tree.getroot()
 
             package_name = root.get('package', 'Unknown')
@@ -218,42 +494,10 @@ class Routes:
 
     def _calculate_security_score(self, permissions, obfuscation, apk_info):
         """Calculate a security score based on analysis results"""
-        score = 100  # Start with perfect score
-
-        # Deduct points for dangerous permissions
         dangerous_count = sum(1 for p in permissions if p.get('protection_level') == 'dangerous')
-        score -= dangerous_count * 5  # 5 points per dangerous permission
-
-        # Deduct points for obfuscation
-        if obfuscation.get('is_obfuscated', False):
-            confidence = obfuscation.get('confidence', 0)
-            score -= (confidence / 100) * 20  # Up to 20 points for obfuscation based on confidence
-
-        # Deduct points for old target SDK
-        try:
-            target_sdk = int(apk_info.get('target_sdk_version', '30'))
-            if target_sdk < 28:  # Android 9 (API 28)
-                score -= 15
-            elif target_sdk < 30:  # Android 11 (API 30)
-                score -= 10
-        except (ValueError, TypeError):
-            score -= 5  # Unknown SDK version
-
-        # Ensure score is between 0 and 100
-        score = max(0, min(100, int(score)))
-
-        # Determine risk level
-        if score >= 80:
-            level = "Low"
-        elif score >= 60:
-            level = "Medium"
-        else:
-            level = "High"
-
-        return {
-            'score': score,
-            'level': level
-        }
+        return RescoringService.security_score(dangerous_count, obfuscation.get('is_obfuscated', False),
+                                               obfuscation.get('confidence', 0),
+                                               apk_info.get('target_sdk_version', '30'))
 
     def _generate_summary_data(self, apk_info, permissions, obfuscation, security_score):
         """Generate summary data for the summary page"""
@@ -277,7 +521,7 @@ class Routes:
 
         if obfuscation.get('is_obfuscated', False):
             confidence = obfuscation.get('confidence', 0)
-            snippets_count = len(obfuscation.get('code_snippets', []))
+            snippets_count = obfuscation.get('total_snippets', len(obfuscation.get('code_snippets', [])))
             key_findings.append({
                 'type': 'info',
                 'message': f"Code obfuscation detected ({confidence}% confidence, {snippets_count} code snippets found)"
@@ -310,6 +554,9 @@ class Routes:
     def _extract_manifest_details(self, output_dir):
         """Extract detailed manifest information"""
         try:
+            if PackArchive.is_archive(output_dir):
+                with PackArchive(output_dir) as archive:
+                    return {'content': archive.read_text('AndroidManifest.xml')}
             manifest_path = os.path.join(output_dir, 'AndroidManifest.xml')
             with open(manifest_path, 'r', encoding='utf-8') as f:
                 content = f.read()
@@ -320,27 +567,97 @@ class Routes:
 
     def _get_file_structure(self, output_dir):
         """Get APK file structure"""
-        structure = []
         try:
-            for root, dirs, files in os.walk(output_dir):
-                level = root.replace(output_dir, '').count(os.sep)
-                indent = ' ' * 2 * level
-                folder_name = os.path.basename(root)
-                if folder_name: # Only add folder if it's not the base output_dir itself on the first iteration
-                    structure.append(f"{indent}📁 {folder_name}/")
-
-                subindent = ' ' * 2 * (level + 1)
-                for file in files[:10]: # Limit files shown per directory for brevity
-                    structure.append(f"{subindent}📄 {file}")
-
-                if len(files) > 10:
-                    structure.append(f"{subindent}... and {len(files) - 10} more files")
+            if PackArchive.is_archive(output_dir):
+                # Walk the archive index instead of extracting the tree
+                with PackArchive(output_dir) as archive:
+                    root_name = os.path.splitext(os.path.basename(output_dir))[0]
+                    return self._format_file_structure(
+                        (dirpath.count('/') + 1 if dirpath else 0, os.path.basename(dirpath) or root_name, files)
+                        for dirpath, dirs, files in archive.walk()
+                    )
+            return self._format_file_structure(
+                (root.replace(output_dir, '').count(os.sep), os.path.basename(root), files)
+                for root, dirs, files in os.walk(output_dir)
+            )
         except Exception as e:
             logging.warning(f"Could not get file structure: {e}")
-            structure = ["Could not read file structure"]
+            return ["Could not read file structure"]
+
+    def _format_file_structure(self, entries):
+        """
+        Format walked directories as an indented tree listing
+
+        Args:
+            entries: Iterable of (level, folder_name, files) tuples in walk order
+
+        Returns:
+            list: Lines of the tree listing
+        """
+        structure = []
+        for level, folder_name, files in entries:
+            indent = ' ' * 2 * level
+            if folder_name: # Only add folder if it's not the base output_dir itself on the first iteration
+                structure.append(f"{indent}📁 {folder_name}/")
+
+            subindent = ' ' * 2 * (level + 1)
+            for file in files[:10]: # Limit files shown per directory for brevity
+                structure.append(f"{subindent}📄 {file}")
+
+            if len(files) > 10:
+                structure.append(f"{subindent}... and {len(files) - 10} more files")
 
         return structure
 
+    def _expand_snippet_context(self, output_dir, snippets, context, split_output_dirs=None):
+        """
+        Re-read snippet code with a wider context window from the decoded tree
+
+        Args:
+            output_dir: Decompiled output directory or packed archive
+            snippets: Snippet dictionaries to expand
+            context: Number of lines to include before and after the match
+            split_output_dirs: Split name -> output directory, for snippets from bundle splits (optional)
+
+        Returns:
+            list: Copies of the snippets with code_snippet and context bounds updated
+        """
+        split_output_dirs = split_output_dirs or {}
+        archives = {} # Packed archives opened so far, by path
+        expanded = []
+        try:
+            for snippet in snippets:
+                source_dir = split_output_dirs.get(snippet.get('split'), output_dir)
+                try:
+                    if source_dir not in archives:
+                        archives[source_dir] = PackArchive(source_dir) if PackArchive.is_archive(source_dir) else None
+                    archive = archives[source_dir]
+                    if archive:
+                        content = archive.read_text(snippet['file'])
+                    else:
+                        with open(os.path.join(source_dir, snippet['file']), 'r', encoding='utf-8', errors='ignore') as f:
+                            content = f.read()
+                except (KeyError, OSError) as e:
+                    logging.warning(f"Could not re-read snippet source {snippet.get('file')}: {e}")
+                    expanded.append(snippet)
+                    continue
+
+                lines = content.split('\n')
+                context_start = max(0, snippet['line_start'] - 1 - context)
+                context_end = min(len(lines), snippet['line_end'] + context)
+                expanded.append({
+                    **snippet,
+                    'code_snippet': '\n'.join(lines[context_start:context_end]),
+                    'context_start': context_start + 1,
+                    'context_end': context_end
+                })
+        finally:
+            for archive in archives.values():
+                if archive:
+                    archive.close()
+
+        return expanded
+
     def _generate_session_id(self):
         """Generate a unique session ID"""
         import uuid
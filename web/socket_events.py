@@ -2,15 +2,33 @@ from flask_socketio import emit
 import logging
 import time # [MODIFIED] Import the time module for measuring runtime
 import os   # [ADDED] Import os module for original_filename path operations, if needed
+import json
+import uuid
+import threading
+from services.analysis_engine import AnalysisEngine, SocketSink
+from services.job_registry import JobRegistry
 
 class SocketEvents:
     """Handle SocketIO events for real-time communication and orchestrate analysis"""
+    SUMMARY_SNIPPET_HEADERS = 20 # Snippet headers included in the compact analysis_complete payload
+    SERVER_ONLY_FIELDS = ('apk_path', 'output_dir', 'split_output_dirs') # Server-side paths never sent to clients
 
-    def __init__(self, socketio, apk_service, permission_service, obfuscation_service):
+    def __init__(self, socketio, apk_service, permission_service, obfuscation_service, session_store=None,
+                 bundle_service=None, refine_partial=True, analytics_store=None):
         self.socketio = socketio
         self.apk_service = apk_service
         self.permission_service = permission_service
         self.obfuscation_service = obfuscation_service
+        self.session_store = session_store
+        # Fleet-wide columnar record of every completed analysis (optional)
+        self.analytics_store = analytics_store
+        # Finish partial (time-budgeted) scans in the background and push an analysis_updated event
+        self.refine_partial = refine_partial
+        # The pipeline itself is Flask-independent; this class only adds storage and socket delivery
+        self.engine = AnalysisEngine(apk_service, permission_service, obfuscation_service, SocketSink(socketio),
+                                     bundle_service)
+        # Running analyses, keyed by session id, so they can be cancelled
+        self.jobs = JobRegistry()
 
         self._register_events()
 
@@ -34,6 +52,13 @@ class SocketEvents:
         def handle_ping():
             emit('pong', {'message': 'Server is alive'})
 
+        # Event handler for cancelling a running analysis: {'job_id': ...}
+        @self.socketio.on('cancel_job')
+        def handle_cancel_job(data):
+            job_id = (data or {}).get('job_id')
+            cancelled = self.cancel_job(job_id)
+            emit('job_cancel', {'job_id': job_id, 'status': 'cancelling' if cancelled else 'not_found'})
+
         # [MODIFIED] Note: The main analysis flow is now initiated by
         # start_full_analysis method which is called from routes.py /upload endpoint.
         # So, no direct @socketio.on decorator for analysis start here.
@@ -42,113 +67,226 @@ class SocketEvents:
     # [ADDED] Method to orchestrate the full analysis process.
     # This method is designed to be called from routes.py (e.g., from the /upload endpoint)
     # after the file has been successfully saved.
-    def start_full_analysis(self, file_path: str, original_filename: str):
+    def start_full_analysis(self, file_path: str, original_filename: str, session_id: str = None, sha256: str = None,
+                            time_budget: float = None, triage: bool = False, diff: bool = False):
         """
         Orchestrates the full analysis process for an APK.
 
         Args:
             file_path (str): Absolute path to the uploaded APK file.
             original_filename (str): The original name of the APK file (e.g., "my_app.apk").
+            session_id (str): Session to store the results under (optional, generated if omitted).
+            sha256 (str): SHA-256 of the APK, used to find this analysis for re-submissions (optional).
+            time_budget (float): Seconds to answer within (optional). If the obfuscation scan does not
+                finish in time, partial results with coverage metadata are returned and, with
+                refine_partial, the scan is completed in the background.
+            triage (bool): Estimate the obfuscation verdict from a stratified sample (optional).
+            diff (bool): Diff against the latest stored analysis of the same package, rescanning only
+                changed classes (optional). Needs the session store; without a previous analysis
+                the APK is scanned in full.
 
         Returns:
             dict: A dictionary containing the status of the analysis, and results if successful.
                   This return value is primarily for the HTTP endpoint caller in routes.py.
         """
-        # [ADDED] Start timer to measure overall analysis runtime
-        start_time = time.time()
-        logging.info(f"Starting full analysis for {original_filename}...")
-
         # Emit an initial status message to the frontend via a specific analysis_status channel
         self.socketio.emit('analysis_status', {'message': 'Starting analysis...'})
 
-        # Initialize analysis results structure with default placeholders
-        analysis_results = {
-            'apk_name': original_filename,
-            'apk_size_mb': None, # Will be filled by apk_service.decompile_apk
-            'permissions': [],
-            'obfuscation': {},
-            'manifest_content': 'Not extracted', # Placeholder, you might implement extraction later
-            'file_structure': 'Not extracted'    # Placeholder, you might implement extraction later
-        }
-
-        # 1. Decompile APK
-        logging.info(f"Decompiling {original_filename}...")
-        # apk_service.decompile_apk now returns success, output_dir, AND apk_size_mb
-        success_decompile, decompiled_data_or_error, apk_size_mb = self.apk_service.decompile_apk(file_path)
-
-        if not success_decompile:
-            error_message = decompiled_data_or_error # If failure, this is the error string
+        session_id = session_id or str(uuid.uuid4())
+        cancel_event = self.jobs.start(session_id, original_filename)
+        # The job id lets clients cancel the analysis while this call is still running
+        self.socketio.emit('analysis_started', {'job_id': session_id, 'filename': original_filename})
+        find_baseline = None
+        if diff and self.session_store:
+            find_baseline = lambda package_name: self.session_store.find_baseline(package_name, session_id)
+        try:
+            success, analysis_results = self.engine.analyze(file_path, original_filename, session_id, sha256,
+                                                            cancel_event, time_budget, triage, find_baseline)
+        finally:
+            self.jobs.finish(session_id)
+
+        if not success and cancel_event.is_set():
+            self.socketio.emit('analysis_complete', {'status': 'cancelled', 'job_id': session_id,
+                                                     'message': analysis_results})
+            return {'status': 'cancelled', 'message': analysis_results}
+
+        if not success:
+            error_message = analysis_results # If failure, this is the error string
             # Emit error status to frontend via 'analysis_complete' channel
-            self.socketio.emit('analysis_complete', {'status': 'error', 'message': f'Decompilation failed: {error_message}'})
+            self.socketio.emit('analysis_complete', {'status': 'error', 'message': error_message})
             # Return error for the calling HTTP endpoint (routes.py)
-            return {'status': 'error', 'message': f'Decompilation failed: {error_message}'}
-        else:
-            decompiled_dir = decompiled_data_or_error # If success, this is the output directory
-            analysis_results['apk_size_mb'] = apk_size_mb # [ADDED] Store APK size in results
-
-        # 2. Analyze Permissions
-        logging.info("Analyzing permissions...")
-        success_perm, permissions_data = self.permission_service.analyze_permissions(decompiled_dir)
-        if success_perm:
-            analysis_results['permissions'] = permissions_data
-        else:
-            logging.error(f"Permission analysis failed: {permissions_data}")
-            self.socketio.emit('analysis_status', {'message': f'Permission analysis failed: {permissions_data}'})
-
-        # 3. Analyze Obfuscation
-        logging.info("Analyzing obfuscation...")
-        success_obf, obfuscation_data = self.obfuscation_service.analyze_obfuscation(decompiled_dir)
-        if success_obf:
-            analysis_results['obfuscation'] = obfuscation_data
-        else:
-            logging.error(f"Obfuscation analysis failed: {obfuscation_data}")
-            self.socketio.emit('analysis_status', {'message': f'Obfuscation analysis failed: {obfuscation_data}'})
-
-        # --- TODO: Add Payload/Script Analysis Here when implemented ---
-        # If you implement payload analysis, call it here:
-        # logging.info("Analyzing dangerous payloads...")
-        # success_payload, payload_findings = self.payload_analysis_service.analyze_payloads(decompiled_dir)
-        # if success_payload:
-        #    analysis_results['dangerous_payloads'] = payload_findings
-        # else:
-        #    logging.error(f"Payload analysis failed: {payload_findings}")
-        #    self.socketio.emit('analysis_status', {'message': f'Payload analysis failed: {payload_findings}'})
-        # --- END TODO ---
-
-        # [ADDED] End timer and calculate total runtime
-        end_time = time.time()
-        runtime_seconds = round(end_time - start_time, 2) # Calculate total runtime in seconds
-        analysis_results['runtime_seconds'] = runtime_seconds
-        analysis_results['runtime_display'] = self._format_runtime(runtime_seconds) # Format for display
-
-        logging.info(f"Full analysis for {original_filename} completed in {runtime_seconds} seconds.")
+            return {'status': 'error', 'message': error_message}
+
+        # Persist before announcing completion so the session endpoints can serve it immediately
+        # Without a stored session clients get every detail, but never server paths or the manifest
+        payload = self._client_results(analysis_results)
+        stored = False
+        if self.session_store:
+            try:
+                self.session_store.save(session_id, analysis_results)
+                # The per-file manifest now lives in the session store; only diffs of later builds read it
+                analysis_results['obfuscation'].pop('files_manifest', None)
+                # Details now live in the session store, so clients only get the compact summary
+                payload = self.build_compact_results(analysis_results)
+                stored = True
+            except Exception as e:
+                logging.exception(f"Could not store analysis session {session_id}: {e}")
+        if self.analytics_store is not None:
+            try:
+                self.analytics_store.record(analysis_results)
+            except Exception as e:
+                logging.exception(f"Could not record analysis {session_id} in the analytics store: {e}")
+
+        if stored and logging.getLogger().isEnabledFor(logging.DEBUG):
+            self._log_payload_sizes(analysis_results, payload)
+
         # Emit final status message to the frontend
         self.socketio.emit('analysis_status', {'message': 'Analysis complete. Displaying results.'})
-        # Emit the complete analysis results to the frontend via 'analysis_complete' event
-        self.socketio.emit('analysis_complete', {'status': 'success', 'results': analysis_results})
+        # Emit the analysis results to the frontend via 'analysis_complete' event
+        self.socketio.emit('analysis_complete', {'status': 'success', 'results': payload})
+
+        if analysis_results.get('partial') and self.refine_partial:
+            if analysis_results.get('split_output_dirs'):
+                # Bundles would need every split rescanned and re-merged; they stay partial
+                logging.info(f"Not refining partial bundle analysis {session_id}")
+            else:
+                # A real thread, not a green one: the rescan is long and blocking and must not stall the server
+                threading.Thread(target=self._refine_partial_analysis, args=(session_id, analysis_results),
+                                 name=f"refine-{session_id}", daemon=True).start()
 
         # Return a success response (primarily for the HTTP endpoint caller in routes.py)
-        return {'status': 'success', 'message': 'Analysis initiated', 'results': analysis_results}
+        return {'status': 'success', 'message': 'Analysis initiated', 'results': payload}
+
+    def cancel_job(self, job_id: str) -> bool:
+        """
+        Cancel a running analysis.
+
+        apktool is killed right away and scans stop at the next file; start_full_analysis
+        then cleans up the partial output and reports the job as cancelled.
+
+        Args:
+            job_id (str): Job id announced in the analysis_started event (the session id).
+
+        Returns:
+            bool: True if the job was running, False if it is unknown or already finished.
+        """
+        if not job_id or not self.jobs.cancel(job_id):
+            return False
+        self.socketio.emit('analysis_status', {'message': 'Cancelling analysis...'})
+        return True
+
+    def _refine_partial_analysis(self, session_id: str, analysis_results: dict):
+        """
+        Complete the obfuscation scan of a partial analysis and push the full results.
 
-    # [ADDED] Helper function to format time duration into a human-readable string.
-    def _format_runtime(self, seconds: float) -> str:
+        The rescan runs over the persisted output as a cancellable job under the same id,
+        then replaces the stored session and emits an analysis_updated event.
+
+        Args:
+            session_id (str): Session of the partial analysis.
+            analysis_results (dict): Partial analysis results returned by the engine.
         """
-        Helper function to format time duration into a human-readable string.
-        e.g., "15 seconds", "2 min 30 sec", "1 hours 5 min".
+        cancel_event = self.jobs.start(session_id, f"{analysis_results.get('apk_name')} (refining)")
+        start = time.time()
+        try:
+            success, obfuscation_data = self.obfuscation_service.analyze_obfuscation(
+                analysis_results['output_dir'], cancel_event, manifest=True)
+        except Exception as e:
+            logging.exception(f"Could not refine analysis {session_id}: {e}")
+            return
+        finally:
+            self.jobs.finish(session_id)
+
+        if not success:
+            logging.info(f"Refinement of {session_id} stopped: {obfuscation_data.get('error')}")
+            return
+
+        refined = {**analysis_results, 'obfuscation': obfuscation_data, 'partial': False}
+        refined['refine_seconds'] = round(time.time() - start, 2)
+        # Kept if the refined session cannot be stored
+        payload = self._client_results(refined)
+        if self.session_store:
+            try:
+                self.session_store.save(session_id, refined)
+                obfuscation_data.pop('files_manifest', None)
+                payload = self.build_compact_results(refined)
+            except Exception as e:
+                logging.exception(f"Could not store refined session {session_id}: {e}")
+        if self.analytics_store is not None:
+            try:
+                # Supersedes the partial analysis' row
+                self.analytics_store.record(refined)
+            except Exception as e:
+                logging.exception(f"Could not record refined analysis {session_id} in the analytics store: {e}")
+
+        logging.info(f"Refined partial analysis {session_id} in {refined['refine_seconds']} seconds "
+                     f"(confidence {analysis_results['obfuscation'].get('confidence')}% -> {obfuscation_data['confidence']}%)")
+        self.socketio.emit('analysis_updated', {'status': 'success', 'results': payload})
+
+    def build_compact_results(self, analysis_results: dict, stored_snippets: list = None) -> dict:
+        """
+        Build the compact result contract sent to clients once details are stored.
+
+        Code snippets are replaced by their total count and the headers (no code) of the
+        first few snippets; the rest is fetched from the paginated session endpoints.
 
         Args:
-            seconds (float): Time duration in seconds.
+            analysis_results (dict): Full analysis results, or a stored session (which has
+                total_snippets instead of code_snippets).
+            stored_snippets (list): Leading snippets of a stored session (optional).
 
         Returns:
-            str: Formatted time string.
+            dict: Compact results safe to emit and return over HTTP.
         """
-        if seconds < 60:
-            return f"{seconds:.2f} seconds" # Format to 2 decimal places for sub-minute times
-        elif seconds < 3600:
-            minutes = int(seconds // 60)
-            remaining_seconds = round(seconds % 60, 2)
-            return f"{minutes} min {remaining_seconds:.2f} sec"
+        # Server-side paths are only needed by the session endpoints
+        compact = {key: value for key, value in analysis_results.items() if key not in self.SERVER_ONLY_FIELDS}
+
+        obfuscation = dict(analysis_results.get('obfuscation') or {})
+        # Per-file scan records for diffing later builds; they grow with the app and are never shown
+        obfuscation.pop('files_manifest', None)
+        if 'code_snippets' in obfuscation:
+            code_snippets = obfuscation.pop('code_snippets') or []
+            obfuscation['total_snippets'] = len(code_snippets)
         else:
-            hours = int(seconds // 3600)
-            minutes = int((seconds % 3600) // 60)
-            return f"{hours} hours {minutes} min"
+            code_snippets = stored_snippets or []
+            obfuscation.setdefault('total_snippets', len(code_snippets))
+        obfuscation['indicators'] = sorted(
+            obfuscation.get('indicators', []), key=lambda indicator: indicator.get('count', 0), reverse=True
+        )
+        obfuscation['snippet_headers'] = [
+            {key: value for key, value in snippet.items() if key != 'code_snippet'}
+            for snippet in code_snippets[:self.SUMMARY_SNIPPET_HEADERS]
+        ]
+        compact['obfuscation'] = obfuscation
+        return compact
+
+    def _client_results(self, analysis_results: dict) -> dict:
+        """
+        Strip full analysis results down to what may be sent to clients when they are not stored.
+
+        Args:
+            analysis_results (dict): Full analysis results.
+
+        Returns:
+            dict: Results without server-side paths or the per-file manifest.
+        """
+        results = {key: value for key, value in analysis_results.items() if key not in self.SERVER_ONLY_FIELDS}
+        obfuscation = dict(analysis_results.get('obfuscation') or {})
+        obfuscation.pop('files_manifest', None)
+        results['obfuscation'] = obfuscation
+        return results
+
+    def _log_payload_sizes(self, full_results: dict, compact_results: dict):
+        """
+        Log the serialized size and serialization time of the full and compact payloads.
+
+        Args:
+            full_results (dict): Full analysis results.
+            compact_results (dict): Compact results that are actually sent.
+        """
+        measurements = []
+        for label, payload in (('full', full_results), ('compact', compact_results)):
+            start = time.perf_counter()
+            size = len(json.dumps(payload))
+            measurements.append(f"{label}: {size / 1024:.1f} KB in {(time.perf_counter() - start) * 1000:.1f} ms")
+        logging.debug(f"analysis_complete payload - {', '.join(measurements)}")